@@ -1,18 +1,67 @@
 import os
-from flask import Flask
+from flask import Flask, Response
 from flask_smorest import Api
 from airview_api import database
+from airview_api import response_cache
+from airview_api import job_queue
+from airview_api import instrumentation
+from airview_api import commands
 from airview_api import controllers
 
 
 DB_URI = os.environ.get("DATABASE_URI")
 
 
-def create_app(app=None, db_connection_string=None):
+def _blueprints():
+    return [
+        controllers.applications.blp,
+        controllers.application_environments.blp,
+        controllers.resources.blp,
+        controllers.resource_types.blp,
+        controllers.resource_types_controls.blp,
+        controllers.technical_controls.blp,
+        controllers.systems.blp,
+        controllers.services.blp,
+        controllers.environments.blp,
+        controllers.compliance.blp,
+        controllers.exclusions.blp,
+        # controllers.control_statuses.blp,
+        # controllers.application_statuses.blp,
+        # controllers.exclusion_resources.blp,
+        controllers.referenced_application_environments.blp,
+        # controllers.application_technical_controls.blp,
+        controllers.monitored_resources.blp,
+        controllers.aggregations.blp,
+        #    controllers.exclusions.blp, # This is commented cos moving resources to own table broke it and it needs a rethink
+        #    controllers.search.blp,
+        controllers.frameworks.blp,
+        controllers.controls.blp,
+        controllers.stats.blp,
+    ]
+
+
+def _add_openapi_spec_route(app, openapi_spec_path):
+    spec = []
+
+    def openapi_json():
+        # Read on first request rather than at startup
+        if not spec:
+            with open(openapi_spec_path, "rb") as f:
+                spec.append(f.read())
+        return Response(spec[0], mimetype="application/json")
+
+    app.add_url_rule("/openapi.json", "openapi_json", openapi_json)
+
+
+def create_app(
+    app=None, db_connection_string=None, openapi_spec_path=None, engine_options=None
+):
     """
     Create Airview API Flask App
     :param app: Pre-existing "flask-like" app object
     :param db_connection_string: Database connection string
+    :param openapi_spec_path: Path of a pre-built openapi spec to serve, skips generating the spec at startup
+    :param engine_options: SQLAlchemy engine options, see database.engine_options. Defaults to pooling for a long running container
     :return: Flask App
     """
     if not app:
@@ -22,36 +71,41 @@ def create_app(app=None, db_connection_string=None):
     app.config["SQLALCHEMY_DATABASE_URI"] = (
         db_connection_string if db_connection_string else DB_URI
     )
+    if engine_options is None and app.config["SQLALCHEMY_DATABASE_URI"]:
+        engine_options = database.engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options or {}
+
+    # Off unless configured, recording every statement has a cost
+    app.config.setdefault(
+        "SQL_INSTRUMENTATION", os.environ.get("SQL_INSTRUMENTATION", "") == "True"
+    )
+
+    # Threads running queued compliance jobs, with none jobs are run within the request which queued them
+    app.config.setdefault(
+        "JOB_WORKERS", int(os.environ.get("JOB_WORKERS", job_queue.DEFAULT_WORKERS))
+    )
 
     database.init_app(app)
+    response_cache.init_app(app)
+    job_queue.init_app(app)
+    instrumentation.init_app(app)
+    commands.init_app(app)
 
     app.config["API_TITLE"] = "AirView API"
     app.config["API_VERSION"] = "v1"
     app.config["OPENAPI_VERSION"] = "3.0.2"
-    app.config["OPENAPI_URL_PREFIX"] = "/"
+    # With a pre-built spec the generated one, and its routes, are not needed
+    app.config["OPENAPI_URL_PREFIX"] = None if openapi_spec_path else "/"
 
     api = Api(app)
-    api.register_blueprint(controllers.applications.blp)
-    api.register_blueprint(controllers.application_environments.blp)
-    api.register_blueprint(controllers.resources.blp)
-    api.register_blueprint(controllers.resource_types.blp)
-    api.register_blueprint(controllers.resource_types_controls.blp)
-    api.register_blueprint(controllers.technical_controls.blp)
-    api.register_blueprint(controllers.systems.blp)
-    api.register_blueprint(controllers.services.blp)
-    api.register_blueprint(controllers.environments.blp)
-    api.register_blueprint(controllers.compliance.blp)
-    api.register_blueprint(controllers.exclusions.blp)
-    # api.register_blueprint(controllers.control_statuses.blp)
-    # api.register_blueprint(controllers.application_statuses.blp)
-    # api.register_blueprint(controllers.exclusion_resources.blp)
-    api.register_blueprint(controllers.referenced_application_environments.blp)
-    # api.register_blueprint(controllers.application_technical_controls.blp)
-    api.register_blueprint(controllers.monitored_resources.blp)
-    api.register_blueprint(controllers.aggregations.blp)
-    #    api.register_blueprint(controllers.exclusions.blp) # This is commented cos moving resources to own table broke it and it needs a rethink
-    #    api.register_blueprint(controllers.search.blp)
-    api.register_blueprint(controllers.frameworks.blp)
-    api.register_blueprint(controllers.controls.blp)
+    for blp in _blueprints():
+        if openapi_spec_path:
+            # Documenting the views is the bulk of startup time, registering them with flask alone is cheap
+            app.register_blueprint(blp)
+        else:
+            api.register_blueprint(blp)
+
+    if openapi_spec_path:
+        _add_openapi_spec_route(app, openapi_spec_path)
 
     return app
@@ -1,7 +1,12 @@
+import base64
+import json
 from enum import Enum
 from functools import wraps
 from copy import deepcopy
-from flask_smorest import Blueprint as SmBlueprint, utils
+from urllib.parse import urlencode
+from flask import request, Response, json as flask_json, stream_with_context
+from flask_smorest import Blueprint as SmBlueprint, abort, utils
+from sqlalchemy import inspect, tuple_
 
 
 class Roles(str, Enum):
@@ -10,8 +15,162 @@ class Roles(str, Enum):
     CONTENT_READER = "ContentReader"
     CONTENT_WRITER = "ContentWriter"
 
+# Largest page a request can ask for. Requests which do not ask for a page size get every result, as they did before paging
+MAX_PAGE_LIMIT = 1000
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+EVENT_STREAM_MIMETYPE = "text/event-stream"
+
+
+def wants_ndjson() -> bool:
+    """Whether the client asked for newline delimited json rather than a json array"""
+    best = request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def ndjson_response(schema, rows) -> Response:
+    """Stream rows as newline delimited json, one dumped row per line.
+    Rows are written out as they are read so the result set is never held in memory in full
+    """
+
+    def generate():
+        for row in rows:
+            yield flask_json.dumps(schema.dump(row, many=False)) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def wants_event_stream() -> bool:
+    """Whether the client asked for server sent events rather than a json array"""
+    best = request.accept_mimetypes.best_match(
+        ["application/json", EVENT_STREAM_MIMETYPE]
+    )
+    return best == EVENT_STREAM_MIMETYPE
+
+
+def event_stream_response(schema, rows) -> Response:
+    """Stream rows as server sent events, one dumped row per event identified by the row's id.
+    Clients reconnecting with the Last-Event-ID header can resume after the last row they received.
+    A None row is written as a comment, keeping idle connections open through proxies
+    """
+
+    def generate():
+        for row in rows:
+            if row is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {row.id}\ndata: {flask_json.dumps(schema.dump(row))}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EVENT_STREAM_MIMETYPE,
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+def _encode_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> list:
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(values, list) or not all(
+        isinstance(v, (int, str)) and not isinstance(v, bool) for v in values
+    ):
+        raise ValueError("Cursor does not hold a key")
+    return values
+
+
+def _matches(value, column) -> bool:
+    # The cursor is client supplied, a value of the wrong type would otherwise fail in the database
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return True
+    return isinstance(value, python_type)
+
+
+class KeysetPage:
+    """A page of results positioned after the key of the last item of the previous page.
+    Passed to views decorated with keyset_paginate as the 'page' argument
+    """
+
+    def __init__(self, limit: int = None, after: list = None):
+        self.limit = limit
+        self.after = after
+        self.next_cursor = None
+
+    def where(self, query, *columns):
+        """Restrict a query to the page, ordered by the given key columns.
+        One row more than the page is selected so that the existence of a next page is known
+        """
+        if self.after is not None:
+            if len(self.after) != len(columns) or not all(
+                _matches(v, c) for v, c in zip(self.after, columns)
+            ):
+                abort(400, message="The cursor provided is not valid")
+            query = query.where(tuple_(*columns) > tuple_(*self.after))
+        query = query.order_by(*columns)
+        if self.limit is None:
+            return query
+        return query.limit(self.limit + 1)
+
+    def items(self, results, *keys):
+        """Cut the results of a query restricted with 'where' down to the page, recording the cursor of the next page.
+        :param keys: Names of the attributes, or dictionary keys, of each result making up its key
+        """
+        results = list(results)
+        if self.limit is None or len(results) <= self.limit:
+            return results
+        last = results[self.limit - 1]
+        self.next_cursor = _encode_cursor(
+            last[k] if isinstance(last, dict) else getattr(last, k) for k in keys
+        )
+        return results[: self.limit]
+
+    def paginate(self, query):
+        """Page an orm query by the primary key of the entity it selects"""
+        entity = query.column_descriptions[0]["entity"]
+        columns = inspect(entity).primary_key
+        return self.items(self.where(query, *columns).all(), *(c.key for c in columns))
+
+    def link(self):
+        """Link header value pointing at the next page, if there is one"""
+        if self.next_cursor is None:
+            return None
+        args = request.args.to_dict(flat=False)
+        args["after"] = [self.next_cursor]
+        # Relative to the requested url, the host and path seen here can differ from the caller's behind a gateway
+        return f'<?{urlencode(args, doseq=True)}>; rel="next"'
+
+
+def _page_from_request() -> KeysetPage:
+    limit = request.args.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            abort(400, message="The limit provided must be a number")
+        if limit < 1 or limit > MAX_PAGE_LIMIT:
+            abort(
+                400,
+                message=f"The limit provided must be between 1 and {MAX_PAGE_LIMIT}",
+            )
+
+    after = request.args.get("after")
+    if after is not None:
+        try:
+            after = _decode_cursor(after)
+        except ValueError:
+            abort(400, message="The cursor provided is not valid")
+    return KeysetPage(limit, after)
+
 
 class Blueprint(SmBlueprint):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prepare_doc_cbks.append(self._prepare_keyset_pagination_doc)
+
     @staticmethod
     def role(role: Enum):
         """Decorator adding custom role attribute 'x-api-rbac-role' to the document
@@ -36,3 +195,58 @@ class Blueprint(SmBlueprint):
             return wrapper
 
         return decorator
+
+    @staticmethod
+    def keyset_paginate():
+        """Decorator bounding the size of a list response with keyset pagination
+        The view receives a KeysetPage as the 'page' argument which it uses to restrict its query,
+        a Link header to the next page is added to the response when there are more results
+            Example: ::
+                @blp.keyset_paginate()
+                def get(self, page):
+                    return page.paginate(Model.query)
+        """
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*f_args, **f_kwargs):
+                page = _page_from_request()
+                result = func(*f_args, page=page, **f_kwargs)
+                link = page.link()
+                if link is None:
+                    return result
+                if isinstance(result, Response):
+                    result.headers["Link"] = link
+                    return result
+                return result, {"Link": link}
+
+            wrapper._apidoc = deepcopy(getattr(wrapper, "_apidoc", {}))
+            wrapper._apidoc["keyset_pagination"] = True
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def _prepare_keyset_pagination_doc(doc, doc_info, **kwargs):
+        if doc_info.get("keyset_pagination"):
+            doc.setdefault("parameters", []).extend(
+                [
+                    {
+                        "in": "query",
+                        "name": "limit",
+                        "schema": {
+                            "type": "integer",
+                            "minimum": 1,
+                            "maximum": MAX_PAGE_LIMIT,
+                        },
+                        "description": "Maximum number of items to return, every item is returned when not passed",
+                    },
+                    {
+                        "in": "query",
+                        "name": "after",
+                        "schema": {"type": "string"},
+                        "description": "Cursor from the Link header of the previous page",
+                    },
+                ]
+            )
+        return doc
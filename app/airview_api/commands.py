@@ -0,0 +1,78 @@
+import json
+import click
+from flask.cli import with_appcontext
+from airview_api.services import (
+    compliance_fact_service,
+    compliance_history_service,
+    compliance_job_service,
+    monitored_resource_service,
+)
+
+
+@click.command("reconcile-monitored-resources")
+@click.option(
+    "--batch-size",
+    type=int,
+    default=monitored_resource_service.RECONCILE_BATCH_SIZE,
+    show_default=True,
+    help="Rows transitioned per statement",
+)
+@with_appcontext
+def reconcile_monitored_resources(batch_size):
+    """Mark monitored resources which have not been seen within the ttl of their technical control as unresponsive"""
+    metrics = monitored_resource_service.mark_unresponsive(batch_size=batch_size)
+    click.echo(json.dumps(metrics))
+
+
+@click.command("prune-monitored-resource-changes")
+@click.option(
+    "--batch-size",
+    type=int,
+    default=monitored_resource_service.CHUNK_SIZE,
+    show_default=True,
+    help="Transitions removed per statement",
+)
+@with_appcontext
+def prune_monitored_resource_changes(batch_size):
+    """Remove monitored resource transitions older than the retention of the change feed"""
+    metrics = monitored_resource_service.prune_changes(batch_size=batch_size)
+    click.echo(json.dumps(metrics))
+
+
+@click.command("verify-compliance-counters")
+@with_appcontext
+def verify_compliance_counters():
+    """Recount the compliance counters from the source tables and correct any which have drifted"""
+    metrics = compliance_fact_service.verify_counters()
+    click.echo(json.dumps(metrics))
+
+
+@click.command("snapshot-compliance")
+@with_appcontext
+def snapshot_compliance():
+    """Snapshot the compliance counters into the current hourly and daily buckets and remove expired hourly snapshots"""
+    metrics = compliance_history_service.take_snapshot()
+    click.echo(json.dumps(metrics))
+
+
+@click.command("run-compliance-jobs")
+@click.option(
+    "--limit",
+    type=int,
+    default=compliance_job_service.RUN_QUEUED_LIMIT,
+    show_default=True,
+    help="Most jobs run",
+)
+@with_appcontext
+def run_compliance_jobs(limit):
+    """Run queued compliance jobs, oldest first, and remove expired ones"""
+    metrics = compliance_job_service.run_queued(limit=limit)
+    click.echo(json.dumps(metrics))
+
+
+def init_app(app):
+    app.cli.add_command(reconcile_monitored_resources)
+    app.cli.add_command(prune_monitored_resource_changes)
+    app.cli.add_command(verify_compliance_counters)
+    app.cli.add_command(snapshot_compliance)
+    app.cli.add_command(run_compliance_jobs)
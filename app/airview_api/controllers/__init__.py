@@ -19,4 +19,5 @@ from airview_api.controllers import (
     frameworks,
     aggregations,
     controls,
+    stats,
 )
@@ -1,15 +1,17 @@
 from itertools import compress
 from pprint import pprint
-from airview_api.blueprint import Blueprint, Roles
+from airview_api.blueprint import Blueprint, Roles, ndjson_response, wants_ndjson
 from airview_api.services import (
     aggregation_service,
+    data_version_service,
     AirViewValidationException,
     AirViewNotFoundException,
 )
+from airview_api import response_cache
 from flask.views import MethodView
 from flask_smorest import abort
 import flask
-from flask import request
+from flask import request, Response
 
 from airview_api.schemas import (
     ComplianceAggregationSchema,
@@ -27,38 +29,97 @@ blp = Blueprint(
 )
 
 
+def _versioned_response(application_id, schema, compute, page=None):
+    # Responses only change when the application's data version does, which allows cheap 304s and caching
+    version = data_version_service.get_version(application_id)
+    args = sorted(request.args.items(multi=True))
+    blp.set_etag({"version": version, "args": args})
+
+    cache = response_cache.get_cache()
+    key = (request.endpoint, application_id, tuple(args), version)
+    cached = cache.get(key)
+    if cached is None:
+        body = flask.json.dumps(schema.dump(compute()))
+        cached = (body, page.next_cursor if page else None)
+        cache.set(key, cached)
+    body, next_cursor = cached
+    if page is not None:
+        page.next_cursor = next_cursor
+    return Response(body, mimetype="application/json")
+
+
+def _versioned_stream(application_id, schema, rows):
+    # Streamed rows are written as they are read, so are neither cached nor paged
+    version = data_version_service.get_version(application_id)
+    args = sorted(request.args.items(multi=True))
+    blp.set_etag({"version": version, "args": args, "stream": True})
+    return ndjson_response(schema, rows)
+
+
 @blp.route("compliance/<int:application_id>")
 class Application(MethodView):
+    @blp.etag
     @blp.response(200, ComplianceAggregationSchema(many=True))
+    @blp.keyset_paginate()
     @blp.role(Roles.CONTENT_READER)
-    def get(self, application_id):
+    def get(self, application_id, page):
         """Get an application by id
 
-        Returns application matching requested id
+        Returns application matching requested id, streamed as newline delimited json when application/x-ndjson is accepted
         """
-        return aggregation_service.get_compliance_aggregation(application_id)
+        if wants_ndjson():
+            return _versioned_stream(
+                application_id,
+                ComplianceAggregationSchema(),
+                aggregation_service.get_compliance_aggregation(application_id),
+            )
+        return _versioned_response(
+            application_id,
+            ComplianceAggregationSchema(many=True),
+            lambda: page.items(
+                aggregation_service.get_compliance_aggregation(application_id, page),
+                "id",
+                "environment_name",
+            ),
+            page,
+        )
 
 
 @blp.route("control-overview-totals/<int:application_id>/")
 class ControlOverviewTotal(MethodView):
+    @blp.etag
     @blp.response(200, ControlOverviewTotalSchema())
     @blp.role(Roles.CONTENT_READER)
     def get(self, application_id):
         """Get control totals by application id
         Returns totals for requested id
         """
-        return aggregation_service.get_control_overview_totals(application_id)
+        return _versioned_response(
+            application_id,
+            ControlOverviewTotalSchema(),
+            lambda: aggregation_service.get_control_overview_totals(application_id),
+        )
 
 
 @blp.route("control-overview-resources/<int:application_id>/")
 class ControlOverviewResources(MethodView):
+    @blp.etag
     @blp.response(200, ControlOverviewResourceSchema(many=True))
+    @blp.keyset_paginate()
     @blp.role(Roles.CONTENT_READER)
-    def get(self, application_id):
+    def get(self, application_id, page):
         """Get an application by id
         Returns application matching requested id
         """
         technical_control_id: int = flask.request.args.get("technicalControlId")
-        return aggregation_service.get_control_overview_resources(
-            application_id, technical_control_id
+        return _versioned_response(
+            application_id,
+            ControlOverviewResourceSchema(many=True),
+            lambda: page.items(
+                aggregation_service.get_control_overview_resources(
+                    application_id, technical_control_id, page
+                ),
+                "id",
+            ),
+            page,
         )
@@ -66,12 +66,13 @@ class Application(MethodView):
 @blp.route("/")
 class Applications(MethodView):
     @blp.response(200, ApplicationSchema(many=True))
+    @blp.keyset_paginate()
     @blp.role(Roles.CONTENT_READER)
-    def get(self):
+    def get(self, page):
         """Get all applications"""
 
         type = request.args.get("applicationType")
-        return application_service.get_all(type)
+        return page.paginate(application_service.get_all(type))
 
     @blp.arguments(ApplicationSchema)
     @blp.response(200, ApplicationSchema)
@@ -105,7 +106,6 @@ class QualityModels(MethodView):
     def get(self, application_id):
         """Get the current control statuses of resources/controls within this application"""
         data = aggregation_service.get_application_quality_models(application_id)
-        print(data)
         return data
 
 
@@ -1,12 +1,30 @@
+import gzip
 from airview_api.helpers import AirviewApiHelpers
-from airview_api.schemas import ComplianceDataSchema
-from airview_api.blueprint import Blueprint, Roles
+from airview_api.schemas import (
+    ComplianceDataSchema,
+    ComplianceHistoryQuerySchema,
+    ComplianceHistorySchema,
+    ComplianceJobRequestSchema,
+    ComplianceJobSchema,
+)
+from airview_api.blueprint import (
+    NDJSON_MIMETYPE,
+    Blueprint,
+    Roles,
+    ndjson_response,
+    wants_ndjson,
+)
 from flask.views import MethodView
-from flask import request
+from flask import request, Response
 from flask_smorest import abort
-from airview_api.services import AirViewValidationException
+from airview_api.services import AirViewNotFoundException, AirViewValidationException
+from airview_api.models import SnapshotBucket
 
-from airview_api.services import compliance_service
+from airview_api.services import (
+    compliance_history_service,
+    compliance_job_service,
+    compliance_service,
+)
 
 blp = Blueprint(
     "compliance",
@@ -22,7 +40,7 @@ class ComplianceData(MethodView):
     def get(self):
         """Get an application by id
 
-        Returns application matching requested id
+        Returns application matching requested id, streamed as newline delimited json when application/x-ndjson is accepted
         """
 
         odata_filter = request.args.get("$filter")
@@ -30,9 +48,93 @@ class ComplianceData(MethodView):
         if not odata_select:
             abort(400, message="The $select query parameter must be passed")
 
+        stream = wants_ndjson()
+        try:
+            data = compliance_service.get_compliace_aggregate(
+                filter=odata_filter, select=odata_select, stream=stream
+            )
+        except AirViewValidationException as e:
+            abort(400, message=str(e))
+        if stream:
+            return ndjson_response(ComplianceDataSchema(), data)
+        return data
+
+
+@blp.route("/history")
+class ComplianceHistory(MethodView):
+    @blp.arguments(ComplianceHistoryQuerySchema, location="query")
+    @blp.response(200, ComplianceHistorySchema(many=True))
+    @blp.role(Roles.COMPLIANCE_READER)
+    def get(self, args):
+        """Get compliance history
+
+        Returns compliance counts by bucket, application and quality model for the hourly or daily snapshots starting between start and end.
+        Hourly snapshots are only kept for a limited time, daily snapshots cover the older history
+        """
+        try:
+            return compliance_history_service.get_history(
+                start=args["start"],
+                end=args["end"],
+                bucket=SnapshotBucket[args["bucket"]],
+                application_id=args.get("application_id"),
+                quality_model=args.get("quality_model"),
+            )
+        except AirViewValidationException as e:
+            abort(400, message=str(e))
+
+
+@blp.route("/jobs")
+class ComplianceJobs(MethodView):
+    @blp.arguments(ComplianceJobRequestSchema)
+    @blp.response(202, ComplianceJobSchema)
+    @blp.role(Roles.COMPLIANCE_READER)
+    def post(self, data):
+        """Queue a compliance aggregate
+
+        Takes the same select and filter as /compliance/ and returns a job to poll, for aggregates which take too long to serve within a request
+        """
         try:
-            return compliance_service.get_compliace_aggregate(
-                filter=odata_filter, select=odata_select
+            return compliance_job_service.submit(
+                filter=data.get("filter"), select=data["select"]
             )
         except AirViewValidationException as e:
             abort(400, message=str(e))
+
+
+@blp.route("/jobs/<int:job_id>")
+class ComplianceJob(MethodView):
+    @blp.response(200, ComplianceJobSchema)
+    @blp.role(Roles.COMPLIANCE_READER)
+    def get(self, job_id):
+        """Get a compliance job by id
+
+        Returns the status of the job, its result can be fetched once it has SUCCEEDED
+        """
+        try:
+            return compliance_job_service.get_by_id(job_id)
+        except AirViewNotFoundException:
+            abort(404)
+
+
+@blp.route("/jobs/<int:job_id>/result")
+class ComplianceJobResult(MethodView):
+    @blp.response(200, ComplianceDataSchema(many=True), content_type=NDJSON_MIMETYPE)
+    @blp.role(Roles.COMPLIANCE_READER)
+    def get(self, job_id):
+        """Get the result of a compliance job
+
+        Returns the aggregate as newline delimited json, sent gzip encoded when the client accepts it
+        """
+        try:
+            result = compliance_job_service.get_result(job_id)
+        except AirViewNotFoundException:
+            abort(404)
+        except AirViewValidationException as e:
+            abort(409, message=str(e))
+
+        if "gzip" in request.accept_encodings:
+            # Stored compressed, so sent as is
+            return Response(
+                result, mimetype=NDJSON_MIMETYPE, headers={"Content-Encoding": "gzip"}
+            )
+        return Response(gzip.decompress(result), mimetype=NDJSON_MIMETYPE)
@@ -32,10 +32,11 @@ class Controls(MethodView):
             abort(400, message=str(e))
 
     @blp.response(200, ControlSchema(many=True))
+    @blp.keyset_paginate()
     @blp.role(Roles.CONTENT_READER)
-    def get(self):
+    def get(self, page):
         """Get a list of all controls"""
         if request.args.get("name"):
             name = request.args['name']
-            return control_service.get_by_name(name)
-        return control_service.get_all()
+            return page.paginate(control_service.get_by_name(name))
+        return page.paginate(control_service.get_all())
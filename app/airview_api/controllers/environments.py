@@ -20,10 +20,11 @@ blp = Blueprint(
 @blp.route("/")
 class Environments(MethodView):
     @blp.response(200, EnvironmentSchema(many=True))
+    @blp.keyset_paginate()
     @blp.role(Roles.CONTENT_READER)
-    def get(self):
+    def get(self, page):
         """Get a list of all environments"""
-        return environment_service.get_all()
+        return page.paginate(environment_service.get_all())
 
     @blp.arguments(EnvironmentSchema)
     @blp.response(200, EnvironmentSchema)
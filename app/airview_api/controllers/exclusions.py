@@ -34,8 +34,7 @@ class Exclusions(MethodView):
             exclusion_service.create(
                 data=data,
             )
-        except KeyError as e:
-            print(e)
+        except KeyError:
             abort(400, message="Bad Request")
-        except AirViewValidationException:
-            abort(400, message="Exclusions already exist for resources provided")
+        except AirViewValidationException as e:
+            abort(400, message=str(e))
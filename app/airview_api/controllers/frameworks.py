@@ -27,12 +27,13 @@ blp = Blueprint(
 @blp.route("/")
 class Frameworks(MethodView):
     @blp.response(200, FrameworkSchema(many=True))
+    @blp.keyset_paginate()
     @blp.role(Roles.CONTENT_READER)
-    def get(self):
+    def get(self, page):
         if request.args.get("name"):
             name = request.args['name']
-            return framework_service.get_framework_by_name(name)
-        return framework_service.get_all()
+            return page.paginate(framework_service.get_framework_by_name(name))
+        return page.paginate(framework_service.get_all())
 
     @blp.arguments(FrameworkSchema)
     @blp.response(200, FrameworkSchema)
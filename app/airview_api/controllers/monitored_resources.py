@@ -1,5 +1,6 @@
 from pprint import pprint
 import flask
+from flask import current_app, request
 from airview_api.services import (
     technical_control_service,
     application_service,
@@ -12,10 +13,24 @@ from airview_api.models import ExclusionState
 import marshmallow as ma
 from airview_api.schemas import CamelCaseSchema
 from airview_api.services import monitored_resource_service
-from airview_api.schemas import MonitoredResourceSchema
-from airview_api.blueprint import Blueprint, Roles
+from airview_api.schemas import (
+    MonitoredResourceSchema,
+    MonitoredResourceBatchResultSchema,
+    MonitoredResourceChangesQuerySchema,
+    MonitoredResourceTransitionSchema,
+)
+from airview_api.blueprint import (
+    Blueprint,
+    Roles,
+    event_stream_response,
+    wants_event_stream,
+)
 from airview_api.helpers import AirviewApiHelpers
 
+# Seconds between polls for new transitions while streaming, and how long a stream is kept open.
+# Streams end within the API Gateway integration timeout, clients reconnect with Last-Event-ID to carry on
+DEFAULT_CHANGE_STREAM_POLL_SECONDS = 1
+DEFAULT_CHANGE_STREAM_SECONDS = 25
 
 blp = Blueprint(
     "monitored-resources",
@@ -45,3 +60,64 @@ class MonitoredResource(MethodView):
             return "Not Found", 404
         except AirViewValidationException:
             return "Bad Request", 400
+
+
+@blp.route("/batch/")
+class MonitoredResourceBatch(MethodView):
+    @blp.arguments(MonitoredResourceSchema(many=True))
+    @blp.response(200, MonitoredResourceBatchResultSchema(many=True))
+    @blp.role(Roles.COMPLIANCE_WRITER)
+    def put(self, data):
+        """Persists the status of many monitored resources in a single request
+        Returns the outcome for each item in the order it was provided
+        """
+        if len(data) > monitored_resource_service.MAX_BATCH_SIZE:
+            abort(
+                400,
+                message=f"A batch may contain at most {monitored_resource_service.MAX_BATCH_SIZE} items",
+            )
+        try:
+            return monitored_resource_service.persist_many(data)
+        except AirViewValidationException as e:
+            abort(400, message=str(e))
+
+
+@blp.route("/changes")
+class MonitoredResourceChanges(MethodView):
+    @blp.arguments(MonitoredResourceChangesQuerySchema, location="query")
+    @blp.response(200, MonitoredResourceTransitionSchema(many=True))
+    @blp.keyset_paginate()
+    @blp.role(Roles.COMPLIANCE_READER)
+    def get(self, args, page):
+        """Get the changes to the monitoring state of monitored resources, oldest first
+        Returns the transitions recorded after the transition with the id passed as since,
+        streamed as server sent events when text/event-stream is accepted.
+        Where responses are buffered rather than streamed, as behind the api-gw-proxy lambda, events would
+        arrive in one burst as the stream ends so 406 is returned and the changes should be polled instead
+        """
+        if wants_event_stream():
+            if not current_app.config.get("CHANGE_STREAMING", True):
+                abort(
+                    406,
+                    message="Changes cannot be streamed here, poll with since instead",
+                )
+            since = request.headers.get("Last-Event-ID", args["since"])
+            try:
+                since = int(since)
+            except ValueError:
+                abort(400, message="The Last-Event-ID provided must be a number")
+            return event_stream_response(
+                MonitoredResourceTransitionSchema(),
+                monitored_resource_service.follow_changes(
+                    since,
+                    current_app.config.get(
+                        "CHANGE_STREAM_POLL_SECONDS", DEFAULT_CHANGE_STREAM_POLL_SECONDS
+                    ),
+                    current_app.config.get(
+                        "CHANGE_STREAM_SECONDS", DEFAULT_CHANGE_STREAM_SECONDS
+                    ),
+                ),
+            )
+        return page.items(
+            monitored_resource_service.get_changes(args["since"], page), "id"
+        )
@@ -10,10 +10,12 @@ from flask_smorest import abort
 from airview_api.blueprint import Blueprint, Roles
 from airview_api.schemas import (
     ResourceSchema,
+    ResourceBatchSchema,
+    ResourceBatchResultSchema,
+    StaleResourcesQuerySchema,
 )
 from airview_api.helpers import AirviewApiHelpers
 
-
 blp = Blueprint(
     "resources",
     __name__,
@@ -73,3 +75,48 @@ class Resources(MethodView):
             return data
         except AirViewNotFoundException:
             abort(404)
+
+
+@blp.route("/batch/")
+class ResourceBatch(MethodView):
+    @blp.arguments(ResourceBatchSchema)
+    @blp.response(200, ResourceBatchResultSchema(many=True))
+    @blp.role(Roles.CONTENT_WRITER)
+    def put(self, data):
+        """Create or update many resources of an application environment in a single request
+        Returns the outcome for each resource in the order it was provided. When staleBefore is passed,
+        the resources of the application environment which were last seen before it follow with the outcome STALE.
+        At most 1000 are reported, all of them can be read page by page from /resources/stale/
+        """
+        if len(data["resources"]) > resource_service.MAX_BATCH_SIZE:
+            abort(
+                400,
+                message=f"A batch may contain at most {resource_service.MAX_BATCH_SIZE} resources",
+            )
+        try:
+            return resource_service.upsert_many(
+                data["application_environment_id"],
+                data["resources"],
+                stale_before=data.get("stale_before"),
+            )
+        except AirViewNotFoundException:
+            abort(404)
+        except AirViewValidationException as e:
+            abort(400, message=str(e))
+
+
+@blp.route("/stale/")
+class StaleResources(MethodView):
+    @blp.arguments(StaleResourcesQuerySchema, location="query")
+    @blp.response(200, ResourceSchema(many=True))
+    @blp.keyset_paginate()
+    @blp.role(Roles.COMPLIANCE_READER)
+    def get(self, args, page):
+        """Get the resources of an application environment which were last seen before lastSeenBefore
+        Used after a batch put with staleBefore to read every resource missing from the sync, in id order
+        """
+        return page.paginate(
+            resource_service.get_stale(
+                args["application_environment_id"], args["last_seen_before"]
+            )
+        )
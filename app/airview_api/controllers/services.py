@@ -32,15 +32,15 @@ class Services(MethodView):
         Returns the newly created service
         """
         try:
-            print(data)
             app = service_service.create(data)
             return app
         except AirViewValidationException as e:
             abort(400, message=str(e))
 
     @blp.response(200, ServiceSchema(many=True))
+    @blp.keyset_paginate()
     @blp.role(Roles.CONTENT_READER)
-    def get(self):
+    def get(self, page):
         """Get a list of all services"""
         data = service_service.get_all()
-        return data
+        return page.paginate(data)
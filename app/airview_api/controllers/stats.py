@@ -0,0 +1,25 @@
+from flask.views import MethodView
+
+from airview_api import database
+from airview_api.blueprint import Blueprint, Roles
+from airview_api.schemas import PoolStatsSchema
+from airview_api.helpers import AirviewApiHelpers
+
+
+blp = Blueprint(
+    "stats",
+    __name__,
+    url_prefix=AirviewApiHelpers.get_api_url_prefix("/stats"),
+    description="Operational statistics of the api",
+)
+
+
+@blp.route("/pool/")
+class PoolStats(MethodView):
+    @blp.response(200, PoolStatsSchema)
+    @blp.role(Roles.CONTENT_READER)
+    def get(self):
+        """Get database connection pool statistics
+        Returns the current state of the pool of this process and its counters since the pool was created
+        """
+        return database.pool_stats()
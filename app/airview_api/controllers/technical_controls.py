@@ -35,12 +35,13 @@ class TechnicalControls(MethodView):
     @blp.arguments(
         TechnicalControlSchema(only=("system_id", "reference")), location="query"
     )
+    @blp.keyset_paginate()
     @blp.role(Roles.CONTENT_READER)
-    def get(self, args):
+    def get(self, args, page):
         """Get a list of all technical controls"""
         data = technical_control_service.get_with_filter(**args)
 
-        return data
+        return page.paginate(data)
 
 
 @blp.route("/<string:control_id>")
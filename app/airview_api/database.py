@@ -1,8 +1,135 @@
+import threading
+import time
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import exc
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
 
 
 db = SQLAlchemy()
 
+# Pool sizing for long running containers which serve several requests at once
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_POOL_TIMEOUT = 30
+# Connections are replaced before idle timeouts on the database, or a proxy in front of it, close them
+DEFAULT_POOL_RECYCLE = 1800
+
+
+class _PoolStatsMixin:
+    """Counts checkouts from a pool and the time spent waiting for them"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.stats["timeouts"] += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._stats_lock:
+            self.stats["checkouts"] += 1
+            self.stats["wait_seconds_total"] += waited
+            self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+        return connection
+
+
+class InstrumentedQueuePool(_PoolStatsMixin, QueuePool):
+    pass
+
+
+class InstrumentedNullPool(_PoolStatsMixin, NullPool):
+    pass
+
+
+def engine_options(
+    database_uri: str,
+    serverless: bool = False,
+    pool_size: int = None,
+    max_overflow: int = None,
+    pool_timeout: float = DEFAULT_POOL_TIMEOUT,
+    statement_timeout: int = None,
+) -> dict:
+    """Get engine options suited to where the api is deployed
+    :param database_uri: Connection string of the database
+    :param serverless: Whether each process serves one request at a time, e.g. lambda behind RDS Proxy.
+        The proxy does the pooling so a single connection is kept, or none when pool_size is 0
+    :param pool_size: Connections kept open, defaults to 1 when serverless otherwise DEFAULT_POOL_SIZE
+    :param max_overflow: Connections opened beyond the pool size under load
+    :param pool_timeout: Seconds to wait for a connection before failing
+    :param statement_timeout: Milliseconds a postgres statement may run for. Note RDS Proxy pins connections
+        which set it, setting it against the database role is preferable there
+    :return: Options for SQLALCHEMY_ENGINE_OPTIONS
+    """
+    url = make_url(database_uri)
+    if url.get_backend_name() == "sqlite":
+        # Connections are local, the driver defaults are kept
+        return {}
+
+    if serverless:
+        pool_size = 1 if pool_size is None else pool_size
+        max_overflow = 0 if max_overflow is None else max_overflow
+    else:
+        pool_size = DEFAULT_POOL_SIZE if pool_size is None else pool_size
+        max_overflow = DEFAULT_MAX_OVERFLOW if max_overflow is None else max_overflow
+
+    options = {"pool_pre_ping": True, "pool_recycle": DEFAULT_POOL_RECYCLE}
+    if pool_size == 0:
+        options["poolclass"] = InstrumentedNullPool
+    else:
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+        )
+    if statement_timeout and url.get_backend_name() == "postgresql":
+        options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    return options
+
 
 def init_app(app):
     db.init_app(app)
+    # Imported here as the services themselves import the database
+    from airview_api.services import compliance_fact_service, data_version_service
+
+    compliance_fact_service.register_listeners()
+    data_version_service.register_listeners()
+
+
+def pool_stats() -> dict:
+    """Get the state of the connection pool of the current app"""
+    pool = db.engine.pool
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    stats.update(getattr(pool, "stats", {}))
+    return stats
+
+
+def upsert(table):
+    """Get an insert construct for the bound database which supports ``on_conflict_do_update``
+    Postgres and SQLite share the same ON CONFLICT semantics, so callers can build one statement for both
+    :param table: Table to insert into
+    :return: Dialect specific insert construct
+    """
+    if db.engine.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
@@ -0,0 +1,126 @@
+import heapq
+import json
+import logging
+import time
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("airview.api.sql")
+
+# Number of slowest statements of each request which are reported
+DEFAULT_SLOWEST_COUNT = 3
+# Length statements are cut to when reported
+STATEMENT_LENGTH = 500
+
+
+class RequestSqlStats:
+    """Statements executed while handling a single request"""
+
+    def __init__(self, slowest_count: int):
+        self.count = 0
+        self.seconds = 0.0
+        self.errors = []
+        self._slowest_count = slowest_count
+        # Min heap of (seconds, sequence, statement), the quickest of the slowest is replaced first
+        self._slowest = []
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        entry = (seconds, self.count, statement[:STATEMENT_LENGTH])
+        if len(self._slowest) < self._slowest_count:
+            heapq.heappush(self._slowest, entry)
+        elif seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    @property
+    def slowest(self) -> list:
+        return [
+            {"ms": round(seconds * 1000, 3), "statement": statement}
+            for seconds, _, statement in sorted(self._slowest, reverse=True)
+        ]
+
+
+def _current_stats():
+    if has_app_context():
+        return g.get("sql_stats")
+    return None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats() is not None:
+        conn.info.setdefault("sql_stats_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats()
+    started = conn.info.get("sql_stats_started")
+    if stats is not None and started:
+        stats.record(statement, time.perf_counter() - started.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    stats = _current_stats()
+    if stats is None:
+        return
+    started = exception_context.connection and exception_context.connection.info.get(
+        "sql_stats_started"
+    )
+    if started:
+        started.pop()
+    stats.errors.append(
+        {
+            "error": type(exception_context.original_exception).__name__,
+            "message": str(exception_context.original_exception)[:STATEMENT_LENGTH],
+            "statement": (exception_context.statement or "")[:STATEMENT_LENGTH],
+        }
+    )
+
+
+def _start_request():
+    g.sql_stats = RequestSqlStats(
+        current_app.config.get("SQL_INSTRUMENTATION_SLOWEST", DEFAULT_SLOWEST_COUNT)
+    )
+    g.sql_stats_started = time.perf_counter()
+
+
+def _finish_request(response):
+    stats = g.pop("sql_stats", None)
+    if stats is None:
+        return response
+    db_ms = stats.seconds * 1000
+    response.headers.add(
+        "Server-Timing", f'db;dur={db_ms:.3f};desc="{stats.count} queries"'
+    )
+    logger.info(
+        json.dumps(
+            {
+                "method": request.method,
+                "path": request.path,
+                "endpoint": request.endpoint,
+                "status": response.status_code,
+                "duration_ms": round(
+                    (time.perf_counter() - g.sql_stats_started) * 1000, 3
+                ),
+                "query_count": stats.count,
+                "db_ms": round(db_ms, 3),
+                "slowest": stats.slowest,
+                "errors": stats.errors,
+            }
+        )
+    )
+    return response
+
+
+def init_app(app):
+    """Record the statements of each request when SQL_INSTRUMENTATION is enabled.
+    Totals are returned in a Server-Timing header and logged, along with the slowest statements, as a json line
+    """
+    if not app.config.get("SQL_INSTRUMENTATION"):
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+# Worker threads used when neither the JOB_WORKERS setting nor environment variable is given
+DEFAULT_WORKERS = 2
+
+
+class LocalJobQueue:
+    """Runs jobs on a pool of threads within the api process, each within an app context of its own.
+    With no workers jobs are run as they are submitted, e.g. for tests against an in memory sqlite database.
+    Any object providing the same ``submit`` method can be configured in its place via the JOB_QUEUE setting,
+    e.g. to hand jobs to workers outside of the api
+    """
+
+    def __init__(self, workers: int):
+        self._executor = (
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="airview-job")
+            if workers > 0
+            else None
+        )
+
+    def submit(self, func, *args):
+        if self._executor is None:
+            func(*args)
+            return
+
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                func(*args)
+
+        self._executor.submit(run)
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs, waiting for those already submitted to finish when wait is set"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+
+class DeferredJobQueue:
+    """Leaves submitted jobs queued in the database for compliance_job_service.run_queued to pick up,
+    for deployments where threads do not outlive the request which started them, e.g. lambda
+    """
+
+    def submit(self, func, *args):
+        pass
+
+
+def init_app(app):
+    queue = app.config.get("JOB_QUEUE")
+    if queue is None:
+        queue = LocalJobQueue(app.config["JOB_WORKERS"])
+    app.extensions["airview_job_queue"] = queue
+
+
+def get_queue():
+    """Get the job queue configured for the current app"""
+    return current_app.extensions["airview_job_queue"]
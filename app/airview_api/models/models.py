@@ -54,6 +54,24 @@ class QualityModel(Enum):
         return self.name
 
 
+class SnapshotBucket(Enum):
+    HOUR = 1
+    DAY = 2
+
+    def __str__(self):
+        return self.name
+
+
+class ComplianceJobStatus(Enum):
+    QUEUED = 1
+    RUNNING = 2
+    SUCCEEDED = 3
+    FAILED = 4
+
+    def __str__(self):
+        return self.name
+
+
 class ApplicationType(Enum):
     BUSINESS_APPLICATION = 1
     TECHNICAL_SERVICE = 2
@@ -117,10 +135,11 @@ class ApplicationEnvironment(db.Model):
     environment = db.relationship(
         "Environment", back_populates="application_environments"
     )
+    # Loaded as a list so that listing endpoints can eager load it
     references = db.relationship(
         "ApplicationEnvironmentReference",
         back_populates="application_environment",
-        lazy="dynamic",
+        order_by="ApplicationEnvironmentReference.type",
     )
     resources = db.relationship(
         "Resource", back_populates="application_environment", lazy="dynamic"
@@ -130,6 +149,10 @@ class ApplicationEnvironment(db.Model):
         "Exclusion", back_populates="application_environment", lazy="dynamic"
     )
 
+    __table_args__ = (
+        db.Index("ix_application_environment_application_id", "application_id"),
+    )
+
     def __repr__(self):
         return f"{self.name}"
 
@@ -265,6 +288,11 @@ class ResourceTypeControl(db.Model):
         db.ForeignKey("control.id"),
     )
 
+    __table_args__ = (
+        db.Index("ix_resource_type_control_resource_type_id", "resource_type_id"),
+        db.Index("ix_resource_type_control_control_id", "control_id"),
+    )
+
 
 class Control(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -319,6 +347,7 @@ class TechnicalControl(db.Model):
             "reference",
             name="uq_technical_control",
         ),
+        db.Index("ix_technical_control_control_id", "control_id"),
     )
 
     def __repr__(self):
@@ -348,6 +377,8 @@ class ExclusionResource(db.Model):
         db.Integer, db.ForeignKey("exclusion.id"), primary_key=True
     )
 
+    __table_args__ = (db.Index("ix_exclusion_resource_exclusion_id", "exclusion_id"),)
+
 
 class ResourceType(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -412,6 +443,8 @@ class Resource(db.Model):
             "application_environment_id",
             name="uq_resource",
         ),
+        db.Index("ix_resource_application_environment_id", "application_environment_id"),
+        db.Index("ix_resource_resource_type_id", "resource_type_id"),
     )
 
 
@@ -438,6 +471,35 @@ class MonitoredResource(db.Model):
         "TechnicalControl", back_populates="monitored_resources"
     )
 
+    __table_args__ = (
+        db.UniqueConstraint(
+            "technical_control_id",
+            "resource_id",
+            name="uq_monitored_resource",
+        ),
+        db.Index("ix_monitored_resource_resource_id", "resource_id"),
+        db.Index("ix_monitored_resource_monitoring_state", "monitoring_state"),
+        # Expired rows of a technical control are found by range scan when reconciling
+        db.Index(
+            "ix_monitored_resource_technical_control_id_last_seen",
+            "technical_control_id",
+            "last_seen",
+        ),
+    )
+
+
+class MonitoredResourceTransition(db.Model):
+    """Append only record of each change to the monitoring state of a monitored resource, written by monitored_resource_service.
+    Ids only ever increase so they are used as the cursor of the change feed
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    technical_control_id = db.Column(db.Integer, nullable=False)
+    resource_id = db.Column(db.Integer, nullable=False)
+    old_state = db.Column(db.Enum(MonitoredResourceState), nullable=True)
+    new_state = db.Column(db.Enum(MonitoredResourceState), nullable=False)
+    transitioned_at = db.Column(db.DateTime, nullable=False)
+
 
 """ This needs looking at again post 'hackathon'
     @hybrid_property
@@ -457,15 +519,6 @@ class MonitoredResource(db.Model):
         )
 """
 
-# __table_args__ = (
-# db.UniqueConstraint(
-# "application_technical_control_id",
-# "resource_id",
-# name="uq_monitored_resource",
-# ),
-# )
-
-
 # class MonitoredResourceTicket(db.Model):
 #     id = db.Column(db.Integer, primary_key=True)
 #     monitored_resource_id = db.Column(
@@ -505,6 +558,125 @@ class Exclusion(db.Model):
         "Resource", secondary=ExclusionResource.__table__, back_populates="exclusions"
     )
 
+    __table_args__ = (db.Index("ix_exclusion_control_id", "control_id"),)
+
+
+class ComplianceFact(db.Model):
+    """Denormalised row per monitored resource which is not deleted, maintained by compliance_fact_service"""
+
+    monitored_resource_id = db.Column(db.Integer, primary_key=True)
+    technical_control_id = db.Column(db.Integer, nullable=False)
+    resource_id = db.Column(db.Integer, nullable=False)
+    application_environment_id = db.Column(db.Integer, nullable=False)
+    environment_id = db.Column(db.Integer, nullable=False)
+    application_id = db.Column(db.Integer, nullable=False)
+    control_id = db.Column(db.Integer, nullable=True)
+    system_id = db.Column(db.Integer, nullable=True)
+
+    resource_reference = db.Column(db.String(500), nullable=False)
+    application_name = db.Column(db.String(500), nullable=False)
+    environment_name = db.Column(db.String(500), nullable=False)
+    technical_control_reference = db.Column(db.String(500), nullable=False)
+    technical_control_name = db.Column(db.String(500), nullable=False)
+    control_name = db.Column(db.String(500), nullable=True)
+    control_severity = db.Column(db.String(50), nullable=True)
+    system_name = db.Column(db.String(500), nullable=True)
+    system_stage = db.Column(db.String(50), nullable=True)
+    is_compliant = db.Column(db.Integer, nullable=False)
+    excluded = db.Column(db.Integer, nullable=False)
+    is_flagged = db.Column(db.Integer, nullable=False, server_default="0")
+
+    __table_args__ = (
+        db.Index("ix_compliance_fact_technical_control_id", "technical_control_id"),
+        db.Index("ix_compliance_fact_resource_id", "resource_id"),
+        db.Index(
+            "ix_compliance_fact_application_environment_id",
+            "application_environment_id",
+        ),
+        db.Index("ix_compliance_fact_environment_id", "environment_id"),
+        db.Index("ix_compliance_fact_application_id", "application_id"),
+        db.Index("ix_compliance_fact_control_id", "control_id"),
+        db.Index("ix_compliance_fact_system_id", "system_id"),
+    )
+
+
+class ComplianceCounter(db.Model):
+    """Compliance counts of the facts sharing an application, environment and control, maintained by compliance_counter_service.
+    Facts of technical controls which are not mapped to a control are counted against control_id 0
+    """
+
+    application_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    environment_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    control_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    application_name = db.Column(db.String(500), nullable=False)
+    environment_name = db.Column(db.String(500), nullable=False)
+    control_name = db.Column(db.String(500), nullable=True)
+    control_severity = db.Column(db.String(50), nullable=True)
+    total = db.Column(db.Integer, nullable=False)
+    compliant = db.Column(db.Integer, nullable=False)
+    flagged = db.Column(db.Integer, nullable=False)
+    excluded = db.Column(db.Integer, nullable=False)
+
+
+class ComplianceSnapshot(db.Model):
+    """Compliance counts of an application, environment and control as last seen within a time bucket,
+    written from the compliance counters by compliance_history_service
+    """
+
+    bucket = db.Column(db.Enum(SnapshotBucket), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    application_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    environment_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    control_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    quality_model = db.Column(db.Enum(QualityModel), nullable=True)
+    control_severity = db.Column(db.String(50), nullable=True)
+    total = db.Column(db.Integer, nullable=False)
+    compliant = db.Column(db.Integer, nullable=False)
+    flagged = db.Column(db.Integer, nullable=False)
+    excluded = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index(
+            "ix_compliance_snapshot_bucket_application_id_bucket_start",
+            "bucket",
+            "application_id",
+            "bucket_start",
+        ),
+    )
+
+
+class ComplianceJob(db.Model):
+    """A /compliance/ aggregate run outside of the request which asked for it, by compliance_job_service.
+    The result is kept as gzipped newline delimited json until the job expires
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.Enum(ComplianceJobStatus), nullable=False)
+    odata_select = db.Column(db.String(2000), nullable=False)
+    odata_filter = db.Column(db.Text, nullable=True)
+    created = db.Column(db.DateTime, nullable=False)
+    started = db.Column(db.DateTime, nullable=True)
+    finished = db.Column(db.DateTime, nullable=True)
+    row_count = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.String(500), nullable=True)
+    # Only loaded when the result is fetched
+    result = db.deferred(db.Column(db.LargeBinary, nullable=True))
+
+    __table_args__ = (
+        db.Index("ix_compliance_job_status_created", "status", "created"),
+    )
+
+
+class ApplicationDataVersion(db.Model):
+    """Counter bumped on every write which affects an application's aggregations, maintained by data_version_service.
+    The row with application_id 0 is bumped by writes to shared definitions which affect every application
+    """
+
+    application_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False)
+
 
 class NamedUrl:
     def __init__(self, name, url):
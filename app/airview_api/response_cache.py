@@ -0,0 +1,43 @@
+from collections import OrderedDict
+from threading import Lock
+from flask import current_app
+
+
+class ResponseCache:
+    """In process LRU cache of serialized responses.
+    Any object providing the same ``get``/``set`` methods can be configured in its place via the RESPONSE_CACHE setting,
+    e.g. to share responses between workers
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self._max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+
+def init_app(app):
+    cache = app.config.get("RESPONSE_CACHE")
+    if cache is None:
+        cache = ResponseCache(app.config.get("RESPONSE_CACHE_SIZE", 1024))
+    app.extensions["airview_response_cache"] = cache
+
+
+def get_cache():
+    """Get the response cache configured for the current app"""
+    return current_app.extensions["airview_response_cache"]
@@ -96,6 +96,28 @@ class ResourceSchema(CamelCaseSchema):
     application_environment_id = ma.fields.Integer(required=True)
 
 
+class ResourceBatchSchema(CamelCaseSchema):
+    application_environment_id = ma.fields.Integer(required=True)
+    resources = ma.fields.List(
+        ma.fields.Nested(
+            ResourceSchema(only=("name", "reference", "resource_type_id"))
+        ),
+        required=True,
+    )
+    stale_before = ma.fields.DateTime(required=False)
+
+
+class StaleResourcesQuerySchema(CamelCaseSchema):
+    application_environment_id = ma.fields.Integer(required=True)
+    last_seen_before = ma.fields.DateTime(required=True)
+
+
+class ResourceBatchResultSchema(CamelCaseSchema):
+    id = ma.fields.Integer()
+    reference = ma.fields.Str()
+    outcome = ma.fields.Str()
+
+
 class MonitoredResourceSchema(CamelCaseSchema):
     technical_control_id = ma.fields.Integer(required=True)
     resource_id = ma.fields.Integer(required=True)
@@ -103,6 +125,25 @@ class MonitoredResourceSchema(CamelCaseSchema):
     additional_data = ma.fields.Str(required=False)
 
 
+class MonitoredResourceBatchResultSchema(CamelCaseSchema):
+    technical_control_id = ma.fields.Integer()
+    resource_id = ma.fields.Integer()
+    outcome = ma.fields.Str()
+
+
+class MonitoredResourceTransitionSchema(CamelCaseSchema):
+    id = ma.fields.Integer()
+    technical_control_id = ma.fields.Integer()
+    resource_id = ma.fields.Integer()
+    old_state = ma.fields.Str(allow_none=True)
+    new_state = ma.fields.Str()
+    transitioned_at = ma.fields.DateTime()
+
+
+class MonitoredResourceChangesQuerySchema(CamelCaseSchema):
+    since = ma.fields.Integer(required=False, missing=0)
+
+
 class IdAndNameSchema(CamelCaseSchema):
     id = ma.fields.Integer()
     name = ma.fields.Str()
@@ -279,6 +320,43 @@ class ComplianceDataSchema(CamelCaseSchema):
     total = ma.fields.Integer()
 
 
+class ComplianceHistoryQuerySchema(CamelCaseSchema):
+    start = ma.fields.DateTime(required=True)
+    end = ma.fields.DateTime(required=True)
+    bucket = ma.fields.Str(
+        required=False, missing="DAY", validate=ma.validate.OneOf(["HOUR", "DAY"])
+    )
+    application_id = ma.fields.Integer(required=False)
+    quality_model = ma.fields.Str(required=False)
+
+
+class ComplianceHistorySchema(CamelCaseSchema):
+    bucket_start = ma.fields.DateTime()
+    application_id = ma.fields.Integer()
+    quality_model = ma.fields.Str(allow_none=True)
+    total = ma.fields.Integer()
+    compliant = ma.fields.Integer()
+    flagged = ma.fields.Integer()
+    excluded = ma.fields.Integer()
+
+
+class ComplianceJobRequestSchema(CamelCaseSchema):
+    select = ma.fields.Str(required=True)
+    filter = ma.fields.Str(required=False)
+
+
+class ComplianceJobSchema(CamelCaseSchema):
+    id = ma.fields.Integer()
+    status = ma.fields.Str()
+    select = ma.fields.Str(attribute="odata_select")
+    filter = ma.fields.Str(attribute="odata_filter", allow_none=True)
+    created = ma.fields.DateTime()
+    started = ma.fields.DateTime(allow_none=True)
+    finished = ma.fields.DateTime(allow_none=True)
+    row_count = ma.fields.Integer(allow_none=True)
+    error = ma.fields.Str(allow_none=True)
+
+
 class ComplianceAggregationSchema(CamelCaseSchema):
     id = ma.fields.Integer()
     environment_name = ma.fields.Str()
@@ -302,3 +380,15 @@ class ExclusionSchema(CamelCaseSchema):
     resources = ma.fields.List(ma.fields.Integer(required=True))
     status = ma.fields.Str()
     notes = ma.fields.Str()
+
+
+class PoolStatsSchema(CamelCaseSchema):
+    pool_class = ma.fields.Str()
+    size = ma.fields.Integer()
+    checked_in = ma.fields.Integer()
+    checked_out = ma.fields.Integer()
+    overflow = ma.fields.Integer()
+    checkouts = ma.fields.Integer()
+    timeouts = ma.fields.Integer()
+    wait_seconds_total = ma.fields.Float()
+    wait_seconds_max = ma.fields.Float()
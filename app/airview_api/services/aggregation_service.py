@@ -1,7 +1,7 @@
 from airview_api.database import db
 from sqlalchemy import distinct, func, join, literal, case
 from sqlalchemy.sql.functions import coalesce
-import itertools
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from datetime import datetime
 import json
 
@@ -19,73 +19,47 @@ from airview_api.models import (
     Service,
     ResourceType,
     ResourceTypeControl,
+    ControlSeverity,
 )
 
 
-def get_control_overview_totals(application_id: int):
-    total = (
-        db.select(func.count(distinct(Control.id)).label("total"))
-        .select_from(Control)
-        .join(ResourceTypeControl)
-        .join(ResourceType)
-        .join(Resource)
-        .join(ApplicationEnvironment)
-        .where(ApplicationEnvironment.application_id == application_id)
-        .subquery()
+def _control_overview_totals_query(application_id: int):
+    flagged = (
+        db.select(MonitoredResource.id)
+        .where(MonitoredResource.resource_id == Resource.id)
+        .where(MonitoredResource.monitoring_state == MonitoredResourceState.FLAGGED)
+        .exists()
     )
-    sev = (
-        db.select(func.count(distinct(Control.id)).label("id"))
+    applied = (
+        db.select(Control.id, Control.severity, flagged.label("flagged"))
         .select_from(Control)
         .join(ResourceTypeControl)
         .join(ResourceType)
         .join(Resource)
         .join(ApplicationEnvironment)
-        .join(MonitoredResource)
-        .join(TechnicalControl)
         .where(ApplicationEnvironment.application_id == application_id)
-        .where(MonitoredResource.monitoring_state == "FLAGGED")
+        .subquery()
     )
 
-    qry = (
-        db.select(
-            total.c.total,
-            func.sum(
-                case(
-                    (
-                        Control.severity == "LOW",
-                        1,
-                    ),
-                    else_=0,
-                )
-            ).label("low"),
-            func.sum(
-                case(
-                    (
-                        Control.severity == "MEDIUM",
-                        1,
-                    ),
-                    else_=0,
-                )
-            ).label("medium"),
-            func.sum(
-                case(
-                    (
-                        Control.severity == "HIGH",
-                        1,
-                    ),
-                    else_=0,
-                )
-            ).label("high"),
+    def flagged_controls(severity):
+        return func.count(distinct(applied.c.id)).filter(
+            applied.c.flagged, applied.c.severity == severity
         )
-        .select_from(sev)
-        .join(Control, sev.c.id == Control.id)
-        .group_by(total.c.total)
+
+    # Every total is counted in the same pass over the application's controls
+    return db.select(
+        func.count(distinct(applied.c.id)).label("total"),
+        flagged_controls(ControlSeverity.LOW).label("low"),
+        flagged_controls(ControlSeverity.MEDIUM).label("medium"),
+        flagged_controls(ControlSeverity.HIGH).label("high"),
     )
-    print(qry)
-    result = db.session.execute(qry).all()
-    if len(result) == 1:
-        return result[0]
-    return None
+
+
+def get_control_overview_totals(application_id: int):
+    """Get the number of controls applied to an application and, by severity, how many are flagged.
+    Repeat reads are served by the aggregations blueprint's response cache until the application's data version moves on
+    """
+    return db.session.execute(_control_overview_totals_query(application_id)).one()
 
 
 def get_control_overviews(application_id: int, quality_model: str):
@@ -141,20 +115,40 @@ def get_application_quality_models(application_id):
     return mapped
 
 
-def get_compliance_aggregation(application_id):
+def _resource_list(id_column, name_column):
+    # Aggregate the resources of each group into a json list within the database
+    if db.engine.dialect.name == "postgresql":
+        return func.json_agg(
+            aggregate_order_by(
+                func.json_build_object(
+                    "id", id_column, "name", name_column, "status", "none"
+                ),
+                id_column,
+            ),
+            type_=db.JSON,
+        )
+    return func.json_group_array(
+        func.json_object("id", id_column, "name", name_column, "status", "none"),
+        type_=db.JSON,
+    )
+
+
+def get_compliance_aggregation(application_id, page=None):
+    group = (
+        TechnicalControl.id,
+        Environment.name,
+        System.name,
+        System.stage,
+        TechnicalControl.name,
+        coalesce(Control.severity, literal("HIGH")),
+        coalesce(Control.name, literal("Unmapped")),
+        coalesce(Control.id, literal(0)),
+    )
     qry = (
         db.select(
-            TechnicalControl.id,
-            Environment.name,
-            System.name,
-            System.stage,
-            TechnicalControl.name,
-            coalesce(Control.severity, literal("HIGH")),
-            coalesce(Control.name, literal("Unmapped")),
-            coalesce(Control.id, literal(0)),
-            Resource.id,
-            Resource.name,
-            MonitoredResource.last_modified,
+            *group,
+            _resource_list(Resource.id, Resource.name),
+            func.min(MonitoredResource.last_modified),
         )
         .select_from(Environment)
         .join(ApplicationEnvironment)
@@ -165,42 +159,31 @@ def get_compliance_aggregation(application_id):
         .join(System, isouter=True)
         .where(MonitoredResource.monitoring_state == MonitoredResourceState.FLAGGED)
         .where(ApplicationEnvironment.application_id == application_id)
+        .group_by(*group)
     )
-
-    result = db.session.execute(qry).all()
-
-    key_func = lambda x: (x[:9])
-    d = list()
-    for key, group in itertools.groupby(result, key_func):
-        m = None
-        res = []
-        # must be converted or results are inconsistant - https://stackoverflow.com/questions/39442128/itertools-groupby-function-seems-inconsistent
-        list_group = list(group)
-        last_modified = datetime.max
-        for item in list_group:
-            last_modified = item[10] if item[10] < last_modified else last_modified
-            res = [{"id": g[8], "name": g[9], "status": "none"} for g in list_group]
-
-        d.append(
-            {
-                "id": key[0],
-                "environment_name": key[1],
-                "system_name": key[2],
-                "system_stage": key[3],
-                "technical_control_name": key[4],
-                "severity": str.lower(key[5].name).replace("critical", "high"),
-                "control_name": key[6],
-                "control_id": key[7],
-                "resources": res,
-                "raised_date_time": last_modified,
-                "tickets": [],
-            }
-        )
-
-    return d
-
-
-def get_control_overview_resources(application_id, technical_control_id):
+    if page is None:
+        qry = qry.order_by(TechnicalControl.id, Environment.name)
+    else:
+        qry = page.where(qry, TechnicalControl.id, Environment.name)
+
+    result = db.session.execute(qry.execution_options(yield_per=1000))
+    for row in result:
+        yield {
+            "id": row[0],
+            "environment_name": row[1],
+            "system_name": row[2],
+            "system_stage": row[3],
+            "technical_control_name": row[4],
+            "severity": str.lower(row[5].name).replace("critical", "high"),
+            "control_name": row[6],
+            "control_id": row[7],
+            "resources": row[8],
+            "raised_date_time": row[9],
+            "tickets": [],
+        }
+
+
+def get_control_overview_resources(application_id, technical_control_id, page=None):
     qry = (
         db.select(
             Service.type,
@@ -232,6 +215,8 @@ def get_control_overview_resources(application_id, technical_control_id):
         .where(ApplicationEnvironment.application_id == application_id)
         .where(TechnicalControl.id == technical_control_id)
     )
+    if page is not None:
+        qry = page.where(qry, Resource.id)
 
     result = db.session.execute(qry).all()
     return result
@@ -1,4 +1,5 @@
 from sqlalchemy.exc import IntegrityError, DataError
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy.log import Identified
 from airview_api.services import AirViewValidationException, AirViewNotFoundException
 from airview_api.models import (
@@ -12,24 +13,47 @@ from airview_api.database import db
 import itertools
 from collections import defaultdict
 import re
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+def _serialization_options():
+    # Everything ApplicationEnvironmentSchema nests, so that dumping many rows takes a fixed number of queries
+    return (
+        joinedload(ApplicationEnvironment.application),
+        joinedload(ApplicationEnvironment.environment),
+        selectinload(ApplicationEnvironment.references),
+    )
 
 
 def get_by_id(application_environment_id: int):
-    app = ApplicationEnvironment.query.get(application_environment_id)
+    app = ApplicationEnvironment.query.options(*_serialization_options()).get(
+        application_environment_id
+    )
     return app
 
 
 def get_by_application(application_id: int):
-    return ApplicationEnvironment.query.filter_by(application_id=application_id)
+    return ApplicationEnvironment.query.options(*_serialization_options()).filter_by(
+        application_id=application_id
+    )
 
 
 def get_by_reference(type, reference):
-    link = ApplicationEnvironmentReference.query.filter_by(
-        type=type, reference=reference
-    ).first()
-    if link is None:
+    app = (
+        ApplicationEnvironment.query.options(*_serialization_options())
+        .join(ApplicationEnvironment.references)
+        .filter(
+            ApplicationEnvironmentReference.type == type,
+            ApplicationEnvironmentReference.reference == reference,
+        )
+        .first()
+    )
+    if app is None:
         raise AirViewNotFoundException()
-    return link.application_environment
+    return app
 
 
 def create(data: dict):
@@ -43,9 +67,8 @@ def create(data: dict):
 
         db.session.add(app)
         db.session.commit()
-    except (IntegrityError, DataError) as e:
-        print(e)
-
+    except (IntegrityError, DataError):
+        logger.warning("Could not save application environment", exc_info=True)
         db.session.rollback()
         raise AirViewValidationException("Integrity Error, check reference fields")
     return app
@@ -63,7 +86,7 @@ def update(data: dict):
         app.application_id = data["application_id"]
 
         # Get the existing reference values
-        existing_references = app.references.all()
+        existing_references = list(app.references)
 
         # Remove any non-present references
         for r in existing_references:
@@ -88,7 +111,7 @@ def update(data: dict):
         app.references.extend(references_to_add)
 
         db.session.commit()
-    except (IntegrityError, DataError) as e:
+    except (IntegrityError, DataError):
+        logger.warning("Could not save application environment", exc_info=True)
         db.session.rollback()
-        print(e)
         raise AirViewValidationException("Integrity Error, check reference fields")
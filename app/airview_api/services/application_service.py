@@ -10,13 +10,17 @@ from airview_api.database import db
 import itertools
 from collections import defaultdict
 import re
+import logging
+
+
+logger = logging.getLogger(__name__)
 
 
 def get_all(application_type: str = None):
     if application_type is not None:
         return Application.query.filter_by(application_type=application_type)
 
-    return Application.query.all()  #
+    return Application.query
 
 
 def get_by_id(application_id: int):
@@ -31,9 +35,8 @@ def create(data: dict):
     try:
         db.session.add(app)
         db.session.commit()
-    except (IntegrityError, DataError) as e:
-        print(e)
-
+    except (IntegrityError, DataError):
+        logger.warning("Could not save application", exc_info=True)
         db.session.rollback()
         raise AirViewValidationException("Integrity Error, check reference fields")
     return app
@@ -48,5 +51,6 @@ def update(data: dict):
     try:
         db.session.commit()
     except (IntegrityError, DataError):
+        logger.warning("Could not save application", exc_info=True)
         db.session.rollback()
         raise AirViewValidationException("Integrity Error, check reference fields")
@@ -0,0 +1,153 @@
+from sqlalchemy import delete, func, insert, literal, tuple_
+from sqlalchemy.sql.functions import coalesce
+from airview_api.models import ComplianceCounter
+from airview_api.database import db, upsert
+
+# Keys per statement. Keeps the bound parameter count within the limits of both postgres and sqlite
+CHUNK_SIZE = 500
+
+_COUNTER_KEY = (
+    ComplianceCounter.application_id,
+    ComplianceCounter.environment_id,
+    ComplianceCounter.control_id,
+)
+
+_KEY_NAMES = [c.key for c in _COUNTER_KEY]
+
+# Columns of a counter copied from its facts, and those summed from them in the order of _delta
+_NAME_COLUMNS = (
+    "application_name",
+    "environment_name",
+    "control_name",
+    "control_severity",
+)
+_COUNTED_COLUMNS = ("total", "compliant", "flagged", "excluded")
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _counts(facts):
+    # facts is any selectable with the columns of compliance_fact, grouped into one row per counter
+    control_id = coalesce(facts.c.control_id, literal(0))
+    return (
+        db.select(
+            facts.c.application_id,
+            facts.c.environment_id,
+            control_id,
+            func.max(facts.c.application_name),
+            func.max(facts.c.environment_name),
+            func.max(facts.c.control_name),
+            func.max(facts.c.control_severity),
+            func.count(),
+            func.sum(facts.c.is_compliant),
+            func.sum(facts.c.is_flagged),
+            func.sum(facts.c.excluded),
+        )
+        .select_from(facts)
+        .group_by(facts.c.application_id, facts.c.environment_id, control_id)
+    )
+
+
+def _key(fact):
+    # Facts without a control are counted against 0
+    return fact.application_id, fact.environment_id, fact.control_id or 0
+
+
+def _delta(fact, sign):
+    return [
+        sign,
+        sign * fact.is_compliant,
+        sign * fact.is_flagged,
+        sign * fact.excluded,
+    ]
+
+
+def apply(connection, before, after):
+    """Move the counters on by the difference between two sets of facts.
+    Called by compliance_fact_service within the transaction which changed the facts, so the cost follows the facts which
+    changed rather than the size of the counters they fall in. Counters are incremented in place, in key order, so writers
+    touching the same counters queue on them and each adds its own change to the count left by those before it
+    :param connection: Connection to write with
+    :param before: Dict of monitored_resource_id to its fact before the change, missing when it had none
+    :param after: Dict of monitored_resource_id to its fact after the change, missing when it has none
+    """
+    deltas = {}
+    # Names to write to each counter, from a fact counted into it where there is one
+    names = {}
+    for fact_id in before.keys() | after.keys():
+        old, new = before.get(fact_id), after.get(fact_id)
+        if old == new:
+            continue
+        for fact, sign in ((old, -1), (new, 1)):
+            if fact is None:
+                continue
+            key = _key(fact)
+            totals = deltas.setdefault(key, [0, 0, 0, 0])
+            for i, value in enumerate(_delta(fact, sign)):
+                totals[i] += value
+            if sign > 0 or key not in names:
+                names[key] = fact
+    # Keys whose counts net out are still written, the names they are counted under may have changed
+    changed = sorted(deltas)
+    if not changed:
+        return
+
+    table = ComplianceCounter.__table__
+    stmt = upsert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[c.key for c in _COUNTER_KEY],
+        set_={
+            **{c: stmt.excluded[c] for c in _NAME_COLUMNS},
+            **{c: table.c[c] + stmt.excluded[c] for c in _COUNTED_COLUMNS},
+        },
+    )
+    connection.execute(
+        stmt,
+        [
+            dict(
+                zip(_KEY_NAMES, key),
+                **{c: getattr(names[key], c) for c in _NAME_COLUMNS},
+                **dict(zip(_COUNTED_COLUMNS, deltas[key])),
+            )
+            for key in changed
+        ],
+    )
+    # Counters whose last fact was counted out
+    for chunk in _chunks(changed, CHUNK_SIZE):
+        connection.execute(
+            delete(ComplianceCounter).where(
+                tuple_(*_COUNTER_KEY).in_(chunk), ComplianceCounter.total <= 0
+            )
+        )
+
+
+def verify(source) -> dict:
+    """Recount every counter from source and correct those which have drifted
+    :param source: Select with the columns of compliance_fact, built from the source tables rather than the facts
+    :return: Number of counters expected and how many were missing, stale or left over
+    """
+    expected = {
+        tuple(row[:3]): tuple(row[3:])
+        for row in db.session.execute(_counts(source.subquery()))
+    }
+    stored = {
+        tuple(row[:3]): tuple(row[3:])
+        for row in db.session.execute(db.select(*ComplianceCounter.__table__.columns))
+    }
+    drifted = sorted(
+        k for k in expected.keys() | stored.keys() if expected.get(k) != stored.get(k)
+    )
+
+    columns = [c.key for c in ComplianceCounter.__table__.columns]
+    for chunk in _chunks(drifted, CHUNK_SIZE):
+        db.session.execute(
+            delete(ComplianceCounter).where(tuple_(*_COUNTER_KEY).in_(chunk))
+        )
+        rows = [dict(zip(columns, k + expected[k])) for k in chunk if k in expected]
+        if rows:
+            db.session.execute(insert(ComplianceCounter), rows)
+    db.session.commit()
+    return {"counters": len(expected), "drifted": len(drifted)}
@@ -0,0 +1,265 @@
+from itertools import chain
+from sqlalchemy import String, case, cast, delete, event, inspect, tuple_, update
+from airview_api.models import (
+    Application,
+    ApplicationEnvironment,
+    ComplianceCounter,
+    ComplianceFact,
+    Control,
+    Environment,
+    Exclusion,
+    ExclusionResource,
+    MonitoredResource,
+    MonitoredResourceState,
+    Resource,
+    System,
+    TechnicalControl,
+)
+from airview_api.database import db, upsert
+from airview_api.services import compliance_counter_service
+
+# Ids per statement. Keeps the bound parameter count within the limits of both postgres and sqlite
+CHUNK_SIZE = 500
+
+# For each source model, the fact column holding its id and the column it is joined on.
+# MonitoredResource is first as it is the only source whose change can move a fact onto other parents
+_DEPENDENCIES = {
+    MonitoredResource: (ComplianceFact.monitored_resource_id, MonitoredResource.id),
+    TechnicalControl: (ComplianceFact.technical_control_id, TechnicalControl.id),
+    Resource: (ComplianceFact.resource_id, Resource.id),
+    ApplicationEnvironment: (
+        ComplianceFact.application_environment_id,
+        ApplicationEnvironment.id,
+    ),
+    Environment: (ComplianceFact.environment_id, Environment.id),
+    Application: (ComplianceFact.application_id, Application.id),
+    Control: (ComplianceFact.control_id, Control.id),
+    System: (ComplianceFact.system_id, System.id),
+}
+
+# Columns copied onto the facts, and the counters, from a source model by attribute as (fact column, counter column).
+# A change to only these is copied across in one statement, rather than rebuilding every fact beneath the row, so
+# renaming an application with many resources does not rewrite all of their facts
+_COPIED_COLUMNS = {
+    Application: {
+        "name": (ComplianceFact.application_name, ComplianceCounter.application_name)
+    },
+    Environment: {
+        "name": (ComplianceFact.environment_name, ComplianceCounter.environment_name)
+    },
+    Control: {"name": (ComplianceFact.control_name, ComplianceCounter.control_name)},
+    System: {"name": (ComplianceFact.system_name, None)},
+    TechnicalControl: {
+        "name": (ComplianceFact.technical_control_name, None),
+        "reference": (ComplianceFact.technical_control_reference, None),
+    },
+}
+
+# Columns recording when a row was last reported, no fact is built from them so changes to only these are skipped
+SEEN_COLUMNS = {"last_seen", "last_modified"}
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _is_state(state):
+    return case((MonitoredResource.monitoring_state == state, 1), else_=0)
+
+
+def _source_query():
+    excluded = (
+        db.select(ExclusionResource.resource_id)
+        .join(Exclusion, Exclusion.id == ExclusionResource.exclusion_id)
+        .where(
+            ExclusionResource.resource_id == Resource.id,
+            Exclusion.control_id == TechnicalControl.control_id,
+        )
+        .exists()
+    )
+    columns = [
+        MonitoredResource.id,
+        TechnicalControl.id,
+        Resource.id,
+        ApplicationEnvironment.id,
+        Environment.id,
+        Application.id,
+        Control.id,
+        System.id,
+        Resource.reference,
+        Application.name,
+        Environment.name,
+        TechnicalControl.reference,
+        TechnicalControl.name,
+        Control.name,
+        cast(Control.severity, String(50)),
+        System.name,
+        cast(System.stage, String(50)),
+        _is_state(MonitoredResourceState.MONITORING),
+        case((excluded, 1), else_=0),
+        _is_state(MonitoredResourceState.FLAGGED),
+    ]
+    return (
+        # Labelled as the fact columns so the query can stand in for the fact table
+        db.select(
+            *(
+                column.label(fact_column.key)
+                for column, fact_column in zip(
+                    columns, ComplianceFact.__table__.columns
+                )
+            )
+        )
+        .select_from(TechnicalControl)
+        .join(MonitoredResource)
+        .join(Resource)
+        .join(ApplicationEnvironment)
+        .join(Environment)
+        .join(Application)
+        .join(Control, isouter=True)
+        .join(System, isouter=True)
+        .where(MonitoredResource.monitoring_state != MonitoredResourceState.DELETED)
+    )
+
+
+def _facts(connection, condition):
+    # Locked in id order so writers refreshing the same facts queue on them, each reading the sources once those before it have
+    # committed rather than overwriting their facts with values read beforehand
+    rows = connection.execute(
+        db.select(*ComplianceFact.__table__.columns)
+        .where(condition)
+        .order_by(ComplianceFact.monitored_resource_id)
+        .with_for_update()
+    )
+    return {row.monitored_resource_id: row for row in rows}
+
+
+def _refresh(connection, fact_condition, source_condition):
+    before = _facts(connection, fact_condition)
+    after = {
+        row.monitored_resource_id: row
+        for row in connection.execute(_source_query().where(source_condition))
+    }
+    # Facts which did not match the condition before, such as those of a monitored resource moved onto it, are counted out
+    # of where they were
+    for chunk in _chunks(sorted(after.keys() - before.keys()), CHUNK_SIZE):
+        before.update(
+            _facts(connection, ComplianceFact.monitored_resource_id.in_(chunk))
+        )
+
+    changed = [row._asdict() for i, row in after.items() if before.get(i) != row]
+    if changed:
+        columns = [c.key for c in ComplianceFact.__table__.columns]
+        stmt = upsert(ComplianceFact.__table__)
+        connection.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["monitored_resource_id"],
+                set_={c: stmt.excluded[c] for c in columns[1:]},
+            ),
+            changed,
+        )
+    # Facts of monitored resources which were deleted, or no longer match the condition
+    removed = sorted(before.keys() - after.keys())
+    for chunk in _chunks(removed, CHUNK_SIZE):
+        connection.execute(
+            delete(ComplianceFact).where(
+                ComplianceFact.monitored_resource_id.in_(chunk)
+            )
+        )
+
+    compliance_counter_service.apply(connection, before, after)
+
+
+def refresh(model, ids, connection=None):
+    """Rebuild the facts derived from the given rows of a source model.
+    Writes made through the session are picked up automatically on flush, this is for writes made with core statements
+    :param model: One of the models the compliance facts are built from
+    :param ids: Ids of the changed rows
+    :param connection: Connection to write with, defaults to the connection of the current session
+    """
+    fact_column, source_column = _DEPENDENCIES[model]
+    connection = connection or db.session.connection()
+    for chunk in _chunks(sorted(ids), CHUNK_SIZE):
+        _refresh(connection, fact_column.in_(chunk), source_column.in_(chunk))
+
+
+def refresh_monitored_resources(keys, connection=None):
+    """Rebuild the facts for monitored resources identified by (technical_control_id, resource_id)
+    :param keys: List of (technical_control_id, resource_id) tuples
+    :param connection: Connection to write with, defaults to the connection of the current session
+    """
+    connection = connection or db.session.connection()
+    for chunk in _chunks(list(keys), CHUNK_SIZE):
+        _refresh(
+            connection,
+            tuple_(ComplianceFact.technical_control_id, ComplianceFact.resource_id).in_(
+                chunk
+            ),
+            tuple_(
+                MonitoredResource.technical_control_id, MonitoredResource.resource_id
+            ).in_(chunk),
+        )
+
+
+def verify_counters() -> dict:
+    """Recount the compliance counters from the source tables, correcting any which have drifted.
+    Counters are kept up to date as the api writes, this guards against writes made outside of it
+    """
+    return compliance_counter_service.verify(_source_query())
+
+
+def changed_columns(instance) -> set:
+    """Get the columns of a flushed instance which changed, other than those recording when it was last reported"""
+    state = inspect(instance)
+    return {
+        attribute.key
+        for attribute in state.mapper.column_attrs
+        if state.attrs[attribute.key].history.has_changes()
+    } - SEEN_COLUMNS
+
+
+def _copy(connection, instance, attributes):
+    fact_column, _ = _DEPENDENCIES[type(instance)]
+    columns = _COPIED_COLUMNS[type(instance)]
+    values = {a: getattr(instance, a) for a in attributes}
+    connection.execute(
+        update(ComplianceFact)
+        .where(fact_column == instance.id)
+        .values({columns[a][0].key: v for a, v in values.items()})
+    )
+    counter_values = {
+        columns[a][1].key: v for a, v in values.items() if columns[a][1] is not None
+    }
+    if counter_values:
+        connection.execute(
+            update(ComplianceCounter)
+            .where(getattr(ComplianceCounter, fact_column.key) == instance.id)
+            .values(counter_values)
+        )
+
+
+def _refresh_after_flush(session, flush_context):
+    connection = session.connection()
+    changed = {}
+    dirty = session.dirty
+    for instance in chain(session.new, dirty, session.deleted):
+        model = type(instance)
+        if model not in _DEPENDENCIES:
+            continue
+        if instance in dirty:
+            attributes = changed_columns(instance)
+            if attributes <= _COPIED_COLUMNS.get(model, {}).keys():
+                if attributes:
+                    _copy(connection, instance, attributes)
+                continue
+        changed.setdefault(model, set()).add(instance.id)
+
+    for model in _DEPENDENCIES:
+        if model in changed:
+            refresh(model, changed[model], connection=connection)
+
+
+def register_listeners():
+    """Keep the facts in step with writes made through the session, called as the database is initialised"""
+    if not event.contains(db.session, "after_flush", _refresh_after_flush):
+        event.listen(db.session, "after_flush", _refresh_after_flush)
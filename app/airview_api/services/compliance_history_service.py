@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, func, insert
+from airview_api.models import (
+    ComplianceCounter,
+    ComplianceSnapshot,
+    Control,
+    QualityModel,
+    SnapshotBucket,
+)
+from airview_api.database import db
+from airview_api.services import AirViewValidationException
+
+# Hourly snapshots older than this are removed, the daily snapshots written alongside them are kept
+HOURLY_RETENTION = timedelta(days=7)
+
+# Rows per statement. Keeps the bound parameter count within the limits of both postgres and sqlite
+CHUNK_SIZE = 500
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def bucket_start(value: datetime, bucket: SnapshotBucket) -> datetime:
+    """Get the start of the bucket a point in time falls within"""
+    value = _utc(value).replace(minute=0, second=0, microsecond=0)
+    if bucket == SnapshotBucket.DAY:
+        value = value.replace(hour=0)
+    return value
+
+
+def take_snapshot(now: datetime = None) -> dict:
+    """Copy the compliance counters into the hourly and daily buckets now falls within, replacing earlier snapshots of them.
+    Run on a schedule, the last run within a bucket is what it records. Hourly snapshots past HOURLY_RETENTION are removed.
+    Returns the number of rows written and removed
+    """
+    now = _utc(now or datetime.utcnow())
+    counters = db.session.execute(
+        db.select(
+            ComplianceCounter.application_id,
+            ComplianceCounter.environment_id,
+            ComplianceCounter.control_id,
+            Control.quality_model,
+            ComplianceCounter.control_severity,
+            ComplianceCounter.total,
+            ComplianceCounter.compliant,
+            ComplianceCounter.flagged,
+            ComplianceCounter.excluded,
+        ).outerjoin(Control, Control.id == ComplianceCounter.control_id)
+    ).all()
+
+    metrics = {"written": 0, "removed": 0}
+    for bucket in SnapshotBucket:
+        start = bucket_start(now, bucket)
+        db.session.execute(
+            delete(ComplianceSnapshot).where(
+                ComplianceSnapshot.bucket == bucket,
+                ComplianceSnapshot.bucket_start == start,
+            )
+        )
+        rows = [
+            {"bucket": bucket, "bucket_start": start, **counter._asdict()}
+            for counter in counters
+        ]
+        for chunk in _chunks(rows, CHUNK_SIZE):
+            db.session.execute(insert(ComplianceSnapshot), chunk)
+        metrics["written"] += len(rows)
+
+    removed = db.session.execute(
+        delete(ComplianceSnapshot).where(
+            ComplianceSnapshot.bucket == SnapshotBucket.HOUR,
+            ComplianceSnapshot.bucket_start < now - HOURLY_RETENTION,
+        )
+    )
+    metrics["removed"] = removed.rowcount
+    db.session.commit()
+    return metrics
+
+
+def get_history(
+    start: datetime,
+    end: datetime,
+    bucket: SnapshotBucket,
+    application_id: int = None,
+    quality_model: str = None,
+):
+    """Get compliance counts by bucket, application and quality model for the buckets starting within [start, end)"""
+    start, end = _utc(start), _utc(end)
+    if end <= start:
+        raise AirViewValidationException("end must be after start")
+    if quality_model is not None and quality_model not in QualityModel.__members__:
+        raise AirViewValidationException(f"Unknown quality model: {quality_model}")
+
+    qry = (
+        db.select(
+            ComplianceSnapshot.bucket_start,
+            ComplianceSnapshot.application_id,
+            ComplianceSnapshot.quality_model,
+            func.sum(ComplianceSnapshot.total).label("total"),
+            func.sum(ComplianceSnapshot.compliant).label("compliant"),
+            func.sum(ComplianceSnapshot.flagged).label("flagged"),
+            func.sum(ComplianceSnapshot.excluded).label("excluded"),
+        )
+        .where(
+            ComplianceSnapshot.bucket == bucket,
+            ComplianceSnapshot.bucket_start >= start,
+            ComplianceSnapshot.bucket_start < end,
+        )
+        .group_by(
+            ComplianceSnapshot.bucket_start,
+            ComplianceSnapshot.application_id,
+            ComplianceSnapshot.quality_model,
+        )
+        .order_by(
+            ComplianceSnapshot.bucket_start,
+            ComplianceSnapshot.application_id,
+            ComplianceSnapshot.quality_model,
+        )
+    )
+    if application_id is not None:
+        qry = qry.where(ComplianceSnapshot.application_id == application_id)
+    if quality_model is not None:
+        qry = qry.where(ComplianceSnapshot.quality_model == QualityModel[quality_model])
+    return db.session.execute(qry).all()
@@ -0,0 +1,161 @@
+import gzip
+import io
+import json
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import delete, update
+from sqlalchemy.sql.functions import coalesce
+from airview_api import job_queue
+from airview_api.models import ComplianceJob, ComplianceJobStatus
+from airview_api.database import db
+from airview_api.services import (
+    AirViewNotFoundException,
+    AirViewValidationException,
+    compliance_service,
+)
+
+# Jobs, and their results, are removed this long after they finish
+JOB_RETENTION = timedelta(days=1)
+
+# Jobs still running this long after they started are taken to have died with their worker, e.g. on a restart or deploy
+JOB_TIMEOUT = timedelta(minutes=15)
+
+# Most jobs picked up by a single run_queued call
+RUN_QUEUED_LIMIT = 20
+
+logger = logging.getLogger(__name__)
+
+
+def _write_result(rows, fileobj) -> int:
+    # Rows are written as they are read so the result set is never held in memory in full, only its compressed form
+    count = 0
+    with gzip.GzipFile(fileobj=fileobj, mode="wb") as f:
+        for row in rows:
+            line = {
+                compliance_service._camelcase(k): v for k, v in row._mapping.items()
+            }
+            f.write((json.dumps(line) + "\n").encode("utf-8"))
+            count += 1
+    return count
+
+
+def submit(filter: str, select: str) -> ComplianceJob:
+    """Queue a compliance aggregate to be run by a worker, the query is validated before it is queued"""
+    compliance_service.get_aggregate_query(filter=filter, select=select)
+
+    job = ComplianceJob(
+        status=ComplianceJobStatus.QUEUED,
+        odata_select=select,
+        odata_filter=filter,
+        created=datetime.utcnow(),
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    job_queue.get_queue().submit(run, job.id)
+    return job
+
+
+def run(job_id: int) -> bool:
+    """Run a queued job, storing its result gzipped.
+    The job is claimed first so a job submitted to a worker and picked up by run_queued is only run once
+    :return: Whether the job was claimed and run
+    """
+    claimed = db.session.execute(
+        update(ComplianceJob)
+        .where(
+            ComplianceJob.id == job_id,
+            ComplianceJob.status == ComplianceJobStatus.QUEUED,
+        )
+        .values(status=ComplianceJobStatus.RUNNING, started=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return False
+
+    job = db.session.get(ComplianceJob, job_id)
+    values = {}
+    try:
+        rows = compliance_service.get_compliace_aggregate(
+            filter=job.odata_filter, select=job.odata_select, stream=True
+        )
+        with io.BytesIO() as buffer:
+            values["row_count"] = _write_result(rows, buffer)
+            values["result"] = buffer.getvalue()
+        values["status"] = ComplianceJobStatus.SUCCEEDED
+    except AirViewValidationException as e:
+        db.session.rollback()
+        values = {"status": ComplianceJobStatus.FAILED, "error": str(e)[:500]}
+    except Exception:
+        db.session.rollback()
+        logger.exception("Compliance job %s failed", job_id)
+        values = {
+            "status": ComplianceJobStatus.FAILED,
+            "error": "The query could not be completed",
+        }
+
+    db.session.execute(
+        update(ComplianceJob)
+        .where(ComplianceJob.id == job_id)
+        .values(finished=datetime.utcnow(), **values)
+    )
+    db.session.commit()
+    return True
+
+
+def run_queued(limit: int = RUN_QUEUED_LIMIT, now: datetime = None) -> dict:
+    """Run jobs left queued, oldest first, e.g. when the api uses a DeferredJobQueue or restarted before running them.
+    Jobs running for longer than JOB_TIMEOUT are failed, they are not retried as the job itself may be what killed its worker.
+    Jobs which finished, or were created if they never did, more than JOB_RETENTION ago are removed
+    :return: Number of jobs abandoned, run and removed
+    """
+    now = now or datetime.utcnow()
+    abandoned = db.session.execute(
+        update(ComplianceJob)
+        .where(
+            ComplianceJob.status == ComplianceJobStatus.RUNNING,
+            ComplianceJob.started < now - JOB_TIMEOUT,
+        )
+        .values(
+            status=ComplianceJobStatus.FAILED,
+            finished=now,
+            error="The job did not finish, it can be queued again",
+        )
+    ).rowcount
+    db.session.commit()
+
+    job_ids = db.session.scalars(
+        db.select(ComplianceJob.id)
+        .where(ComplianceJob.status == ComplianceJobStatus.QUEUED)
+        .order_by(ComplianceJob.created, ComplianceJob.id)
+        .limit(limit)
+    ).all()
+    ran = sum(1 for job_id in job_ids if run(job_id))
+
+    removed = db.session.execute(
+        delete(ComplianceJob).where(
+            coalesce(ComplianceJob.finished, ComplianceJob.created)
+            < now - JOB_RETENTION
+        )
+    ).rowcount
+    db.session.commit()
+    return {"abandoned": abandoned, "ran": ran, "removed": removed}
+
+
+def get_by_id(job_id: int) -> ComplianceJob:
+    job = db.session.get(ComplianceJob, job_id)
+    if job is None:
+        raise AirViewNotFoundException()
+    return job
+
+
+def get_result(job_id: int) -> bytes:
+    """Get the gzipped newline delimited json result of a job
+    :raises AirViewValidationException: When the job has not succeeded
+    """
+    job = get_by_id(job_id)
+    if job.status != ComplianceJobStatus.SUCCEEDED:
+        raise AirViewValidationException(
+            f"The job has not succeeded, it is {job.status}"
+        )
+    return job.result
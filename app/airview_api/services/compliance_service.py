@@ -1,20 +1,28 @@
-from airview_api.models import (
-    Application,
-    Resource,
-    MonitoredResource,
-    TechnicalControl,
-    MonitoredResourceState,
-    Control,
-    Environment,
-    ApplicationEnvironment,
-    System,
-)
+import logging
+from airview_api.models import ComplianceCounter, ComplianceFact
 from airview_api.services import AirViewValidationException
 from airview_api.database import db
-from sqlalchemy import func, case, literal
+from sqlalchemy import func
 
-from odata_query.grammar import ODataParser, ODataLexer
-from odata_query.sql import AstToSqlVisitor
+from functools import lru_cache
+
+# Number of distinct parsed filters to keep, dashboards tend to repeat a small set of filters
+FILTER_CACHE_SIZE = 256
+
+# Number of rows fetched at a time when results are streamed
+STREAM_BATCH_SIZE = 1000
+
+# Columns which the compliance counters are kept by, aggregates confined to them are read from the counters
+COUNTER_COLUMNS = {
+    "applicationid",
+    "applicationname",
+    "environmentname",
+    "controlname",
+    "controlseverity",
+    "controlid",
+}
+
+logger = logging.getLogger(__name__)
 
 
 def _camelcase(s):
@@ -22,7 +30,51 @@ def _camelcase(s):
     return next(parts) + "".join(i.title() for i in parts)
 
 
-def get_compliace_aggregate(filter: str, select: str):
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def _parse_filter(filter: str):
+    # Building the grammar is a noticeable part of startup, so it is only imported once a filter is used
+    from odata_query.grammar import ODataParser, ODataLexer
+
+    # The parsed tree is immutable so can be shared between requests
+    return ODataParser().parse(ODataLexer().tokenize(filter))
+
+
+def _filter_columns(ast) -> set:
+    from odata_query.visitor import NodeVisitor
+
+    class Identifiers(NodeVisitor):
+        def __init__(self):
+            self.names = set()
+
+        def visit_Identifier(self, node):
+            self.names.add(node.name)
+
+        def visit_Call(self, node):
+            # The function name is an identifier too, only its arguments refer to columns
+            for arg in node.args:
+                self.visit(arg)
+
+    visitor = Identifiers()
+    visitor.visit(ast)
+    return visitor.names
+
+
+def _counter_query():
+    return db.select(
+        ComplianceCounter.application_id.label("applicationid"),
+        ComplianceCounter.application_name.label("applicationname"),
+        ComplianceCounter.environment_name.label("environmentname"),
+        ComplianceCounter.control_name.label("controlname"),
+        ComplianceCounter.control_severity.label("controlseverity"),
+        func.nullif(ComplianceCounter.control_id, 0).label("controlid"),
+        ComplianceCounter.compliant.label("is_compliant"),
+        ComplianceCounter.total,
+        ComplianceCounter.excluded,
+    ).subquery()
+
+
+def get_aggregate_query(filter: str, select: str):
+    """Build the aggregate query for an odata filter and select without executing it, raising when either is invalid"""
     # sql alchemy gets in a tizz about casing. for the purposes of this method, everything is lowercased then converted to snake case on return
     select = select.lower()
 
@@ -51,88 +103,95 @@ def get_compliace_aggregate(filter: str, select: str):
             + ", ".join([_camelcase(s) for s in allowed_columns])
         )
 
-    # Create an initial subquery query to flatten the data.
-    # Columns are lower cased to avoid issues with case sensitivity & relabled to avoid naming collisions
-    orm_query = (
-        db.select(
-            Resource.reference.label("resourcereference"),
-            Application.id.label("applicationid"),
-            Application.name.label("applicationname"),
-            Environment.name.label("environmentname"),
-            TechnicalControl.reference.label("technicalcontrolreference"),
-            TechnicalControl.name.label("technicalcontrolname"),
-            Control.name.label("controlname"),
-            Control.severity.label("controlseverity"),
-            Control.id.label("controlid"),
-            System.name.label("systemname"),
-            System.stage.label("systemstage"),
-            case(
-                (
-                    MonitoredResource.monitoring_state
-                    == MonitoredResourceState.MONITORING,
-                    1,
-                ),
-                else_=0,
-            ).label("is_compliant"),
-            literal(0).label("excluded"),
-        )
-        .select_from(TechnicalControl)
-        .join(MonitoredResource)
-        .join(Resource)
-        .join(ApplicationEnvironment)
-        .join(Environment)
-        .join(Application)
-        .join(Control, isouter=True)
-        .join(System, isouter=True)
-        .where(MonitoredResource.monitoring_state != MonitoredResourceState.DELETED)
-        .subquery()
-    )
-
+    ast = None
     if filter:
-        # Use external odata filter code to pase the incoming odata query into a sql where clause
-        filter = filter.lower()
-        lexer = ODataLexer()
-        parser = ODataParser()
+        # Use external odata filter code to parse the incoming odata query into a where clause with bound parameters
         try:
-            ast = parser.parse(lexer.tokenize(filter))
-            visitor = AstToSqlVisitor()
-            where_clause = visitor.visit(ast)
-            # apply the where to the subquery, creating another subquery
-            orm_query = (
-                db.select(db.text("*"))
-                .select_from(orm_query)
-                .where(db.text(where_clause))
-                .subquery()
-            )
-        except Exception as e:
+            ast = _parse_filter(filter.lower().strip())
+        except Exception:
+            logger.warning("Could not parse compliance filter %r", filter, exc_info=True)
             raise AirViewValidationException("The filter provided could not be parsed")
 
+    referenced = set(splits) | (_filter_columns(ast) if ast is not None else set())
+    if referenced.issubset(COUNTER_COLUMNS):
+        orm_query = _counter_query()
+        totals = [
+            func.sum(db.column("is_compliant")).label("is_compliant"),
+            func.sum(db.column("total")).label("total"),
+            func.sum(db.column("excluded")).label("excluded"),
+        ]
+    else:
+        # Create an initial subquery query to flatten the data.
+        # Columns are lower cased to avoid issues with case sensitivity & relabled to avoid naming collisions
+        orm_query = db.select(
+            ComplianceFact.resource_reference.label("resourcereference"),
+            ComplianceFact.application_id.label("applicationid"),
+            ComplianceFact.application_name.label("applicationname"),
+            ComplianceFact.environment_name.label("environmentname"),
+            ComplianceFact.technical_control_reference.label(
+                "technicalcontrolreference"
+            ),
+            ComplianceFact.technical_control_name.label("technicalcontrolname"),
+            ComplianceFact.control_name.label("controlname"),
+            ComplianceFact.control_severity.label("controlseverity"),
+            ComplianceFact.control_id.label("controlid"),
+            ComplianceFact.system_name.label("systemname"),
+            ComplianceFact.system_stage.label("systemstage"),
+            ComplianceFact.is_compliant,
+            ComplianceFact.excluded,
+        ).subquery()
+        totals = [
+            func.sum(db.column("is_compliant")).label("is_compliant"),
+            func.count(db.column("is_compliant")).label("total"),
+            func.sum(db.column("excluded")).label("excluded"),
+        ]
+
+    if ast is not None:
+        from odata_query.sqlalchemy import AstToSqlAlchemyCoreVisitor
+
+        try:
+            where_clause = AstToSqlAlchemyCoreVisitor(orm_query).visit(ast)
+        except Exception:
+            logger.warning(
+                "Could not translate compliance filter %r", filter, exc_info=True
+            )
+            raise AirViewValidationException(
+                "The query could not be executed. Check the filter which was passed is valid"
+            )
+        # apply the where to the subquery, creating another subquery
+        orm_query = db.select(orm_query).where(where_clause).subquery()
+
     # The mapping is used to re-label the previously lower cased columns back to snake case, python style
     mapping = {x.replace("_", ""): x for x in allowed_columns}
 
     # apply the final 'group by' aggregation based on what was requested in the select param
 
     aggreated_query = (
-        db.select(
-            *(
-                [db.column(c).label(mapping[c]) for c in splits]
-                + [
-                    func.sum(db.column("is_compliant")).label("is_compliant"),
-                    func.count(db.column("is_compliant")).label("total"),
-                    func.sum(db.column("excluded")).label("excluded"),
-                ]
-            )
-        )
+        db.select(*([db.column(c).label(mapping[c]) for c in splits] + totals))
         .select_from(orm_query)
         .group_by(db.text(select))
     )
+    return aggreated_query
+
+
+def get_compliace_aggregate(filter: str, select: str, stream: bool = False):
+    aggreated_query = get_aggregate_query(filter=filter, select=select)
+
+    if stream:
+        # Rows are fetched in batches as they are consumed, with a server side cursor where the database has them
+        aggreated_query = aggreated_query.execution_options(yield_per=STREAM_BATCH_SIZE)
 
     try:
-        results = db.session.execute(aggreated_query).all()
-    except Exception as e:
+        results = db.session.execute(aggreated_query)
+        if not stream:
+            results = results.all()
+    except Exception:
         # This is less than ideal but since there's so many permetations of the odata filter it's hard to validate
         # For now, this assumes the failure is due to a bad filter. It could be anything. But this guards against 500 errors at least.
-        print(e)
+        # Logged in full as it may as well be a database fault as a bad filter
+        logger.exception(
+            "Compliance aggregate failed for select %r and filter %r", select, filter
+        )
         raise AirViewValidationException(
             "The query could not be executed. Check the filter which was passed is valid"
         )
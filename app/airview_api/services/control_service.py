@@ -30,4 +30,4 @@ def get_by_name(name: str):
 
 
 def get_all():
-    return Control.query.all()
+    return Control.query
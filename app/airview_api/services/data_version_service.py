@@ -0,0 +1,168 @@
+from itertools import chain
+from sqlalchemy import event, inspect
+from airview_api.models import (
+    Application,
+    ApplicationDataVersion,
+    ApplicationEnvironment,
+    Control,
+    Environment,
+    Exclusion,
+    ExclusionResource,
+    MonitoredResource,
+    Resource,
+    ResourceType,
+    ResourceTypeControl,
+    Service,
+    System,
+    TechnicalControl,
+)
+from airview_api.database import db, upsert
+from airview_api.services import compliance_fact_service
+
+# Version which is bumped when shared definitions change, it forms part of every application's version
+GLOBAL_APPLICATION_ID = 0
+
+# Definitions which are shared between applications
+_GLOBAL_MODELS = (
+    Control,
+    Environment,
+    ResourceType,
+    ResourceTypeControl,
+    Service,
+    System,
+    TechnicalControl,
+)
+
+# Session info keys of ids to bump, pending until the transaction commits
+_PENDING = "airview_data_version_pending"
+_COMMITTED = "airview_data_version_committed"
+
+
+def _values(instance, attribute):
+    # Both old and new values, a row moved between parents changes both
+    history = inspect(instance).attrs[attribute].history
+    return {v for v in history.sum() if v is not None}
+
+
+def _application_ids(connection, application_environment_ids, resource_ids):
+    ids = set()
+    if application_environment_ids:
+        ids.update(
+            connection.scalars(
+                db.select(ApplicationEnvironment.application_id).where(
+                    ApplicationEnvironment.id.in_(application_environment_ids)
+                )
+            )
+        )
+    if resource_ids:
+        ids.update(
+            connection.scalars(
+                db.select(ApplicationEnvironment.application_id)
+                .join(Resource)
+                .where(Resource.id.in_(resource_ids))
+                .distinct()
+            )
+        )
+    return ids
+
+
+def bump(application_ids=(), resource_ids=()):
+    """Move on the data version of applications once the current transaction commits.
+    Writes made through the session are picked up automatically on flush, this is for writes made with core statements.
+    The version rows are hot, every write to an application touches the same row, so they are updated in a short
+    statement of their own after the commit rather than held locked for the whole write transaction. The trade-off
+    is a reader may see the new data under the old version until the bump lands, and a process dying between the
+    commit and the bump leaves cached responses stale until the application's next write
+    :param application_ids: Ids of applications which changed, GLOBAL_APPLICATION_ID bumps every application
+    :param resource_ids: Ids of resources which changed, the owning applications are bumped
+    """
+    session = db.session()
+    ids = set(application_ids) | _application_ids(
+        session.connection(), (), set(resource_ids)
+    )
+    session.info.setdefault(_PENDING, set()).update(ids)
+
+
+def _apply(application_ids):
+    table = ApplicationDataVersion.__table__
+    stmt = upsert(table).values(
+        [{"application_id": i, "version": 1} for i in sorted(application_ids)]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.application_id],
+        set_={"version": table.c.version + 1},
+    )
+    with db.engine.begin() as connection:
+        connection.execute(stmt)
+
+
+def get_version(application_id: int) -> str:
+    """Get the current data version of an application, this changes whenever its aggregations may change"""
+    versions = dict(
+        db.session.execute(
+            db.select(
+                ApplicationDataVersion.application_id, ApplicationDataVersion.version
+            ).where(
+                ApplicationDataVersion.application_id.in_(
+                    [GLOBAL_APPLICATION_ID, application_id]
+                )
+            )
+        ).all()
+    )
+    return f"{versions.get(GLOBAL_APPLICATION_ID, 0)}.{versions.get(application_id, 0)}"
+
+
+def _bump_after_flush(session, flush_context):
+    application_ids = set()
+    application_environment_ids = set()
+    resource_ids = set()
+    dirty = session.dirty
+    for instance in chain(session.new, dirty, session.deleted):
+        # Moving on when a row was last reported changes no aggregation
+        if instance in dirty and not compliance_fact_service.changed_columns(instance):
+            continue
+        if isinstance(instance, Application):
+            application_ids.add(instance.id)
+        elif isinstance(instance, ApplicationEnvironment):
+            application_ids |= _values(instance, "application_id")
+        elif isinstance(instance, (Resource, Exclusion)):
+            application_environment_ids |= _values(
+                instance, "application_environment_id"
+            )
+        elif isinstance(instance, (MonitoredResource, ExclusionResource)):
+            resource_ids |= _values(instance, "resource_id")
+        elif isinstance(instance, _GLOBAL_MODELS):
+            application_ids.add(GLOBAL_APPLICATION_ID)
+
+    application_ids |= _application_ids(
+        session.connection(), application_environment_ids, resource_ids
+    )
+    session.info.setdefault(_PENDING, set()).update(application_ids)
+
+
+def _commit_pending(session):
+    session.info[_COMMITTED] = session.info.pop(_PENDING, set())
+
+
+def _bump_after_transaction(session, transaction):
+    # Runs once the session's connection is back in the pool, so a pool of one connection is enough
+    if transaction.parent is not None:
+        return
+    session.info.pop(_PENDING, None)
+    application_ids = session.info.pop(_COMMITTED, None)
+    if application_ids:
+        _apply(application_ids)
+
+
+_LISTENERS = {
+    "after_flush": _bump_after_flush,
+    "after_commit": _commit_pending,
+    "after_transaction_end": _bump_after_transaction,
+}
+
+
+def register_listeners():
+    """Bump versions for writes made through the session, called as the database is initialised"""
+    for name, listener in _LISTENERS.items():
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
@@ -5,7 +5,7 @@ from airview_api.database import db
 
 
 def get_all():
-    return Environment.query.all()
+    return Environment.query
 
 def create(data: dict):
     if data.get("id") is not None:
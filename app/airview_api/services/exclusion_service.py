@@ -3,6 +3,7 @@ from sqlalchemy import text
 import itertools
 from datetime import datetime
 import json
+import logging
 from sqlalchemy.exc import IntegrityError
 from airview_api.models import (
     Control,
@@ -11,39 +12,86 @@ from airview_api.models import (
     Exclusion,
     ExclusionState,
 )
-from airview_api.services import AirViewValidationException, AirViewNotFoundException
+from airview_api.services import (
+    AirViewValidationException,
+    AirViewNotFoundException,
+    compliance_fact_service,
+    data_version_service,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# Ids per statement. Keeps the bound parameter count within the limits of both postgres and sqlite
+CHUNK_SIZE = 500
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _excluded(control_id: int, resource_ids: list) -> bool:
+    for chunk in _chunks(resource_ids, CHUNK_SIZE):
+        qry = (
+            db.select(ExclusionResource.resource_id)
+            .join(Exclusion, Exclusion.id == ExclusionResource.exclusion_id)
+            .where(
+                Exclusion.control_id == control_id,
+                ExclusionResource.resource_id.in_(chunk),
+            )
+            .limit(1)
+        )
+        if db.session.scalar(qry) is not None:
+            return True
+    return False
+
+
+def _existing_count(resource_ids: list) -> int:
+    count = 0
+    for chunk in _chunks(resource_ids, CHUNK_SIZE):
+        count += db.session.scalar(
+            db.select(db.func.count()).where(Resource.id.in_(chunk))
+        )
+    return count
 
 
 def create(data: dict):
+    resource_ids = sorted(set(data["resources"]))
     try:
         control = Control.query.get(data["control_id"])
         if control is None:
             raise AirViewNotFoundException()
 
-        # To Do: Can this be done db side?
-        existing_resources = []
-        for e in control.exclusions:
-            for r in e.resources:
-                existing_resources.append(r.id)
+        if _excluded(control.id, resource_ids):
+            raise AirViewValidationException(
+                "Exclusions already exist for resources provided"
+            )
+        if _existing_count(resource_ids) != len(resource_ids):
+            raise AirViewValidationException("Integrity Error, check reference fields")
 
-        # exclusion = Exclusion(**data)
         exclusion = Exclusion()
         exclusion.control_id = data["control_id"]
         exclusion.summary = data["summary"]
         exclusion.notes = data.get("notes")
         exclusion.is_limited_exclusion = data["is_limited_exclusion"]
         exclusion.end_date = datetime.max
-        # mapped = list()
-        for r in data["resources"]:
-            if r in existing_resources:
-                raise AirViewValidationException("Exclusion exists for resource")
-            res = Resource.query.get(r)
-            exclusion.resources.append(res)
-
         db.session.add(exclusion)
+        db.session.flush()
+
+        # Link rows are written directly rather than through exclusion.resources, which would load each resource
+        table = ExclusionResource.__table__
+        for chunk in _chunks(resource_ids, CHUNK_SIZE):
+            db.session.execute(
+                table.insert(),
+                [{"exclusion_id": exclusion.id, "resource_id": r} for r in chunk],
+            )
+        compliance_fact_service.refresh(Resource, resource_ids)
+        data_version_service.bump(resource_ids=resource_ids)
         db.session.commit()
 
-    except IntegrityError as e:
-        print(e)
+    except IntegrityError:
+        logger.warning("Could not save exclusion", exc_info=True)
         db.session.rollback()
         raise AirViewValidationException("Integrity Error, check reference fields")
@@ -59,7 +59,7 @@ def create_control_objective(data: dict):
 
 
 def get_all():
-    return Framework.query.all()
+    return Framework.query
 
 
 def get_by_id(framework_id: int):
@@ -75,7 +75,7 @@ def get_controls_by_framework_and_section(section_id: int):
 
 
 def get_framework_by_name(name: str):
-    data = Framework.query.filter_by(name=name).all()
+    data = Framework.query.filter_by(name=name)
     return data
 
 
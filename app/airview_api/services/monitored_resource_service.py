@@ -1,11 +1,200 @@
-from datetime import datetime, timezone
+import logging
+import time
+from enum import Enum
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, tuple_
 from sqlalchemy.exc import IntegrityError
-from airview_api.services import AirViewValidationException
+from airview_api.services import (
+    AirViewValidationException,
+    compliance_fact_service,
+    data_version_service,
+)
 from airview_api.models import (
     MonitoredResource,
     MonitoredResourceState,
+    MonitoredResourceTransition,
+    TechnicalControl,
+    Resource,
 )
-from airview_api.database import db
+from airview_api.database import db, upsert
+
+# Rows per statement. Keeps the bound parameter count within the limits of both postgres and sqlite
+CHUNK_SIZE = 500
+# Largest number of monitoring states accepted in a single batch
+MAX_BATCH_SIZE = 10000
+# Rows transitioned per statement and transaction when reconciling
+RECONCILE_BATCH_SIZE = CHUNK_SIZE
+# Transitions kept for followers of the change feed, followers further behind miss the transitions removed
+CHANGE_RETENTION = timedelta(days=30)
+# Postgres advisory lock serialising writers of transitions, so transitions become visible in id order
+TRANSITION_LOCK_ID = 7340261
+# States which become UNRESPONSIVE once a monitored resource stops being reported
+_RECONCILED_STATES = (MonitoredResourceState.FLAGGED, MonitoredResourceState.MONITORING)
+
+logger = logging.getLogger(__name__)
+
+
+class PersistOutcome(Enum):
+    CREATED = 1
+    MODIFIED = 2
+    UNMODIFIED = 3
+    NOT_FOUND = 4
+    INVALID_STATE = 5
+
+    def __str__(self):
+        return self.name
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _existing_ids(column, ids):
+    found = set()
+    for chunk in _chunks(list(ids), CHUNK_SIZE):
+        found.update(db.session.scalars(db.select(column).where(column.in_(chunk))))
+    return found
+
+
+def _existing_states(keys):
+    states = {}
+    for chunk in _chunks(keys, CHUNK_SIZE):
+        qry = db.select(
+            MonitoredResource.technical_control_id,
+            MonitoredResource.resource_id,
+            MonitoredResource.monitoring_state,
+        ).where(
+            tuple_(
+                MonitoredResource.technical_control_id, MonitoredResource.resource_id
+            ).in_(chunk)
+        )
+        for technical_control_id, resource_id, state in db.session.execute(qry):
+            states[(technical_control_id, resource_id)] = state
+    return states
+
+
+def _record_transitions(transitions, now):
+    # transitions are (technical_control_id, resource_id, old_state, new_state) tuples, written in order
+    transitions = list(transitions)
+    if not transitions:
+        return
+    if db.engine.dialect.name == "postgresql":
+        # Ids are taken in insert order but seen in commit order, so a writer taking a later id could commit first and a
+        # follower past it would never see the earlier one. Holding a lock from taking ids until commit keeps the two orders
+        # the same, at the cost of writers which record transitions committing one at a time. sqlite writers already do
+        db.session.execute(
+            db.select(func.pg_advisory_xact_lock(TRANSITION_LOCK_ID))
+        )
+    table = MonitoredResourceTransition.__table__
+    for chunk in _chunks(transitions, CHUNK_SIZE):
+        db.session.execute(
+            table.insert(),
+            [
+                {
+                    "technical_control_id": technical_control_id,
+                    "resource_id": resource_id,
+                    "old_state": old_state,
+                    "new_state": new_state,
+                    "transitioned_at": now,
+                }
+                for technical_control_id, resource_id, old_state, new_state in chunk
+            ],
+        )
+
+
+def persist_many(items: list):
+    """Persist the status of many monitored resources using set based upserts.
+    last_modified is only moved on when the monitoring state changes, last_seen is always moved on.
+    Returns the outcome of each item in the order provided
+    """
+    now = datetime.utcnow()
+    outcomes = {}
+    rows = {}
+    keys = []
+    for item in items:
+        key = (item["technical_control_id"], item["resource_id"])
+        keys.append(key)
+        if item["monitoring_state"] not in MonitoredResourceState.__members__:
+            outcomes[key] = PersistOutcome.INVALID_STATE
+            rows.pop(key, None)
+            continue
+        # Repeats of the same key within a batch behave as consecutive PUTs, the last one wins
+        outcomes.pop(key, None)
+        rows[key] = {
+            "technical_control_id": key[0],
+            "resource_id": key[1],
+            "monitoring_state": MonitoredResourceState[item["monitoring_state"]],
+            "additional_data": item.get("additional_data", ""),
+            "last_modified": now,
+            "last_seen": now,
+        }
+
+    try:
+        known_controls = _existing_ids(TechnicalControl.id, {k[0] for k in rows})
+        known_resources = _existing_ids(Resource.id, {k[1] for k in rows})
+        for key in list(rows):
+            if key[0] not in known_controls or key[1] not in known_resources:
+                outcomes[key] = PersistOutcome.NOT_FOUND
+                del rows[key]
+
+        existing = _existing_states(list(rows))
+        for key, row in rows.items():
+            if key not in existing:
+                outcomes[key] = PersistOutcome.CREATED
+            elif existing[key] != row["monitoring_state"]:
+                outcomes[key] = PersistOutcome.MODIFIED
+            else:
+                outcomes[key] = PersistOutcome.UNMODIFIED
+
+        table = MonitoredResource.__table__
+        for chunk in _chunks(list(rows.values()), CHUNK_SIZE):
+            stmt = upsert(table).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.technical_control_id, table.c.resource_id],
+                set_={
+                    "monitoring_state": stmt.excluded.monitoring_state,
+                    "additional_data": stmt.excluded.additional_data,
+                    "last_seen": stmt.excluded.last_seen,
+                    "last_modified": case(
+                        (
+                            table.c.monitoring_state != stmt.excluded.monitoring_state,
+                            stmt.excluded.last_modified,
+                        ),
+                        else_=table.c.last_modified,
+                    ),
+                },
+            )
+            db.session.execute(stmt)
+        # Re-reporting an unchanged state only moves on last_seen, which no fact or aggregation is built from
+        changed = [key for key in rows if outcomes[key] != PersistOutcome.UNMODIFIED]
+        _record_transitions(
+            (
+                (*key, existing.get(key), rows[key]["monitoring_state"])
+                for key in changed
+            ),
+            now,
+        )
+        compliance_fact_service.refresh_monitored_resources(changed)
+        data_version_service.bump(resource_ids={key[1] for key in changed})
+        db.session.commit()
+    except IntegrityError:
+        logger.warning(
+            "Could not persist %s monitored resources", len(items), exc_info=True
+        )
+        db.session.rollback()
+        raise AirViewValidationException(
+            "Unique Constraint Error, check reference field"
+        )
+
+    return [
+        {
+            "technical_control_id": key[0],
+            "resource_id": key[1],
+            "outcome": outcomes[key],
+        }
+        for key in keys
+    ]
 
 
 def persist(
@@ -14,34 +203,170 @@ def persist(
     monitoring_state,
     additional_data="",
 ):
-    try:
-        item = MonitoredResource.query.filter_by(
-            technical_control_id=technical_control_id, resource_id=resource_id
-        ).first()
-        if item is None:
-            item = MonitoredResource(
-                technical_control_id=technical_control_id,
-                resource_id=resource_id,
-                monitoring_state=monitoring_state,
-                last_modified=datetime.now(timezone.utc),
-                last_seen=datetime.now(timezone.utc),
-                additional_data=additional_data,
-            )
-            db.session.add(item)
-            db.session.commit()
-            return
-        parsed_state = MonitoredResourceState[monitoring_state]
-        if item.monitoring_state != parsed_state:
-            item.last_modified = datetime.now(timezone.utc)
-        item.last_seen = datetime.utcnow()
-        item.monitoring_state = monitoring_state
-        item.additional_data = additional_data
-
-        db.session.commit()
-    except IntegrityError as e:
-        print(e)
-        db.session.rollback()
+    result = persist_many(
+        [
+            {
+                "technical_control_id": technical_control_id,
+                "resource_id": resource_id,
+                "monitoring_state": monitoring_state,
+                "additional_data": additional_data,
+            }
+        ]
+    )[0]
+    if result["outcome"] == PersistOutcome.NOT_FOUND:
         raise AirViewValidationException(
             "Unique Constraint Error, check reference field"
         )
-    return item
+    if result["outcome"] == PersistOutcome.INVALID_STATE:
+        raise AirViewValidationException("Unknown monitoring state")
+
+
+def _mark_unresponsive_batch(technical_control_id, cutoff, now, batch_size):
+    table = MonitoredResource.__table__
+    expired = dict(
+        db.session.execute(
+            db.select(table.c.id, table.c.monitoring_state)
+            .where(
+                table.c.technical_control_id == technical_control_id,
+                table.c.last_seen < cutoff,
+                table.c.monitoring_state.in_(_RECONCILED_STATES),
+            )
+            .order_by(table.c.last_seen)
+            .limit(batch_size)
+        ).all()
+    )
+    if not expired:
+        return 0
+    # Rows are only updated while still in the state read, so that is the state they transitioned from
+    stmt = (
+        table.update()
+        .where(tuple_(table.c.id, table.c.monitoring_state).in_(expired.items()))
+        .values(
+            monitoring_state=MonitoredResourceState.UNRESPONSIVE, last_modified=now
+        )
+        .returning(table.c.id, table.c.technical_control_id, table.c.resource_id)
+    )
+    transitioned = db.session.execute(stmt).all()
+    keys = [(t.technical_control_id, t.resource_id) for t in transitioned]
+    if keys:
+        _record_transitions(
+            (
+                (*key, expired[t.id], MonitoredResourceState.UNRESPONSIVE)
+                for key, t in zip(keys, transitioned)
+            ),
+            now,
+        )
+        compliance_fact_service.refresh_monitored_resources(keys)
+        data_version_service.bump(resource_ids={key[1] for key in keys})
+    db.session.commit()
+    return len(transitioned)
+
+
+def mark_unresponsive(now: datetime = None, batch_size: int = RECONCILE_BATCH_SIZE):
+    """Transition monitored resources which have not been seen within the ttl of their technical control to UNRESPONSIVE.
+    ttl is in seconds, technical controls without one are skipped as are rows which have never been seen.
+    Each batch is a single update committed on its own, so the job can be stopped and rerun at any point.
+    Returns the progress metrics of the run
+    """
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    metrics = {"technical_controls": 0, "batches": 0, "transitioned": 0}
+    controls = db.session.execute(
+        db.select(TechnicalControl.id, TechnicalControl.ttl)
+        .where(TechnicalControl.ttl > 0)
+        .order_by(TechnicalControl.id)
+    ).all()
+    for technical_control_id, ttl in controls:
+        metrics["technical_controls"] += 1
+        cutoff = now - timedelta(seconds=ttl)
+        while True:
+            count = _mark_unresponsive_batch(
+                technical_control_id, cutoff, now, batch_size
+            )
+            if count == 0:
+                break
+            metrics["batches"] += 1
+            metrics["transitioned"] += count
+            logger.info(
+                "Marked %s monitored resources of technical control %s unresponsive, %s so far",
+                count,
+                technical_control_id,
+                metrics["transitioned"],
+            )
+            if count < batch_size:
+                break
+    metrics["seconds"] = round(time.perf_counter() - started, 3)
+    return metrics
+
+
+def get_changes(since: int = 0, page=None):
+    """Get the transitions of monitored resources recorded after the transition with the id since, oldest first
+    :param since: Id of the last transition already seen, 0 for the whole history
+    :param page: KeysetPage restricting the transitions returned, all are returned when not passed
+    """
+    qry = db.select(MonitoredResourceTransition).where(
+        MonitoredResourceTransition.id > since
+    )
+    if page is None:
+        qry = qry.order_by(MonitoredResourceTransition.id)
+    else:
+        qry = page.where(qry, MonitoredResourceTransition.id)
+    return db.session.scalars(qry).all()
+
+
+def prune_changes(now: datetime = None, batch_size: int = CHUNK_SIZE):
+    """Remove transitions recorded more than CHANGE_RETENTION ago, oldest first.
+    Each batch is a single delete committed on its own, so the job can be stopped and rerun at any point.
+    Returns the progress metrics of the run
+    """
+    cutoff = (now or datetime.utcnow()) - CHANGE_RETENTION
+    metrics = {"batches": 0, "removed": 0}
+    while True:
+        ids = db.session.scalars(
+            db.select(MonitoredResourceTransition.id)
+            .where(MonitoredResourceTransition.transitioned_at < cutoff)
+            .order_by(MonitoredResourceTransition.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        db.session.execute(
+            db.delete(MonitoredResourceTransition).where(
+                MonitoredResourceTransition.id.in_(ids)
+            )
+        )
+        db.session.commit()
+        metrics["batches"] += 1
+        metrics["removed"] += len(ids)
+        if len(ids) < batch_size:
+            break
+    return metrics
+
+
+def follow_changes(since: int, poll_seconds: float, duration_seconds: float):
+    """Yield transitions recorded after the transition with the id since, as they are recorded.
+    None is yielded when a poll finds nothing new, so callers can keep an idle connection alive.
+    The session is released between polls so a follower does not hold a database connection while it waits
+    :param since: Id of the last transition already seen
+    :param poll_seconds: Seconds between polls once every recorded transition has been yielded
+    :param duration_seconds: Seconds after which no more polls are made
+    """
+    deadline = time.monotonic() + duration_seconds
+    while True:
+        changes = db.session.scalars(
+            db.select(MonitoredResourceTransition)
+            .where(MonitoredResourceTransition.id > since)
+            .order_by(MonitoredResourceTransition.id)
+            .limit(CHUNK_SIZE)
+        ).all()
+        db.session.close()
+        for change in changes:
+            since = change.id
+            yield change
+        if len(changes) == CHUNK_SIZE:
+            continue
+        if not changes:
+            yield None
+        if time.monotonic() + poll_seconds > deadline:
+            return
+        time.sleep(poll_seconds)
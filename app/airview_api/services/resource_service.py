@@ -1,8 +1,36 @@
-from airview_api.models import Resource
-from airview_api.database import db
-from airview_api.services import AirViewNotFoundException, AirViewValidationException
+from enum import Enum
+from airview_api.models import ApplicationEnvironment, Resource
+from airview_api.database import db, upsert as upsert_statement
+from airview_api.services import (
+    AirViewNotFoundException,
+    AirViewValidationException,
+    data_version_service,
+)
+from sqlalchemy import case, or_
 from sqlalchemy.exc import IntegrityError
-from datetime import datetime
+from datetime import datetime, timezone
+
+# Rows per statement. Keeps the bound parameter count within the limits of both postgres and sqlite
+CHUNK_SIZE = 500
+# Largest number of resources accepted in a single batch
+MAX_BATCH_SIZE = 10000
+# Largest number of stale resources reported by a batch, the rest are read with get_stale
+MAX_STALE_RESULTS = 1000
+
+
+class UpsertOutcome(Enum):
+    CREATED = 1
+    MODIFIED = 2
+    UNMODIFIED = 3
+    STALE = 4
+
+    def __str__(self):
+        return self.name
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
 
 
 def create(data: dict):
@@ -61,3 +89,121 @@ def get(application_environment_id: str, reference: str):
     if resource is None:
         raise AirViewNotFoundException
     return resource
+
+
+def _utc(value: datetime) -> datetime:
+    # Times are stored as naive utc
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def get_stale(application_environment_id: int, last_seen_before: datetime):
+    """Get the resources of an application environment which were last seen before a time, such as the start of a sync"""
+    return Resource.query.filter(
+        Resource.application_environment_id == application_environment_id,
+        Resource.last_seen < _utc(last_seen_before),
+    )
+
+
+def _existing(application_environment_id: int, references: list) -> dict:
+    found = {}
+    for chunk in _chunks(references, CHUNK_SIZE):
+        qry = db.select(
+            Resource.reference, Resource.id, Resource.name, Resource.resource_type_id
+        ).where(
+            Resource.application_environment_id == application_environment_id,
+            Resource.reference.in_(chunk),
+        )
+        for reference, *values in db.session.execute(qry):
+            found[reference] = tuple(values)
+    return found
+
+
+def upsert_many(application_environment_id: int, items: list, stale_before=None):
+    """Create or update many resources of an application environment using set based upserts.
+    last_modified is only moved on when the name or resource type changes, last_seen is always moved on.
+    Resources of the application environment last seen before stale_before, when passed, are reported as stale.
+    Returns the outcome of each resource provided followed by up to MAX_STALE_RESULTS stale resources in id order
+    """
+    application_environment = db.session.get(
+        ApplicationEnvironment, application_environment_id
+    )
+    if application_environment is None:
+        raise AirViewNotFoundException()
+
+    now = datetime.utcnow()
+    rows = {}
+    for item in items:
+        # Repeats of the same reference within a batch behave as consecutive PUTs, the last one wins
+        rows[item["reference"]] = {
+            "reference": item["reference"],
+            "name": item["name"],
+            "resource_type_id": item.get("resource_type_id"),
+            "application_environment_id": application_environment_id,
+            "last_seen": now,
+            "last_modified": now,
+        }
+
+    try:
+        existing = _existing(application_environment_id, list(rows))
+        outcomes = {}
+        for reference, row in rows.items():
+            if reference not in existing:
+                outcomes[reference] = UpsertOutcome.CREATED
+            elif existing[reference][1:] != (row["name"], row["resource_type_id"]):
+                outcomes[reference] = UpsertOutcome.MODIFIED
+            else:
+                outcomes[reference] = UpsertOutcome.UNMODIFIED
+
+        table = Resource.__table__
+        for chunk in _chunks(list(rows.values()), CHUNK_SIZE):
+            stmt = upsert_statement(table).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.reference, table.c.application_environment_id],
+                set_={
+                    "name": stmt.excluded.name,
+                    "resource_type_id": stmt.excluded.resource_type_id,
+                    "last_seen": stmt.excluded.last_seen,
+                    "last_modified": case(
+                        (
+                            or_(
+                                table.c.name != stmt.excluded.name,
+                                table.c.resource_type_id.is_distinct_from(
+                                    stmt.excluded.resource_type_id
+                                ),
+                            ),
+                            stmt.excluded.last_modified,
+                        ),
+                        else_=table.c.last_modified,
+                    ),
+                },
+            )
+            db.session.execute(stmt)
+
+        created = [r for r, o in outcomes.items() if o == UpsertOutcome.CREATED]
+        existing.update(_existing(application_environment_id, created))
+        results = [
+            {"id": existing[r][0], "reference": r, "outcome": outcomes[r]} for r in rows
+        ]
+        if stale_before is not None:
+            stale = (
+                get_stale(application_environment_id, stale_before)
+                .with_entities(Resource.id, Resource.reference)
+                .order_by(Resource.id)
+                .limit(MAX_STALE_RESULTS)
+            )
+            results.extend(
+                {"id": id, "reference": reference, "outcome": UpsertOutcome.STALE}
+                for id, reference in stale
+            )
+
+        # Facts are keyed on the reference and application environment, which an upsert never changes
+        if any(o != UpsertOutcome.UNMODIFIED for o in outcomes.values()):
+            data_version_service.bump([application_environment.application_id])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise AirViewValidationException("Integrity Error, check reference fields")
+
+    return results
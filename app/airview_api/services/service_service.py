@@ -19,4 +19,4 @@ def create(data: dict):
 
 
 def get_all():
-    return Service.query.all()
+    return Service.query
@@ -38,7 +38,7 @@ def get_with_filter(system_id: int = None, reference: str = None):
         results = results.filter(TechnicalControl.system_id == system_id)
     if reference is not None:
         results = results.filter(TechnicalControl.reference == reference)
-    return results.all()
+    return results
 
 
 def get_control_status_detail_by_id(technical_control_id: int):
@@ -0,0 +1,1088 @@
+from __future__ import annotations
+import asyncio
+from typing import Awaitable, Callable, Hashable, Iterable
+import httpx
+
+from .models import *
+from .cache import ReferenceCache
+from .client import _next_page_url
+
+
+class AsyncBackend:
+    """
+    Low level asyncio wrapper for calls to AirView api. Mirrors Backend.
+    At most ``max_concurrency`` requests are in flight at once, connections are pooled by the httpx client.
+    THIS CLASS IS INTENDED FOR INTERNAL USE ONLY.
+
+    """
+
+    def __init__(
+        self,
+        backend_config: BackendConfig,
+        client: httpx.AsyncClient,
+        max_concurrency: int = 10,
+    ) -> None:
+        self.referencing_type = backend_config.referencing_type
+        self._client = client
+        self._backend_config = backend_config
+        self._headers = {"Authorization": f"Bearer {backend_config.token}"}
+        self._system_id = None
+        self._system_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._cache = ReferenceCache(
+            ttl=backend_config.cache_ttl, max_size=backend_config.cache_size
+        )
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled connections
+        """
+        await self._client.aclose()
+
+    def get_url(self, route) -> str:
+        """
+        Helper method to resolve route to full url
+        """
+        return f"{self._backend_config.base_url}{route}"
+
+    async def _request(self, method: str, route: str, **kwargs) -> httpx.Response:
+        async with self._semaphore:
+            return await self._client.request(
+                method, self.get_url(route), headers=self._headers, **kwargs
+            )
+
+    async def get_list(self, route) -> list:
+        """
+        Helper method to get every item of a paginated list, following the next page links
+        """
+        items = []
+        url = self.get_url(route)
+        while url is not None:
+            async with self._semaphore:
+                resp = await self._client.get(url, headers=self._headers)
+            if resp.status_code != 200:
+                raise BackendFailureException(
+                    f"Status code: {resp.status_code} Message: {resp.text}"
+                )
+            items.extend(resp.json())
+            url = _next_page_url(url, resp.links)
+        return items
+
+    async def get_system_id(self) -> int:
+        async with self._system_lock:
+            if self._system_id is None:
+                system_id = await self.get_system_id_by_name(
+                    self._backend_config.system_name
+                )
+                if system_id is None:
+                    system_id = await self.create_system(
+                        self._backend_config.system_name,
+                        self._backend_config.system_stage,
+                    )
+                self._system_id = system_id
+        return self._system_id
+
+    async def get_system_id_by_name(self, name):
+        cached = self._cache.get(("system", name))
+        if cached is not None:
+            return cached
+        resp = await self._request("GET", f"/systems/?name={name}")
+        if resp.status_code == 200:
+            return self._cache.set(("system", name), resp.json()["id"])
+        return None
+
+    async def create_system(self, name: str, stage: SystemStage) -> int:
+        """
+        Create a new system
+        """
+        resp = await self._request(
+            "POST", "/systems/", json={"name": name, "stage": stage.name}
+        )
+        if resp.status_code == 200:
+            self._cache.invalidate(("system", name))
+            return resp.json()["id"]
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def get_environments(self) -> list[Environment]:
+        """
+        Get a list of environments
+        """
+        cached = self._cache.get(("environments",))
+        if cached is not None:
+            return cached
+        items = await self.get_list("/environments/")
+        return self._cache.set(
+            ("environments",), [Environment(**item) for item in items]
+        )
+
+    async def create_environment(self, environment: Environment) -> Environment:
+        """
+        Create a new environment
+        """
+        resp = await self._request(
+            "POST",
+            "/environments/",
+            json={
+                "name": environment.name,
+                "abbreviation": environment.abbreviation,
+            },
+        )
+        if resp.status_code == 200:
+            self._cache.invalidate(("environments",))
+            return Environment(**resp.json())
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def get_services(self) -> list[Service]:
+        """
+        Get a list of services
+        """
+        items = await self.get_list("/services/")
+        return [Service(**item) for item in items]
+
+    async def create_service(self, service: Service) -> Service:
+        """
+        Create a new service
+        """
+        resp = await self._request(
+            "POST",
+            "/services/",
+            json={
+                "name": service.name,
+                "reference": service.reference,
+                "type": service.type.name,
+            },
+        )
+        if resp.status_code == 200:
+            return Service(**resp.json())
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def get_application_environment_by_reference(
+        self, reference
+    ) -> Application | None:
+        """
+        Look up an application by the provided reference
+        """
+        cached = self._cache.get(("application_environment", reference))
+        if cached is not None:
+            return cached
+        type = self._backend_config.referencing_type
+        resp = await self._request(
+            "GET",
+            f"/referenced-application-environments/?type={type}&reference={reference}",
+        )
+        if resp.status_code == 200:
+            data = resp.json()
+            return self._cache.set(
+                ("application_environment", reference),
+                Application(
+                    id=data["application"]["id"],
+                    name=data["application"]["name"],
+                    application_environment_id=data["id"],
+                    reference=reference,
+                ),
+            )
+        if resp.status_code == 404:
+            return None
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def create_application(self, application: Application) -> Application:
+        """
+        Create a new Application
+        """
+        resp = await self._request(
+            "POST",
+            "/applications/",
+            json={
+                "name": application.name,
+                "applicationType": application.type.name,
+            },
+        )
+        if resp.status_code == 200:
+            application.id = resp.json()["id"]
+            return application
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def create_application_environment(
+        self, application: Application
+    ) -> Application:
+        """
+        Create a new Application Environment, returns application environment id
+        """
+        resp = await self._request(
+            "POST",
+            "/application-environments/",
+            json={
+                "applicationId": application.id,
+                "environmentId": application.environment.id,
+                "references": [
+                    {
+                        "type": self._backend_config.referencing_type,
+                        "reference": application.reference,
+                    }
+                ],
+            },
+        )
+        if resp.status_code == 200:
+            application.application_environment_id = resp.json()["id"]
+            self._cache.invalidate(("application_environment", application.reference))
+            return application
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def get_technical_control(self, reference) -> TechnicalControl:
+        """
+        Get a Technical Control by its reference
+        """
+        cached = self._cache.get(("technical_control", reference))
+        if cached is not None:
+            return cached
+        system_id = await self.get_system_id()
+        resp = await self._request(
+            "GET", f"/technical-controls/?systemId={system_id}&reference={reference}"
+        )
+        if resp.status_code == 200:
+            data = resp.json()
+            if data == []:
+                return None
+            control = data[0]
+            return self._cache.set(
+                ("technical_control", reference),
+                TechnicalControl(
+                    id=control["id"],
+                    name=control["name"],
+                    reference=control["reference"],
+                    control_action=TechnicalControlAction[control["controlAction"]],
+                    is_blocking=control["isBlocking"],
+                ),
+            )
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def create_technical_control(
+        self, technical_control: TechnicalControl
+    ) -> TechnicalControl:
+        mapped = {
+            "name": technical_control.name,
+            "reference": technical_control.reference,
+            "systemId": await self.get_system_id(),
+            "ttl": technical_control.ttl,
+            "isBlocking": technical_control.is_blocking,
+            "controlAction": technical_control.control_action.name,
+            "controlId": technical_control.control_id,
+        }
+        resp = await self._request(
+            "POST",
+            "/technical-controls/",
+            json={k: v for k, v in mapped.items() if v is not None},
+        )
+        if resp.status_code == 200:
+            control = resp.json()
+            self._cache.invalidate(("technical_control", control["reference"]))
+            return TechnicalControl(
+                id=control["id"],
+                name=control["name"],
+                reference=control["reference"],
+                control_action=TechnicalControlAction[control["controlAction"]],
+                is_blocking=control["isBlocking"],
+            )
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def get_control(self, control) -> Optional[Control]:
+        cached = self._cache.get(("control", control.name))
+        if cached is not None:
+            return cached
+        resp = await self._request("GET", f"/controls/?name={control.name}")
+        if resp.status_code == 200:
+            data = resp.json()
+            if data == []:
+                return None
+            control = data[0]
+            return self._cache.set(
+                ("control", control["name"]),
+                Control(id=control["id"], name=control["name"]),
+            )
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def create_control(self, control) -> Control:
+        resp = await self._request(
+            "POST",
+            "/controls/",
+            json={
+                "name": control.name,
+                "qualityModel": control.quality_model.name,
+                "severity": control.severity.name,
+            },
+        )
+        if resp.status_code == 200:
+            control = resp.json()
+            self._cache.invalidate(("control", control["name"]))
+            return Control(
+                id=control["id"],
+                name=control["name"],
+                quality_model=control["qualityModel"],
+            )
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def get_resource_type_control_link(
+        self, control_id, resource_type_id
+    ) -> Optional[ResourceTypeControl]:
+        resp = await self._request(
+            "GET",
+            f"/resource-types-controls/?controlId={control_id}&resourceTypeId={resource_type_id}",
+        )
+        if resp.status_code == 200:
+            return ResourceTypeControl(
+                id=resp.json()["id"],
+                control_id=control_id,
+                resource_type_id=resource_type_id,
+            )
+        if resp.status_code == 404:
+            return None
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def create_resource_type_control_link(
+        self, control_id, resource_type_id
+    ) -> ResourceTypeControl:
+        resp = await self._request(
+            "POST",
+            "/resource-types-controls/",
+            json={"controlId": control_id, "resourceTypeId": resource_type_id},
+        )
+        if resp.status_code == 200:
+            return ResourceTypeControl(
+                id=resp.json()["id"],
+                control_id=control_id,
+                resource_type_id=resource_type_id,
+            )
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def get_resource_id(
+        self, reference: str, application_environment_id: int
+    ) -> Optional[int]:
+        """Get the id of a resource by its application id and reference"""
+        key = ("resource", application_environment_id, reference)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        resp = await self._request(
+            "GET",
+            f"/resources/?applicationEnvironmentId={application_environment_id}&reference={reference}",
+        )
+        if resp.status_code == 200:
+            return self._cache.set(key, resp.json()["id"])
+        if resp.status_code == 404:
+            return None
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def create_resource(
+        self, reference: str, application_environment_id: int
+    ) -> Optional[int]:
+        """Create a barebone resource for linking compliance event to"""
+        resp = await self._request(
+            "POST",
+            "/resources/",
+            json={
+                "name": reference,
+                "reference": reference,
+                "applicationEnvironmentId": application_environment_id,
+            },
+        )
+        if resp.status_code == 200:
+            self._cache.invalidate(("resource", application_environment_id, reference))
+            return resp.json()["id"]
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def get_resource_type(self, reference: str) -> Optional[ResourceType]:
+        """Get a resource type by its reference"""
+        cached = self._cache.get(("resource_type", reference))
+        if cached is not None:
+            return cached
+        resp = await self._request("GET", f"/resource-types/?reference={reference}")
+        if resp.status_code == 200:
+            data = resp.json()
+            return self._cache.set(
+                ("resource_type", reference),
+                ResourceType(
+                    id=data["id"],
+                    name=data["name"],
+                    reference=data["reference"],
+                    service=Service(
+                        id=data["serviceId"], name=None, reference=None, type=None
+                    ),
+                ),
+            )
+        if resp.status_code == 404:
+            return None
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def create_resource_type(self, resource_type: ResourceType) -> ResourceType:
+        """Create a resource type"""
+        resp = await self._request(
+            "POST",
+            "/resource-types/",
+            json={
+                "name": resource_type.name,
+                "reference": resource_type.reference,
+                "serviceId": resource_type.service.id,
+            },
+        )
+        if resp.status_code == 200:
+            resource_type.id = resp.json()["id"]
+            self._cache.invalidate(("resource_type", resource_type.reference))
+            return resource_type
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def save_resource(self, resource: Resource) -> None:
+        """Create or update a resource"""
+        application_environment_id = resource.application.application_environment_id
+        resp = await self._request(
+            "PUT",
+            f"/resources/?applicationEnvironmentId={application_environment_id}&reference={resource.reference}",
+            json={
+                "name": resource.name,
+                "reference": resource.reference,
+                "applicationEnvironmentId": application_environment_id,
+                "resourceTypeId": resource.resource_type.id,
+            },
+        )
+        if resp.status_code != 204:
+            raise BackendFailureException(
+                f"Status code: {resp.status_code} Message: {resp.text}"
+            )
+        self._cache.invalidate(
+            ("resource", application_environment_id, resource.reference)
+        )
+
+    async def save_monitored_resource(
+        self, technical_control_id, resource_id, state
+    ) -> None:
+        """Persist the current status of a montiored resource"""
+        resp = await self._request(
+            "PUT",
+            f"/monitored-resources/?technicalControlId={technical_control_id}&resourceId={resource_id}",
+            json={"monitoringState": state},
+        )
+        if resp.status_code != 204:
+            raise BackendFailureException(
+                f"Status code: {resp.status_code} Message: {resp.text}"
+            )
+
+    async def save_monitored_resources(self, items: list[dict]) -> None:
+        """Persist the current status of many monitored resources in a single request"""
+        resp = await self._request(
+            "PUT",
+            "/monitored-resources/batch/",
+            json=[
+                {
+                    "technicalControlId": item["technical_control_id"],
+                    "resourceId": item["resource_id"],
+                    "monitoringState": item["state"],
+                    "additionalData": item["additional_data"],
+                }
+                for item in items
+            ],
+        )
+        if resp.status_code != 200:
+            raise BackendFailureException(
+                f"Status code: {resp.status_code} Message: {resp.text}"
+            )
+        failed = [
+            item
+            for item in resp.json()
+            if item["outcome"] in ("NOT_FOUND", "INVALID_STATE")
+        ]
+        if failed:
+            raise BackendFailureException(f"Failed to persist: {failed}")
+
+    def _get_application_reference(self, arr):
+        for item in arr:
+            if item["type"] == self.referencing_type:
+                return item["reference"]
+        raise Exception("account id not found")
+
+    async def get_exclusion_resources(
+        self, state: ExclusionResourceState
+    ) -> list[ExclusionResource]:
+        """Get a list of exclusion resources by state"""
+        system_id = await self.get_system_id()
+        resp = await self._request(
+            "GET", f"/systems/{system_id}/exclusion-resources/?state={state.name}"
+        )
+        if resp.status_code == 200:
+            return [
+                ExclusionResource(
+                    id=item["id"],
+                    reference=item["reference"],
+                    technical_control_reference=item["technicalControlReference"],
+                    application_reference=self._get_application_reference(
+                        item["applicationReferences"]
+                    ),
+                    state=ExclusionResourceState[item["state"]],
+                )
+                for item in resp.json()
+            ]
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def set_exclusion_resource_state(
+        self, id: int, state: ExclusionResourceState
+    ) -> None:
+        """Set the state of an exclusion resource"""
+        resp = await self._request(
+            "PUT",
+            f"/exclusion-resources/{id}/",
+            json={"id": id, "state": state.name},
+        )
+        if resp.status_code != 204:
+            raise BackendFailureException(
+                f"Status code: {resp.status_code} Message: {resp.text}"
+            )
+
+    async def get_framework(self, framework: Framework) -> Optional[Framework]:
+        resp = await self._request("GET", f"/frameworks/?name={framework.name}")
+        if resp.status_code == 200:
+            data = resp.json()
+            if data == []:
+                return None
+            framework.id = data[0]["id"]
+            return framework
+        if resp.status_code == 404:
+            return None
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def create_framework(self, framework: Framework) -> Optional[Framework]:
+        resp = await self._request(
+            "POST",
+            "/frameworks/",
+            json={"name": framework.name, "link": framework.link},
+        )
+        if resp.status_code == 200:
+            framework.id = resp.json()["id"]
+            return framework
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def get_framework_section(
+        self, framework_section: FrameworkSection
+    ) -> Optional[FrameworkSection]:
+        resp = await self._request(
+            "GET",
+            f"/frameworks/{framework_section.framework.id}/sections/?name={framework_section.name}",
+        )
+        if resp.status_code == 200:
+            data = resp.json()
+            if data == []:
+                return None
+            framework_section.id = data[0]["id"]
+            return framework_section
+        if resp.status_code == 404:
+            return None
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def create_framework_section(
+        self, framework_section: FrameworkSection
+    ) -> Optional[FrameworkSection]:
+        resp = await self._request(
+            "POST",
+            f"/frameworks/{framework_section.framework.id}/sections/",
+            json={
+                "name": framework_section.name,
+                "link": framework_section.link,
+                "frameworkId": framework_section.framework.id,
+            },
+        )
+        if resp.status_code == 200:
+            framework_section.id = resp.json()["id"]
+            return framework_section
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def get_framework_control_objective(
+        self, framework_control_objective: FrameworkControlObjective
+    ) -> Optional[FrameworkControlObjective]:
+        resp = await self._request(
+            "GET",
+            (
+                f"/frameworks/{framework_control_objective.framework_section.framework.id}/sections"
+                f"/{framework_control_objective.framework_section.id}/control-objectives/?name={framework_control_objective.name}"
+            ),
+        )
+        if resp.status_code == 200:
+            data = resp.json()
+            if data == []:
+                return None
+            framework_control_objective.id = data[0]["id"]
+            return framework_control_objective
+        if resp.status_code == 404:
+            return None
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def create_framework_control_objective(
+        self, framework_control_objective: FrameworkControlObjective
+    ) -> Optional[FrameworkControlObjective]:
+        resp = await self._request(
+            "POST",
+            (
+                f"/frameworks/{framework_control_objective.framework_section.framework.id}"
+                f"/sections/{framework_control_objective.framework_section.id}/control-objectives/"
+            ),
+            json={
+                "name": framework_control_objective.name,
+                "link": framework_control_objective.link,
+                "frameworkSectionId": framework_control_objective.framework_section.id,
+            },
+        )
+        if resp.status_code == 200:
+            framework_control_objective.id = resp.json()["id"]
+            return framework_control_objective
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def get_framework_control_objective_link(
+        self, framework_control_objective: FrameworkControlObjective, control: Control
+    ) -> Optional[FrameworkControlObjectiveLink]:
+        resp = await self._request(
+            "GET",
+            f"/frameworks/framework-control-objective-link/?controlId={control.id}&frameworkControlObjectiveId={framework_control_objective.id}",
+        )
+        if resp.status_code == 200:
+            data = resp.json()
+            if data == []:
+                return None
+            return FrameworkControlObjectiveLink(
+                control_id=data[0]["controlId"],
+                framework_control_objective_id=data[0]["frameworkControlObjectiveId"],
+            )
+        if resp.status_code == 404:
+            return None
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+    async def create_framework_control_objective_link(
+        self, framework_control_objective: FrameworkControlObjective, control: Control
+    ) -> Optional[FrameworkControlObjectiveLink]:
+        resp = await self._request(
+            "POST",
+            "/frameworks/framework-control-objective-link/",
+            json={
+                "frameworkControlObjectiveId": framework_control_objective.id,
+                "controlId": control.id,
+            },
+        )
+        if resp.status_code == 200:
+            return FrameworkControlObjectiveLink(
+                framework_control_objective_id=framework_control_objective.id,
+                control_id=control.id,
+            )
+        raise BackendFailureException(
+            f"Status code: {resp.status_code} Message: {resp.text}"
+        )
+
+
+class AsyncHandler:
+    """Asyncio equivalent of Handler. Independent events are handled concurrently"""
+
+    def __init__(self, backend: AsyncBackend):
+        self._backend = backend
+        self._pending = {}
+
+    async def _once(self, key: Hashable, factory: Callable[[], Awaitable]):
+        # Concurrent callers resolving the same definition share one lookup so it is only created once
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def aclose(self) -> None:
+        """Close the underlying connection pool"""
+        await self._backend.aclose()
+
+    async def handle_resource_type(self, resource_type: ResourceType) -> ResourceType:
+        return await self._once(
+            ("resource_type", resource_type.reference),
+            lambda: self._handle_resource_type(resource_type),
+        )
+
+    async def _handle_resource_type(self, resource_type: ResourceType) -> ResourceType:
+        existing_resource_type = await self._backend.get_resource_type(
+            resource_type.reference
+        )
+        if existing_resource_type is not None:
+            return existing_resource_type
+
+        all_services = await self._backend.get_services()
+        service = next(
+            (e for e in all_services if e.reference == resource_type.service.reference),
+            None,
+        )
+        if service is None:
+            service = await self._backend.create_service(resource_type.service)
+
+        resource_type.service = service
+        return await self._backend.create_resource_type(resource_type)
+
+    async def _handle_environment(self, environment: Environment) -> Environment:
+        environments = await self._backend.get_environments()
+        found_environment = next(
+            (e for e in environments if e.abbreviation == environment.abbreviation),
+            None,
+        )
+        if found_environment is None:
+            found_environment = await self._backend.create_environment(environment)
+        return found_environment
+
+    async def _handle_event_application(self, application: Application) -> Application:
+        application.environment = await self._once(
+            ("environment", application.environment.abbreviation),
+            lambda: self._handle_environment(application.environment),
+        )
+        return await self._once(
+            ("application", application.reference),
+            lambda: self._handle_application(application),
+        )
+
+    async def _handle_application(self, application: Application) -> Application:
+        backend_application = (
+            await self._backend.get_application_environment_by_reference(
+                reference=application.reference
+            )
+        )
+        if backend_application is None:
+            await self._backend.create_application(application=application)
+            backend_application = await self._backend.create_application_environment(
+                application=application
+            )
+        return backend_application
+
+    async def _handle_event_resource(
+        self, application_environment_id: int, reference: str
+    ) -> int:
+        async def resolve():
+            resource_id = await self._backend.get_resource_id(
+                application_environment_id=application_environment_id,
+                reference=reference,
+            )
+            if resource_id is None:
+                resource_id = await self._backend.create_resource(
+                    application_environment_id=application_environment_id,
+                    reference=reference,
+                )
+            return resource_id
+
+        return await self._once(
+            ("resource", application_environment_id, reference), resolve
+        )
+
+    async def handle_resource(self, resource: Resource) -> None:
+        application = await self._handle_event_application(resource.application)
+        resource.resource_type = await self.handle_resource_type(
+            resource.resource_type
+        )
+        resource.application.application_environment_id = (
+            application.application_environment_id
+        )
+        await self._backend.save_resource(resource)
+
+    async def handle_control(self, control: Control) -> Control:
+        async def resolve():
+            backend_control = await self._backend.get_control(control)
+            if backend_control is None:
+                backend_control = await self._backend.create_control(control)
+            return backend_control
+
+        return await self._once(("control", control.name), resolve)
+
+    async def handle_technical_control(
+        self, technical_control: TechnicalControl
+    ) -> TechnicalControl:
+        """When passed a technical control this method will check its existance and if it does not exist a new one will be created. The technical control is returned"""
+        return await self._once(
+            ("technical_control", technical_control.reference),
+            lambda: self._handle_technical_control(technical_control),
+        )
+
+    async def _handle_technical_control(
+        self, technical_control: TechnicalControl
+    ) -> TechnicalControl:
+        backend_techincal_control = await self._backend.get_technical_control(
+            reference=technical_control.reference
+        )
+        backend_control = None
+        if technical_control.control and (
+            (backend_techincal_control is None)
+            or (backend_techincal_control.control_id is None)
+        ):
+            backend_control = await self.handle_control(technical_control.control)
+
+        if backend_techincal_control == None:
+            backend_techincal_control = await self._backend.create_technical_control(
+                technical_control
+            )
+        if backend_control:
+            backend_techincal_control.control_id = backend_control.id
+        return backend_techincal_control
+
+    async def _resolve_compliance_event(self, compliance_event: ComplianceEvent):
+        application, control = await asyncio.gather(
+            self._handle_event_application(compliance_event.application),
+            self.handle_technical_control(compliance_event.technical_control),
+        )
+        resource_id = await self._handle_event_resource(
+            application.application_environment_id,
+            compliance_event.resource_reference,
+        )
+        return control.id, resource_id
+
+    async def handle_compliance_event(self, compliance_event: ComplianceEvent) -> None:
+        """When passed a compliance event this method will attempt to create any missing defintions for Application and Technical Controls and persist the presented event"""
+        technical_control_id, resource_id = await self._resolve_compliance_event(
+            compliance_event
+        )
+        await self._backend.save_monitored_resource(
+            technical_control_id=technical_control_id,
+            resource_id=resource_id,
+            state=compliance_event.status.name,
+        )
+
+    async def handle_compliance_events(
+        self, compliance_events: Iterable[ComplianceEvent], chunk_size: int = 500
+    ) -> None:
+        """Handle a stream of compliance events. Definitions for each chunk are resolved concurrently and the monitoring states are sent in a single request per chunk
+
+        :param compliance_events: Iterable of compliance events, this is consumed lazily so may be a generator
+        :param chunk_size: Number of monitoring states to send per request
+        """
+        chunk = []
+        for compliance_event in compliance_events:
+            chunk.append(compliance_event)
+            if len(chunk) >= chunk_size:
+                await self._save_compliance_events(chunk)
+                chunk = []
+        if chunk:
+            await self._save_compliance_events(chunk)
+
+    async def _save_compliance_events(self, compliance_events: list) -> None:
+        resolved = await asyncio.gather(
+            *(self._resolve_compliance_event(e) for e in compliance_events)
+        )
+        await self._backend.save_monitored_resources(
+            [
+                {
+                    "technical_control_id": technical_control_id,
+                    "resource_id": resource_id,
+                    "state": compliance_event.status.name,
+                    "additional_data": compliance_event.additional_data,
+                }
+                for compliance_event, (technical_control_id, resource_id) in zip(
+                    compliance_events, resolved
+                )
+            ]
+        )
+
+    async def handle_framework_control_objective(
+        self, framework_control_objective: FrameworkControlObjective
+    ) -> FrameworkControlObjective:
+        framework_section = framework_control_objective.framework_section
+        framework = framework_section.framework
+
+        async def resolve_framework():
+            backend_framework = await self._backend.get_framework(framework)
+            if backend_framework is None:
+                backend_framework = await self._backend.create_framework(framework)
+            return backend_framework
+
+        framework.id = (
+            await self._once(("framework", framework.name), resolve_framework)
+        ).id
+
+        async def resolve_section():
+            backend_section = await self._backend.get_framework_section(
+                framework_section
+            )
+            if backend_section is None:
+                backend_section = await self._backend.create_framework_section(
+                    framework_section
+                )
+            return backend_section
+
+        framework_section.id = (
+            await self._once(
+                ("framework_section", framework.id, framework_section.name),
+                resolve_section,
+            )
+        ).id
+
+        async def resolve_control_objective():
+            backend_control_objective = (
+                await self._backend.get_framework_control_objective(
+                    framework_control_objective
+                )
+            )
+            if backend_control_objective is None:
+                backend_control_objective = (
+                    await self._backend.create_framework_control_objective(
+                        framework_control_objective
+                    )
+                )
+            return backend_control_objective
+
+        framework_control_objective.id = (
+            await self._once(
+                (
+                    "framework_control_objective",
+                    framework_section.id,
+                    framework_control_objective.name,
+                ),
+                resolve_control_objective,
+            )
+        ).id
+        return framework_control_objective
+
+    async def handle_framework_control_objective_link(
+        self, framework_control_objective: FrameworkControlObjective, control: Control
+    ) -> FrameworkControlObjectiveLink:
+        backend_framework_control_objective, backend_control = await asyncio.gather(
+            self.handle_framework_control_objective(framework_control_objective),
+            self.handle_control(control),
+        )
+        framework_control_objective_link = (
+            await self._backend.get_framework_control_objective_link(
+                backend_framework_control_objective, backend_control
+            )
+        )
+        if framework_control_objective_link is None:
+            framework_control_objective_link = (
+                await self._backend.create_framework_control_objective_link(
+                    backend_framework_control_objective, backend_control
+                )
+            )
+        return framework_control_objective_link
+
+    async def handle_resource_type_control_link(
+        self, control: Control, resource_type: ResourceType
+    ) -> ResourceTypeControl:
+        backend_control, backend_resource_type = await asyncio.gather(
+            self.handle_control(control), self.handle_resource_type(resource_type)
+        )
+        resource_type_control = await self._backend.get_resource_type_control_link(
+            resource_type_id=backend_resource_type.id, control_id=backend_control.id
+        )
+        if resource_type_control is None:
+            resource_type_control = (
+                await self._backend.create_resource_type_control_link(
+                    resource_type_id=backend_resource_type.id,
+                    control_id=backend_control.id,
+                )
+            )
+        return resource_type_control
+
+    async def set_exclusion_resource_state(
+        self, id: int, state: ExclusionResourceState
+    ) -> None:
+        """Set the status of a exclusion resource
+
+        :param id: The id of the exclusion resource to update
+        :param state: The state to set the excusion to
+        """
+        await self._backend.set_exclusion_resource_state(id=id, state=state)
+
+    async def get_exclusions_by_state(
+        self, state: ExclusionResourceState
+    ) -> list[ExclusionResource]:
+        """Get a list of exclusion resources filtered by state.
+
+        :param state: The exclusion state to filter by
+        """
+        return await self._backend.get_exclusion_resources(state)
+
+
+def _get_async_handler(
+    client: httpx.AsyncClient, backend_config: BackendConfig, max_concurrency: int = 10
+):
+    backend = AsyncBackend(
+        client=client, backend_config=backend_config, max_concurrency=max_concurrency
+    )
+    return AsyncHandler(backend)
+
+
+def get_async_handler(
+    base_url: str,
+    system_name: str,
+    system_stage: SystemStage,
+    referencing_type: str,
+    token: str,
+    max_concurrency: int = 10,
+    cache_ttl: float = 300,
+    cache_size: int = 10000,
+) -> AsyncHandler:
+    """Get an instance of async handler using the configuration provided. Must be called from within a running event loop
+
+    :param base_url: The base url at which the AirView API is located
+    :param system_name: The unique name which identifies this system
+    :param referencing_type: The common reference type which will be used to identify/deduplicate applications e.g. aws_account_id
+    :param token: The access token to be used to authenticate with the API
+    :param max_concurrency: Maximum number of requests in flight at once
+    :param cache_ttl: Seconds for which looked up reference data is reused before being fetched again
+    :param cache_size: Maximum number of reference data entries to cache, 0 disables caching
+    """
+
+    backend_config = BackendConfig(
+        base_url=base_url,
+        system_name=system_name,
+        system_stage=system_stage,
+        referencing_type=referencing_type,
+        token=token,
+        cache_ttl=cache_ttl,
+        cache_size=cache_size,
+    )
+    client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_concurrency, max_keepalive_connections=max_concurrency
+        )
+    )
+    return _get_async_handler(
+        client=client, backend_config=backend_config, max_concurrency=max_concurrency
+    )
@@ -0,0 +1,66 @@
+from __future__ import annotations
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class ReferenceCache:
+    """
+    In process cache for slow moving reference data fetched from AirView.
+    Entries expire after ``ttl`` seconds and the least recently used entry is evicted once ``max_size`` is reached.
+    Values are copied in and out, so callers updating what they are given cannot change what later callers read.
+    THIS CLASS IS INTENDED FOR INTERNAL USE ONLY.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_size: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._ttl = ttl
+        self._max_size = max_size
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a cached value, None is returned for a missing or expired entry
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key: Hashable, value: Any) -> Any:
+        """
+        Cache a value, returns the value to allow chaining
+        """
+        if self._max_size <= 0 or value is None:
+            return value
+        self._entries[key] = (self._clock() + self._ttl, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Remove a single entry
+        """
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Remove all entries
+        """
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,10 +1,24 @@
 from __future__ import annotations
+from typing import Iterable
+from urllib.parse import urljoin
 import requests
 
 from .models import *
+from .cache import ReferenceCache
 from pprint import pprint
 
 
+def _next_page_url(url: str, links: dict):
+    """Resolve the next page link of a list response against the url which was requested"""
+    next_page = links.get("next")
+    if next_page is None:
+        return None
+    if next_page["url"].startswith("?"):
+        # urljoin only resolves schemes it knows of
+        return url.split("?", 1)[0] + next_page["url"]
+    return urljoin(url, next_page["url"])
+
+
 class Backend:
     """
     Low level wrapper for calls to AirView api.
@@ -18,6 +32,9 @@ class Backend:
         self._backend_config = backend_config
         self._headers = {"Authorization": f"Bearer {backend_config.token}"}
         self._system_id = None
+        self._cache = ReferenceCache(
+            ttl=backend_config.cache_ttl, max_size=backend_config.cache_size
+        )
 
     @property
     def system_id(self):
@@ -32,11 +49,14 @@ class Backend:
         return self._system_id
 
     def get_system_id_by_name(self, name):
+        cached = self._cache.get(("system", name))
+        if cached is not None:
+            return cached
         url = self.get_url(f"/systems/?name={name}")
         resp = self._session.get(url=url, headers=self._headers)
         if resp.status_code == 200:
             data = resp.json()
-            return data["id"]
+            return self._cache.set(("system", name), data["id"])
         return None
 
     def get_url(self, route) -> str:
@@ -45,29 +65,39 @@ class Backend:
         """
         return f"{self._backend_config.base_url}{route}"
 
+    def get_list(self, route) -> list:
+        """
+        Helper method to get every item of a paginated list, following the next page links
+        """
+        items = []
+        url = self.get_url(route)
+        while url is not None:
+            resp = self._session.get(url=url, headers=self._headers)
+            if resp.status_code != 200:
+                raise BackendFailureException(
+                    f"Status code: {resp.status_code} Message: {resp.text}"
+                )
+            items.extend(resp.json())
+            url = _next_page_url(url, resp.links)
+        return items
+
     def get_environments(self) -> list[Environment]:
         """
         Get a list of environments
         """
-        url = self.get_url("/environments/")
-        resp = self._session.get(url=url, headers=self._headers)
-        if resp.status_code == 200:
-            return [Environment(**item) for item in resp.json()]
-        raise BackendFailureException(
-            f"Status code: {resp.status_code} Message: {resp.text}"
+        cached = self._cache.get(("environments",))
+        if cached is not None:
+            return cached
+        return self._cache.set(
+            ("environments",),
+            [Environment(**item) for item in self.get_list("/environments/")],
         )
 
     def get_services(self) -> list[Service]:
         """
         Get a list of services
         """
-        url = self.get_url("/services/")
-        resp = self._session.get(url=url, headers=self._headers)
-        if resp.status_code == 200:
-            return [Service(**item) for item in resp.json()]
-        raise BackendFailureException(
-            f"Status code: {resp.status_code} Message: {resp.text}"
-        )
+        return [Service(**item) for item in self.get_list("/services/")]
 
     def create_service(self, service: Service) -> Service:
         """
@@ -103,6 +133,7 @@ class Backend:
             },
         )
         if resp.status_code == 200:
+            self._cache.invalidate(("system", name))
             return resp.json()["id"]
         raise BackendFailureException(
             f"Status code: {resp.status_code} Message: {resp.text}"
@@ -122,6 +153,7 @@ class Backend:
             },
         )
         if resp.status_code == 200:
+            self._cache.invalidate(("environments",))
             return Environment(**resp.json())
         raise BackendFailureException(
             f"Status code: {resp.status_code} Message: {resp.text}"
@@ -131,6 +163,9 @@ class Backend:
         """
         Look up an application by the provided reference
         """
+        cached = self._cache.get(("application_environment", reference))
+        if cached is not None:
+            return cached
         type = self._backend_config.referencing_type
         url = self.get_url(
             f"/referenced-application-environments/?type={type}&reference={reference}"
@@ -139,11 +174,14 @@ class Backend:
 
         if resp.status_code == 200:
             data = resp.json()
-            return Application(
-                id=data["application"]["id"],
-                name=data["application"]["name"],
-                application_environment_id=data["id"],
-                reference=reference,
+            return self._cache.set(
+                ("application_environment", reference),
+                Application(
+                    id=data["application"]["id"],
+                    name=data["application"]["name"],
+                    application_environment_id=data["id"],
+                    reference=reference,
+                ),
             )
         if resp.status_code == 404:
             return None
@@ -196,6 +234,7 @@ class Backend:
         if resp.status_code == 200:
             data = resp.json()
             application.application_environment_id = data["id"]
+            self._cache.invalidate(("application_environment", application.reference))
             return application
         raise BackendFailureException(
             f"Status code: {resp.status_code} Message: {resp.text}"
@@ -223,6 +262,9 @@ class Backend:
         """
         Get a Technical Control by its reference
         """
+        cached = self._cache.get(("technical_control", reference))
+        if cached is not None:
+            return cached
         resp = self._session.get(
             url=self.get_url(
                 f"/technical-controls/?systemId={self.system_id}&reference={reference}"
@@ -234,18 +276,24 @@ class Backend:
             if data == []:
                 return None
             control = data[0]
-            return TechnicalControl(
-                id=control["id"],
-                name=control["name"],
-                reference=control["reference"],
-                control_action=TechnicalControlAction[control["controlAction"]],
-                is_blocking=control["isBlocking"],
+            return self._cache.set(
+                ("technical_control", reference),
+                TechnicalControl(
+                    id=control["id"],
+                    name=control["name"],
+                    reference=control["reference"],
+                    control_action=TechnicalControlAction[control["controlAction"]],
+                    is_blocking=control["isBlocking"],
+                ),
             )
         raise BackendFailureException(
             f"Status code: {resp.status_code} Message: {resp.text}"
         )
 
     def get_control(self, control) -> Optional[Control]:
+        cached = self._cache.get(("control", control.name))
+        if cached is not None:
+            return cached
         resp = self._session.get(
             url=self.get_url(f"/controls/?name={control.name}"),
             headers=self._headers,
@@ -255,7 +303,10 @@ class Backend:
             if data == []:
                 return None
             control = data[0]
-            return Control(id=control["id"], name=control["name"])
+            return self._cache.set(
+                ("control", control["name"]),
+                Control(id=control["id"], name=control["name"]),
+            )
         raise BackendFailureException(
             f"Status code: {resp.status_code} Message: {resp.text}"
         )
@@ -271,6 +322,7 @@ class Backend:
         )
         if resp.status_code == 200:
             control = resp.json()
+            self._cache.invalidate(("control", control["name"]))
             return Control(
                 id=control["id"],
                 name=control["name"],
@@ -334,6 +386,34 @@ class Backend:
                 f"Status code: {resp.status_code} Message: {resp.text}"
             )
 
+    def save_monitored_resources(self, items: list[dict]) -> None:
+        """Persist the current status of many monitored resources in a single request"""
+
+        resp = self._session.put(
+            url=self.get_url("/monitored-resources/batch/"),
+            json=[
+                {
+                    "technicalControlId": item["technical_control_id"],
+                    "resourceId": item["resource_id"],
+                    "monitoringState": item["state"],
+                    "additionalData": item["additional_data"],
+                }
+                for item in items
+            ],
+            headers=self._headers,
+        )
+        if resp.status_code != 200:
+            raise BackendFailureException(
+                f"Status code: {resp.status_code} Message: {resp.text}"
+            )
+        failed = [
+            item
+            for item in resp.json()
+            if item["outcome"] in ("NOT_FOUND", "INVALID_STATE")
+        ]
+        if failed:
+            raise BackendFailureException(f"Failed to persist: {failed}")
+
     def create_technical_control(
         self, technical_control: TechnicalControl
     ) -> TechnicalControl:
@@ -354,6 +434,7 @@ class Backend:
 
         if resp.status_code == 200:
             control = resp.json()
+            self._cache.invalidate(("technical_control", control["reference"]))
             return TechnicalControl(
                 id=control["id"],
                 name=control["name"],
@@ -418,6 +499,10 @@ class Backend:
         self, reference: str, application_environment_id: int
     ) -> Optional[int]:
         """Get the id of a resource by its application id and reference"""
+        key = ("resource", application_environment_id, reference)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
         resp = self._session.get(
             url=self.get_url(
                 f"/resources/?applicationEnvironmentId={application_environment_id}&reference={reference}",
@@ -425,7 +510,7 @@ class Backend:
             headers=self._headers,
         )
         if resp.status_code == 200:
-            return resp.json()["id"]
+            return self._cache.set(key, resp.json()["id"])
         if resp.status_code == 404:
             return None
         raise BackendFailureException(
@@ -434,6 +519,9 @@ class Backend:
 
     def get_resource_type(self, reference: str) -> Optional[ResourceType]:
         """Get the id of a resource by its application id and reference"""
+        cached = self._cache.get(("resource_type", reference))
+        if cached is not None:
+            return cached
         resp = self._session.get(
             url=self.get_url(
                 f"/resource-types/?reference={reference}",
@@ -443,12 +531,15 @@ class Backend:
         if resp.status_code == 200:
             data = resp.json()
             pprint(data)
-            return ResourceType(
-                id=data["id"],
-                name=data["name"],
-                reference=data["reference"],
-                service=Service(
-                    id=data["serviceId"], name=None, reference=None, type=None
+            return self._cache.set(
+                ("resource_type", reference),
+                ResourceType(
+                    id=data["id"],
+                    name=data["name"],
+                    reference=data["reference"],
+                    service=Service(
+                        id=data["serviceId"], name=None, reference=None, type=None
+                    ),
                 ),
             )
         if resp.status_code == 404:
@@ -471,6 +562,7 @@ class Backend:
             },
         )
         if resp.status_code == 200:
+            self._cache.invalidate(("resource", application_environment_id, reference))
             return resp.json()["id"]
 
         raise BackendFailureException(
@@ -491,6 +583,7 @@ class Backend:
         if resp.status_code == 200:
             data = resp.json()
             resource_type.id = data["id"]
+            self._cache.invalidate(("resource_type", resource_type.reference))
             return resource_type
 
         raise BackendFailureException(
@@ -515,6 +608,13 @@ class Backend:
             raise BackendFailureException(
                 f"Status code: {resp.status_code} Message: {resp.text}"
             )
+        self._cache.invalidate(
+            (
+                "resource",
+                resource.application.application_environment_id,
+                resource.reference,
+            )
+        )
 
     def get_framework(self, framework: Framework) -> Optional[Framework]:
         resp = self._session.get(
@@ -812,54 +912,63 @@ class Handler:
             backend_techincal_control.control_id = backend_control.id
         return backend_techincal_control
 
-    def handle_compliance_event(self, compliance_event: ComplianceEvent) -> None:
-        """When passed a compliance event this method will attempt to create any missing defintions for Application and Technical Controls and persist the presented event"""
+    def _handle_event_application(self, application: Application) -> Application:
         # check if env pre-exist
         environments = self._backend.get_environments()
         found_environment = next(
             (
                 e
                 for e in environments
-                if e.abbreviation
-                == compliance_event.application.environment.abbreviation
+                if e.abbreviation == application.environment.abbreviation
             ),
             None,
         )
         if found_environment is None:
             found_environment = self._backend.create_environment(
-                compliance_event.application.environment
+                application.environment
             )
 
-        compliance_event.application.environment = found_environment
+        application.environment = found_environment
 
         # check app pre-exists
-
-        application = self._backend.get_application_environment_by_reference(
-            reference=compliance_event.application.reference
+        backend_application = self._backend.get_application_environment_by_reference(
+            reference=application.reference
         )
 
-        if application is None:
+        if backend_application is None:
             # create new app
-            application = self._backend.create_application(
-                application=compliance_event.application
-            )
+            self._backend.create_application(application=application)
 
-            application = self._backend.create_application_environment(
-                application=compliance_event.application
+            backend_application = self._backend.create_application_environment(
+                application=application
             )
+        return backend_application
 
-        control = self.handle_technical_control(compliance_event.technical_control)
-
+    def _handle_event_resource(
+        self, application_environment_id: int, reference: str
+    ) -> int:
         # Ensure resource exists
         resource_id = self._backend.get_resource_id(
-            application_environment_id=application.application_environment_id,
-            reference=compliance_event.resource_reference,
+            application_environment_id=application_environment_id,
+            reference=reference,
         )
         if resource_id is None:
             resource_id = self._backend.create_resource(
-                application_environment_id=application.application_environment_id,
-                reference=compliance_event.resource_reference,
+                application_environment_id=application_environment_id,
+                reference=reference,
             )
+        return resource_id
+
+    def handle_compliance_event(self, compliance_event: ComplianceEvent) -> None:
+        """When passed a compliance event this method will attempt to create any missing defintions for Application and Technical Controls and persist the presented event"""
+        application = self._handle_event_application(compliance_event.application)
+
+        control = self.handle_technical_control(compliance_event.technical_control)
+
+        resource_id = self._handle_event_resource(
+            application_environment_id=application.application_environment_id,
+            reference=compliance_event.resource_reference,
+        )
 
         # save triggered
         self._backend.save_monitored_resource(
@@ -868,6 +977,58 @@ class Handler:
             state=compliance_event.status.name,
         )
 
+    def handle_compliance_events(
+        self, compliance_events: Iterable[ComplianceEvent], chunk_size: int = 500
+    ) -> None:
+        """Handle a stream of compliance events. Each application, technical control and resource is resolved once for the whole stream, any missing definitions are created and the monitoring states are sent in chunks
+
+        :param compliance_events: Iterable of compliance events, this is consumed lazily so may be a generator
+        :param chunk_size: Number of monitoring states to send per request
+        """
+        applications = {}
+        controls = {}
+        resource_ids = {}
+        pending = []
+
+        for compliance_event in compliance_events:
+            application = applications.get(compliance_event.application.reference)
+            if application is None:
+                application = self._handle_event_application(
+                    compliance_event.application
+                )
+                applications[compliance_event.application.reference] = application
+
+            control = controls.get(compliance_event.technical_control.reference)
+            if control is None:
+                control = self.handle_technical_control(
+                    compliance_event.technical_control
+                )
+                controls[compliance_event.technical_control.reference] = control
+
+            resource_key = (
+                application.application_environment_id,
+                compliance_event.resource_reference,
+            )
+            resource_id = resource_ids.get(resource_key)
+            if resource_id is None:
+                resource_id = self._handle_event_resource(*resource_key)
+                resource_ids[resource_key] = resource_id
+
+            pending.append(
+                {
+                    "technical_control_id": control.id,
+                    "resource_id": resource_id,
+                    "state": compliance_event.status.name,
+                    "additional_data": compliance_event.additional_data,
+                }
+            )
+            if len(pending) >= chunk_size:
+                self._backend.save_monitored_resources(pending)
+                pending = []
+
+        if pending:
+            self._backend.save_monitored_resources(pending)
+
     def handle_framework_control_objective(
         self, framework_control_objective: FrameworkControlObjective
     ) -> FrameworkControlObjective:
@@ -1060,6 +1221,8 @@ def get_handler(
     system_stage: SystemStage,
     referencing_type: str,
     token: str,
+    cache_ttl: float = 300,
+    cache_size: int = 10000,
 ) -> Handler:
     """Get an instance of handler using the configuration provided
 
@@ -1067,6 +1230,8 @@ def get_handler(
     :param system_name: The unique name which identifies this system
     :param referencing_type: The common reference type which will be used to identify/deduplicate applications e.g. aws_account_id
     :param token: The access token to be used to authenticate with the API
+    :param cache_ttl: Seconds for which looked up reference data is reused before being fetched again
+    :param cache_size: Maximum number of reference data entries to cache, 0 disables caching
     """
 
     backed_config = BackendConfig(
@@ -1075,6 +1240,8 @@ def get_handler(
         system_stage=system_stage,
         referencing_type=referencing_type,
         token=token,
+        cache_ttl=cache_ttl,
+        cache_size=cache_size,
     )
     session = requests.Session()
     return _get_handler(session=session, backend_config=backed_config)
@@ -102,6 +102,10 @@ class BackendConfig:
     system_stage: SystemStage
     #: Type of reference which will be used when identifying an application. e.g. aws_account_id
     referencing_type: str
+    #: Seconds for which reference data (environments, applications, controls, resources) is cached
+    cache_ttl: float = 300
+    #: Maximum number of reference data entries held in the cache, 0 disables caching
+    cache_size: int = 10000
 
 
 @dataclass
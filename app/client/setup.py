@@ -6,4 +6,5 @@ setup(
     description="API for AirView Product",
     packages=find_packages(),
     install_requires=["requests==2.25.1"],
+    extras_require={"async": ["httpx>=0.23"]},
 )
@@ -0,0 +1,31 @@
+"""monitored resource unique key
+
+Revision ID: 14b2ac202cca
+Revises: 8bd4a7443767
+Create Date: 2026-10-18 09:12:41.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '14b2ac202cca'
+down_revision = '8bd4a7443767'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Historic writes could race and duplicate a pair, keep the most recent row before enforcing uniqueness
+    op.execute(
+        "DELETE FROM monitored_resource WHERE id NOT IN ("
+        "SELECT max(id) FROM monitored_resource GROUP BY technical_control_id, resource_id)"
+    )
+    with op.batch_alter_table('monitored_resource') as batch_op:
+        batch_op.create_unique_constraint('uq_monitored_resource', ['technical_control_id', 'resource_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('monitored_resource') as batch_op:
+        batch_op.drop_constraint('uq_monitored_resource', type_='unique')
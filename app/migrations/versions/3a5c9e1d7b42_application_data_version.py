@@ -0,0 +1,28 @@
+"""application data version
+
+Revision ID: 3a5c9e1d7b42
+Revises: f8ddce6ab292
+Create Date: 2026-10-18 12:37:52.603311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a5c9e1d7b42'
+down_revision = 'f8ddce6ab292'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('application_data_version',
+    sa.Column('application_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('application_id')
+    )
+
+
+def downgrade():
+    op.drop_table('application_data_version')
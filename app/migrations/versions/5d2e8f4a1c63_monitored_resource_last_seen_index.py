@@ -0,0 +1,24 @@
+"""monitored resource last seen index
+
+Revision ID: 5d2e8f4a1c63
+Revises: 3a5c9e1d7b42
+Create Date: 2026-10-18 16:05:41.218774
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e8f4a1c63'
+down_revision = '3a5c9e1d7b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_monitored_resource_technical_control_id_last_seen', 'monitored_resource', ['technical_control_id', 'last_seen'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_monitored_resource_technical_control_id_last_seen', table_name='monitored_resource')
@@ -0,0 +1,42 @@
+"""lookup indexes
+
+Revision ID: 7114ee2ec67d
+Revises: 14b2ac202cca
+Create Date: 2026-10-18 10:02:17.530118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7114ee2ec67d'
+down_revision = '14b2ac202cca'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_application_environment_application_id', 'application_environment', ['application_id'], unique=False)
+    op.create_index('ix_resource_type_control_resource_type_id', 'resource_type_control', ['resource_type_id'], unique=False)
+    op.create_index('ix_resource_type_control_control_id', 'resource_type_control', ['control_id'], unique=False)
+    op.create_index('ix_technical_control_control_id', 'technical_control', ['control_id'], unique=False)
+    op.create_index('ix_exclusion_resource_exclusion_id', 'exclusion_resource', ['exclusion_id'], unique=False)
+    op.create_index('ix_resource_application_environment_id', 'resource', ['application_environment_id'], unique=False)
+    op.create_index('ix_resource_resource_type_id', 'resource', ['resource_type_id'], unique=False)
+    op.create_index('ix_monitored_resource_resource_id', 'monitored_resource', ['resource_id'], unique=False)
+    op.create_index('ix_monitored_resource_monitoring_state', 'monitored_resource', ['monitoring_state'], unique=False)
+    op.create_index('ix_exclusion_control_id', 'exclusion', ['control_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_exclusion_control_id', table_name='exclusion')
+    op.drop_index('ix_monitored_resource_monitoring_state', table_name='monitored_resource')
+    op.drop_index('ix_monitored_resource_resource_id', table_name='monitored_resource')
+    op.drop_index('ix_resource_resource_type_id', table_name='resource')
+    op.drop_index('ix_resource_application_environment_id', table_name='resource')
+    op.drop_index('ix_exclusion_resource_exclusion_id', table_name='exclusion_resource')
+    op.drop_index('ix_technical_control_control_id', table_name='technical_control')
+    op.drop_index('ix_resource_type_control_control_id', table_name='resource_type_control')
+    op.drop_index('ix_resource_type_control_resource_type_id', table_name='resource_type_control')
+    op.drop_index('ix_application_environment_application_id', table_name='application_environment')
@@ -0,0 +1,39 @@
+"""compliance job
+
+Revision ID: a4d7c3e9b815
+Revises: e6b1f04c9a27
+Create Date: 2026-10-18 19:05:44.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d7c3e9b815'
+down_revision = 'e6b1f04c9a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('compliance_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED', name='compliancejobstatus'), nullable=False),
+    sa.Column('odata_select', sa.String(length=2000), nullable=False),
+    sa.Column('odata_filter', sa.Text(), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.Column('started', sa.DateTime(), nullable=True),
+    sa.Column('finished', sa.DateTime(), nullable=True),
+    sa.Column('row_count', sa.Integer(), nullable=True),
+    sa.Column('error', sa.String(length=500), nullable=True),
+    sa.Column('result', sa.LargeBinary(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_compliance_job_status_created', 'compliance_job', ['status', 'created'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_compliance_job_status_created', table_name='compliance_job')
+    op.drop_table('compliance_job')
+    sa.Enum(name='compliancejobstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,58 @@
+"""compliance counter
+
+Revision ID: b7f3d9a1e6c4
+Revises: 5d2e8f4a1c63
+Create Date: 2026-10-18 17:02:44.915307
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7f3d9a1e6c4'
+down_revision = '5d2e8f4a1c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('compliance_fact', sa.Column('is_flagged', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('compliance_counter',
+    sa.Column('application_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('environment_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('control_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('application_name', sa.String(length=500), nullable=False),
+    sa.Column('environment_name', sa.String(length=500), nullable=False),
+    sa.Column('control_name', sa.String(length=500), nullable=True),
+    sa.Column('control_severity', sa.String(length=50), nullable=True),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('compliant', sa.Integer(), nullable=False),
+    sa.Column('flagged', sa.Integer(), nullable=False),
+    sa.Column('excluded', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('application_id', 'environment_id', 'control_id')
+    )
+
+    # Populate from the existing data, from here on the api keeps both tables up to date as it writes
+    op.execute(
+        "UPDATE compliance_fact SET "
+        "is_flagged = CASE WHEN EXISTS (SELECT 1 FROM monitored_resource mr "
+        "WHERE mr.id = compliance_fact.monitored_resource_id AND mr.monitoring_state = 'FLAGGED') THEN 1 ELSE 0 END, "
+        "excluded = CASE WHEN EXISTS (SELECT 1 FROM exclusion_resource er "
+        "JOIN exclusion e ON e.id = er.exclusion_id "
+        "WHERE er.resource_id = compliance_fact.resource_id AND e.control_id = compliance_fact.control_id) THEN 1 ELSE 0 END"
+    )
+    op.execute(
+        "INSERT INTO compliance_counter (application_id, environment_id, control_id, application_name, "
+        "environment_name, control_name, control_severity, total, compliant, flagged, excluded) "
+        "SELECT application_id, environment_id, COALESCE(control_id, 0), MAX(application_name), "
+        "MAX(environment_name), MAX(control_name), MAX(control_severity), COUNT(*), "
+        "SUM(is_compliant), SUM(is_flagged), SUM(excluded) "
+        "FROM compliance_fact "
+        "GROUP BY application_id, environment_id, COALESCE(control_id, 0)"
+    )
+
+
+def downgrade():
+    op.drop_table('compliance_counter')
+    op.drop_column('compliance_fact', 'is_flagged')
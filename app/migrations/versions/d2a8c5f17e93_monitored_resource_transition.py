@@ -0,0 +1,36 @@
+"""monitored resource transition
+
+Revision ID: d2a8c5f17e93
+Revises: b7f3d9a1e6c4
+Create Date: 2026-10-18 17:48:21.306514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a8c5f17e93'
+down_revision = 'b7f3d9a1e6c4'
+branch_labels = None
+depends_on = None
+
+# The type already exists, it was created with the monitored_resource table
+monitoredresourcestate = postgresql.ENUM('FLAGGED', 'MONITORING', 'DELETED', 'UNRESPONSIVE', name='monitoredresourcestate', create_type=False)
+
+
+def upgrade():
+    op.create_table('monitored_resource_transition',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('technical_control_id', sa.Integer(), nullable=False),
+    sa.Column('resource_id', sa.Integer(), nullable=False),
+    sa.Column('old_state', monitoredresourcestate, nullable=True),
+    sa.Column('new_state', monitoredresourcestate, nullable=False),
+    sa.Column('transitioned_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('monitored_resource_transition')
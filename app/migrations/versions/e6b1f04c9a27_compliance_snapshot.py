@@ -0,0 +1,44 @@
+"""compliance snapshot
+
+Revision ID: e6b1f04c9a27
+Revises: d2a8c5f17e93
+Create Date: 2026-10-18 18:32:07.418226
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b1f04c9a27'
+down_revision = 'd2a8c5f17e93'
+branch_labels = None
+depends_on = None
+
+# The type already exists, it was created with the control table
+qualitymodel = postgresql.ENUM('LOG_EXCELLENCE', 'SECURITY', 'RELIABILITY', 'PERFORMANCE_EFFICIENCY', 'COST_OPTIMISATION', 'PORTABILITY', 'USABILITY_AND_COMPATIBILITY', name='qualitymodel', create_type=False)
+
+
+def upgrade():
+    op.create_table('compliance_snapshot',
+    sa.Column('bucket', sa.Enum('HOUR', 'DAY', name='snapshotbucket'), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('application_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('environment_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('control_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('quality_model', qualitymodel, nullable=True),
+    sa.Column('control_severity', sa.String(length=50), nullable=True),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('compliant', sa.Integer(), nullable=False),
+    sa.Column('flagged', sa.Integer(), nullable=False),
+    sa.Column('excluded', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('bucket', 'bucket_start', 'application_id', 'environment_id', 'control_id')
+    )
+    op.create_index('ix_compliance_snapshot_bucket_application_id_bucket_start', 'compliance_snapshot', ['bucket', 'application_id', 'bucket_start'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_compliance_snapshot_bucket_application_id_bucket_start', table_name='compliance_snapshot')
+    op.drop_table('compliance_snapshot')
+    sa.Enum(name='snapshotbucket').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,81 @@
+"""compliance fact
+
+Revision ID: f8ddce6ab292
+Revises: 7114ee2ec67d
+Create Date: 2026-10-18 11:41:06.284117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f8ddce6ab292'
+down_revision = '7114ee2ec67d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('compliance_fact',
+    sa.Column('monitored_resource_id', sa.Integer(), nullable=False),
+    sa.Column('technical_control_id', sa.Integer(), nullable=False),
+    sa.Column('resource_id', sa.Integer(), nullable=False),
+    sa.Column('application_environment_id', sa.Integer(), nullable=False),
+    sa.Column('environment_id', sa.Integer(), nullable=False),
+    sa.Column('application_id', sa.Integer(), nullable=False),
+    sa.Column('control_id', sa.Integer(), nullable=True),
+    sa.Column('system_id', sa.Integer(), nullable=True),
+    sa.Column('resource_reference', sa.String(length=500), nullable=False),
+    sa.Column('application_name', sa.String(length=500), nullable=False),
+    sa.Column('environment_name', sa.String(length=500), nullable=False),
+    sa.Column('technical_control_reference', sa.String(length=500), nullable=False),
+    sa.Column('technical_control_name', sa.String(length=500), nullable=False),
+    sa.Column('control_name', sa.String(length=500), nullable=True),
+    sa.Column('control_severity', sa.String(length=50), nullable=True),
+    sa.Column('system_name', sa.String(length=500), nullable=True),
+    sa.Column('system_stage', sa.String(length=50), nullable=True),
+    sa.Column('is_compliant', sa.Integer(), nullable=False),
+    sa.Column('excluded', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('monitored_resource_id')
+    )
+    op.create_index('ix_compliance_fact_technical_control_id', 'compliance_fact', ['technical_control_id'], unique=False)
+    op.create_index('ix_compliance_fact_resource_id', 'compliance_fact', ['resource_id'], unique=False)
+    op.create_index('ix_compliance_fact_application_environment_id', 'compliance_fact', ['application_environment_id'], unique=False)
+    op.create_index('ix_compliance_fact_environment_id', 'compliance_fact', ['environment_id'], unique=False)
+    op.create_index('ix_compliance_fact_application_id', 'compliance_fact', ['application_id'], unique=False)
+    op.create_index('ix_compliance_fact_control_id', 'compliance_fact', ['control_id'], unique=False)
+    op.create_index('ix_compliance_fact_system_id', 'compliance_fact', ['system_id'], unique=False)
+
+    # Populate from the existing data, from here on the api keeps the table up to date as it writes
+    op.execute(
+        "INSERT INTO compliance_fact (monitored_resource_id, technical_control_id, resource_id, "
+        "application_environment_id, environment_id, application_id, control_id, system_id, "
+        "resource_reference, application_name, environment_name, technical_control_reference, "
+        "technical_control_name, control_name, control_severity, system_name, system_stage, "
+        "is_compliant, excluded) "
+        "SELECT mr.id, tc.id, r.id, ae.id, e.id, a.id, c.id, s.id, "
+        "r.reference, a.name, e.name, tc.reference, tc.name, c.name, "
+        "CAST(c.severity AS VARCHAR(50)), s.name, CAST(s.stage AS VARCHAR(50)), "
+        "CASE WHEN mr.monitoring_state = 'MONITORING' THEN 1 ELSE 0 END, 0 "
+        "FROM technical_control tc "
+        "JOIN monitored_resource mr ON mr.technical_control_id = tc.id "
+        "JOIN resource r ON r.id = mr.resource_id "
+        "JOIN application_environment ae ON ae.id = r.application_environment_id "
+        "JOIN environment e ON e.id = ae.environment_id "
+        "JOIN application a ON a.id = ae.application_id "
+        "LEFT OUTER JOIN control c ON c.id = tc.control_id "
+        "LEFT OUTER JOIN system s ON s.id = tc.system_id "
+        "WHERE mr.monitoring_state != 'DELETED'"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_compliance_fact_system_id', table_name='compliance_fact')
+    op.drop_index('ix_compliance_fact_control_id', table_name='compliance_fact')
+    op.drop_index('ix_compliance_fact_application_id', table_name='compliance_fact')
+    op.drop_index('ix_compliance_fact_environment_id', table_name='compliance_fact')
+    op.drop_index('ix_compliance_fact_application_environment_id', table_name='compliance_fact')
+    op.drop_index('ix_compliance_fact_resource_id', table_name='compliance_fact')
+    op.drop_index('ix_compliance_fact_technical_control_id', table_name='compliance_fact')
+    op.drop_table('compliance_fact')
@@ -9,9 +9,12 @@ from airview_api.models import (
     Exclusion,
     ControlSeverity,
 )
+import json
+from sqlalchemy import event
 from datetime import datetime
 from tests.factories import *
 from tests.common import client
+from airview_api.services import aggregation_service, data_version_service
 
 
 def test_get_application_compliance_aggregation(client):
@@ -92,3 +95,328 @@ def test_get_application_compliance_aggregation(client):
     # Assert the response
     assert response.status_code == 200
     assert response.json == expected_result
+
+
+def test_get_application_compliance_aggregation_groups_resources(client):
+    """
+    Given: A technical control flagged against several resources
+    When: The compliance aggregation is requested
+    Then: A single row lists every flagged resource, raised at the earliest flag
+    """
+    _seed_application()
+    ResourceFactory(
+        id=2,
+        name="Res AAA",
+        reference="ref_2",
+        resource_type_id=10,
+        application_environment_id=1,
+        last_modified=datetime.utcnow(),
+        last_seen=datetime.utcnow(),
+    )
+    MonitoredResourceFactory(
+        id=2,
+        resource_id=2,
+        last_modified=datetime(2020, 1, 1),
+        last_seen=datetime.utcnow(),
+        monitoring_state="FLAGGED",
+        technical_control_id=1,
+    )
+    db.session.commit()
+
+    response = client.get("/aggregations/compliance/1")
+
+    assert response.status_code == 200
+    assert len(response.json) == 1
+    assert sorted(response.json[0]["resources"], key=lambda r: r["id"]) == [
+        {"id": 1, "name": "Res BBB", "status": "none"},
+        {"id": 2, "name": "Res AAA", "status": "none"},
+    ]
+    assert response.json[0]["raisedDateTime"] == datetime(2020, 1, 1).isoformat()
+
+
+def _seed_application(application_id=1):
+    ApplicationFactory(id=application_id)
+    EnvironmentFactory(id=1)
+    ApplicationEnvironmentFactory(id=1, application_id=application_id, environment_id=1)
+    SystemFactory(id=1, name="Test System", stage="BUILD")
+    ControlFactory(
+        id=21,
+        name="Ctrl 1",
+        quality_model=QualityModel.COST_OPTIMISATION,
+        severity=ControlSeverity.HIGH,
+    )
+    TechnicalControlFactory(
+        id=1,
+        control_id=21,
+        name="Test Control",
+        reference="1",
+        system_id=1,
+        control_action=TechnicalControlAction.INCIDENT,
+    )
+    ServiceFactory(id=10, name="Service One", reference="ref_1", type="NETWORK")
+    ResourceTypeFactory(
+        id=10, name="res type one", reference="res-type-1", service_id=10
+    )
+    ResourceFactory(
+        id=1,
+        name="Res BBB",
+        reference="ref_1",
+        resource_type_id=10,
+        application_environment_id=1,
+        last_modified=datetime.utcnow(),
+        last_seen=datetime.utcnow(),
+    )
+    MonitoredResourceFactory(
+        id=1,
+        resource_id=1,
+        last_modified=datetime.utcnow(),
+        last_seen=datetime.utcnow(),
+        monitoring_state="FLAGGED",
+        technical_control_id=1,
+    )
+    db.session.commit()
+
+
+def test_get_application_compliance_aggregation_not_modified(client):
+    """
+    Given: An application whose aggregation has previously been fetched
+    When: The aggregation is requested again with the returned ETag
+    Then: 304 is returned until the application's monitored resources change
+    """
+    _seed_application()
+    url = "/aggregations/compliance/1"
+    first = client.get(url)
+    etag = first.headers["ETag"]
+
+    unchanged = client.get(url, headers={"If-None-Match": etag})
+    client.put(
+        "/monitored-resources/batch/",
+        json=[{"technicalControlId": 1, "resourceId": 1, "monitoringState": "MONITORING"}],
+    )
+    changed = client.get(url, headers={"If-None-Match": etag})
+
+    assert first.status_code == 200
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert first.json[0]["resources"] != []
+    assert changed.json == []
+
+
+def test_get_application_compliance_aggregation_not_modified_by_same_state(client):
+    """
+    Given: An application whose aggregation has previously been fetched
+    When: The unchanged monitoring state is reported again, singly and in a batch
+    Then: 304 is still returned for the ETag as nothing aggregated has changed
+    """
+    _seed_application()
+    url = "/aggregations/compliance/1"
+    etag = client.get(url).headers["ETag"]
+
+    single = client.put(
+        "/monitored-resources/?technicalControlId=1&resourceId=1",
+        json={"monitoringState": "FLAGGED"},
+    )
+    batch = client.put(
+        "/monitored-resources/batch/",
+        json=[{"technicalControlId": 1, "resourceId": 1, "monitoringState": "FLAGGED"}],
+    )
+    resp = client.get(url, headers={"If-None-Match": etag})
+
+    assert single.status_code == 204
+    assert batch.json[0]["outcome"] == "UNMODIFIED"
+    assert resp.status_code == 304
+
+
+def test_data_version_bumped_after_commit_only(client):
+    """
+    Given: An application with a data version
+    When: The application is changed and flushed, rolled back, then changed and committed
+    Then: The version is not written within the write transaction, is kept on rollback and moves on after the commit
+    """
+    _seed_application()
+    initial = data_version_service.get_version(1)
+
+    Application.query.get(1).name = "Renamed"
+    db.session.flush()
+    flushed = data_version_service.get_version(1)
+    db.session.rollback()
+    rolled_back = data_version_service.get_version(1)
+    Application.query.get(1).name = "Renamed"
+    db.session.commit()
+    committed = data_version_service.get_version(1)
+
+    assert flushed == initial
+    assert rolled_back == initial
+    assert committed != initial
+
+
+def test_get_control_overview_totals_served_from_cache(client, monkeypatch):
+    """
+    Given: An application whose control totals have previously been fetched
+    When: The totals are requested again
+    Then: The cached response is returned until a shared definition changes
+    """
+    _seed_application()
+    calls = []
+    original = aggregation_service.get_control_overview_totals
+
+    def counting(application_id):
+        calls.append(application_id)
+        return original(application_id)
+
+    monkeypatch.setattr(aggregation_service, "get_control_overview_totals", counting)
+    url = "/aggregations/control-overview-totals/1/"
+
+    first = client.get(url)
+    cached = client.get(url)
+    ControlFactory(
+        id=22,
+        name="Ctrl 2",
+        quality_model=QualityModel.SECURITY,
+        severity=ControlSeverity.LOW,
+    )
+    db.session.commit()
+    refreshed = client.get(url)
+
+    assert first.status_code == 200
+    assert cached.json == first.json
+    assert refreshed.status_code == 200
+    assert calls == [1, 1]
+
+
+def test_get_application_compliance_aggregation_pages(client):
+    """
+    Given: An application with flags raised by two technical controls
+    When: The aggregation is requested a row at a time
+    Then: Each page links to the next, including when served from the cache
+    """
+    _seed_application()
+    TechnicalControlFactory(
+        id=2,
+        control_id=21,
+        name="Test Control 2",
+        reference="2",
+        system_id=1,
+        control_action=TechnicalControlAction.INCIDENT,
+    )
+    MonitoredResourceFactory(
+        id=2,
+        resource_id=1,
+        last_modified=datetime.utcnow(),
+        last_seen=datetime.utcnow(),
+        monitoring_state="FLAGGED",
+        technical_control_id=2,
+    )
+    db.session.commit()
+    url = "/aggregations/compliance/1"
+
+    first = client.get(f"{url}?limit=1")
+    cached = client.get(f"{url}?limit=1")
+    link = first.headers["Link"]
+    second = client.get(url + link[1 : link.index(">")])
+
+    assert [row["id"] for row in first.json] == [1]
+    assert cached.headers["Link"] == link
+    assert [row["id"] for row in second.json] == [2]
+    assert "Link" not in second.headers
+
+
+def test_get_application_compliance_aggregation_streams_ndjson(client):
+    """
+    Given: An application with flagged resources
+    When: The aggregation is requested accepting newline delimited json
+    Then: Each row is returned on its own line with an ETag distinct from the json response
+    """
+    _seed_application()
+    url = "/aggregations/compliance/1"
+
+    streamed = client.get(url, headers={"Accept": "application/x-ndjson"})
+    expected = client.get(url)
+
+    assert streamed.status_code == 200
+    assert streamed.mimetype == "application/x-ndjson"
+    lines = streamed.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == expected.json
+    assert streamed.headers["ETag"] != expected.headers["ETag"]
+
+
+def _seed_control_overview():
+    _seed_application()
+    ControlFactory(
+        id=22,
+        name="Ctrl 2",
+        quality_model=QualityModel.SECURITY,
+        severity=ControlSeverity.LOW,
+    )
+    ControlFactory(
+        id=23,
+        name="Ctrl 3",
+        quality_model=QualityModel.SECURITY,
+        severity=ControlSeverity.MEDIUM,
+    )
+    for control_id in (21, 22, 23):
+        ResourceTypeControlFactory(resource_type_id=10, control_id=control_id)
+    db.session.commit()
+
+
+def test_get_control_overview_totals_counts_flagged_controls(client):
+    """
+    Given: Controls of each severity applied to a flagged resource and a control applied to none
+    When: The control overview totals are requested
+    Then: Every applied control is counted once in the total and once against its severity
+    """
+    _seed_control_overview()
+    ControlFactory(
+        id=24,
+        name="Ctrl 4",
+        quality_model=QualityModel.SECURITY,
+        severity=ControlSeverity.HIGH,
+    )
+    db.session.commit()
+
+    response = client.get("/aggregations/control-overview-totals/1/")
+
+    assert response.status_code == 200
+    assert response.json == {"total": 3, "low": 1, "medium": 1, "high": 1}
+
+
+def test_get_control_overview_totals_reads_without_writing(client):
+    """
+    Given: An application whose control totals have been computed
+    When: The totals are read again after its monitored resources change
+    Then: The totals are recomputed with a single read, nothing is written or committed
+    """
+    _seed_control_overview()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    first = aggregation_service.get_control_overview_totals(1)
+    client.put(
+        "/monitored-resources/batch/",
+        json=[
+            {
+                "technicalControlId": 1,
+                "resourceId": 1,
+                "monitoringState": "MONITORING",
+            }
+        ],
+    )
+    db.session.commit()
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        refreshed = aggregation_service.get_control_overview_totals(1)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+
+    assert (first.total, first.low, first.medium, first.high) == (3, 1, 1, 1)
+    assert (refreshed.total, refreshed.low, refreshed.medium, refreshed.high) == (
+        3,
+        0,
+        0,
+        0,
+    )
+    assert len(statements) == 1
+    assert statements[0].lstrip().upper().startswith("SELECT")
@@ -1,5 +1,6 @@
 import pytest
 from pprint import pprint
+from sqlalchemy import event
 from airview_api.models import Application, SystemStage
 
 from tests.common import client
@@ -110,8 +111,9 @@ def test_application_envionment_post_ok_response(client):
     assert items[0].environment_id == data["environmentId"]
     assert items[0].application_id == data["applicationId"]
 
-    assert items[0].references.count() == 2
-    assert items[0].references.filter_by(type="type1").first().reference == "val1"
+    assert len(items[0].references) == 2
+    assert items[0].references[0].type == "type1"
+    assert items[0].references[0].reference == "val1"
 
 
 def test_application_post_rejects_bad_reference_type(client):
@@ -276,3 +278,60 @@ def test_application_put_handles_not_found(client):
     assert resp.status_code == 404
     items = db.session.query(ApplicationEnvironment).all()
     assert len(items) == 0
+
+
+def _count_queries(client, path):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.session.expire_all()
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        resp = client.get(path)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    assert resp.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/applications/10/application-environments",
+        "/referenced-application-environments/?type=ref&reference=ref-10-0",
+        "/application-environments/1",
+    ],
+)
+def test_application_environment_query_count_is_constant(client, path):
+    """
+    Given: An application with a single environment
+    When: More environments with references are added and the environments are requested again
+    Then: The number of queries is unchanged
+    """
+    # Arrange
+    ApplicationFactory(id=10)
+    for env_id in range(1, 6):
+        EnvironmentFactory(id=env_id)
+
+    def add_environment(env_id):
+        ApplicationEnvironmentFactory(id=env_id, application_id=10, environment_id=env_id)
+        for n in range(3):
+            ApplicationEnvironmentReferenceFactory(
+                application_environment_id=env_id,
+                type=f"ref-{n}" if n else "ref",
+                reference=f"ref-{10 * env_id}-{n}",
+            )
+        db.session.commit()
+
+    add_environment(1)
+    single = _count_queries(client, path)
+
+    # Act
+    for env_id in range(2, 6):
+        add_environment(env_id)
+    many = _count_queries(client, path)
+
+    # Assert
+    assert many == single
@@ -0,0 +1,29 @@
+from tests import benchmark
+from tests.common import client
+from tests.factories import *
+
+
+def setup():
+    reset_factories()
+
+
+def test_benchmark_runs_every_case(client):
+    """
+    Given: A small synthetic estate
+    When: Every benchmark case is run
+    Then: Each case is summarised in the report
+    """
+    estate = benchmark.seed(
+        applications=1,
+        environments=2,
+        resources=10,
+        technical_controls=4,
+        resource_types=2,
+    )
+
+    results = benchmark.run(client, estate, runs=2, cases=list(benchmark.CASES))
+
+    assert sorted(results) == sorted(benchmark.CASES)
+    for summary in results.values():
+        assert summary["runs"] == 2
+        assert 0 < summary["min_ms"] <= summary["median_ms"] <= summary["max_ms"]
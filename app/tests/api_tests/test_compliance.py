@@ -1,12 +1,22 @@
+import json
+import logging
+import threading
 from datetime import datetime, timedelta, timezone
 from tests.factories import *
 from tests.common import client
+from sqlalchemy import event, update
+from airview_api.database import db
 from airview_api.models import (
+    Application,
+    ComplianceCounter,
+    ComplianceFact,
     MonitoredResource,
     MonitoredResourceState,
+    Resource,
     SystemStage,
     TechnicalControlAction,
 )
+from airview_api.services import compliance_fact_service, compliance_service
 import pytest
 
 
@@ -164,6 +174,27 @@ def test_get_complaince_bad_request_for_unexecutable_filter(client):
     )
 
 
+def test_get_complaince_logs_unexecutable_filter(client, caplog):
+    """
+    Given: A populated set of compliance events and sql instrumentation which is off
+    When: When the compliance api is called with an odata filter which is invalid
+    Then: The failure is logged with the filter which caused it
+    """
+    # Arrange
+    caplog.set_level(logging.WARNING, logger="airview_api.services.compliance_service")
+
+    # Act
+    resp = client.get(
+        "/compliance/?$select=applicationName&$filter=rubbish",
+    )
+
+    # Assert
+    assert resp.status_code == 400
+    assert any(
+        "rubbish" in r.getMessage() and r.exc_info is not None for r in caplog.records
+    )
+
+
 @pytest.mark.parametrize(
     "test_input",
     [
@@ -225,3 +256,470 @@ def test_get_complaince_ok_for_valid_query_with_missing_filter(client, test_inpu
     data = resp.get_json()
 
     assert data == test_input["expected"]
+
+
+def test_get_complaince_reflects_persisted_monitoring_states(client):
+    """
+    Given: A populated set of compliance events
+    When: When monitoring states are persisted and the compliance api is called
+    Then: The aggregation includes the persisted states
+    """
+    # Arrange
+    resp = client.put(
+        "/monitored-resources/batch/",
+        json=[
+            {"technicalControlId": 1, "resourceId": 11, "monitoringState": "MONITORING"},
+            {"technicalControlId": 1, "resourceId": 13, "monitoringState": "FLAGGED"},
+        ],
+    )
+    assert resp.status_code == 200
+
+    # Act
+    resp = client.get("/compliance/?$select=applicationName")
+
+    # Assert
+    assert resp.status_code == 200
+    assert resp.get_json() == [
+        {
+            "applicationName": "App Other",
+            "isCompliant": 2,
+            "excluded": 0,
+            "total": 3,
+        }
+    ]
+
+
+def test_get_complaince_reflects_updated_definitions(client):
+    """
+    Given: A populated set of compliance events
+    When: When the application is renamed and the compliance api is called
+    Then: The aggregation uses the new name
+    """
+    # Arrange
+    resp = client.put(
+        "/applications/1",
+        json={"id": 1, "name": "App Renamed", "applicationType": "BUSINESS_APPLICATION"},
+    )
+    assert resp.status_code == 204
+
+    # Act
+    resp = client.get("/compliance/?$select=applicationName")
+
+    # Assert
+    assert resp.status_code == 200
+    assert resp.get_json() == [
+        {
+            "applicationName": "App Renamed",
+            "isCompliant": 1,
+            "excluded": 0,
+            "total": 2,
+        }
+    ]
+
+
+def test_get_complaince_filter_values_are_bound_and_parsed_once(client):
+    """
+    Given: A populated set of compliance events
+    When: When the compliance api is called repeatedly with filters differing by literal
+    Then: Each filter is parsed once and literal values are never treated as sql
+    """
+    # Arrange
+    compliance_service._parse_filter.cache_clear()
+    query = "/compliance/?$select=resourceReference&$filter=resourceReference eq "
+
+    # Act
+    first = client.get(query + "'res_2'")
+    repeat = client.get(query + "'RES_2' ")
+    injected = client.get(query + "'x'' or ''1''=''1'")
+
+    # Assert
+    assert first.status_code == 200
+    assert repeat.get_json() == first.get_json()
+    assert [r["resourceReference"] for r in first.get_json()] == ["res_2"]
+    assert injected.status_code == 200
+    assert injected.get_json() == []
+    cache = compliance_service._parse_filter.cache_info()
+    assert cache.hits == 1
+    assert cache.misses == 2
+
+
+def test_get_complaince_streams_ndjson_when_accepted(client):
+    """
+    Given: A populated set of compliance events
+    When: When the compliance api is called accepting newline delimited json
+    Then: Each aggregated row is returned on its own line, matching the json response
+    """
+    # Arrange
+    query = "/compliance/?$select=resourceReference"
+
+    # Act
+    streamed = client.get(query, headers={"Accept": "application/x-ndjson"})
+    expected = client.get(query)
+
+    # Assert
+    assert streamed.status_code == 200
+    assert streamed.mimetype == "application/x-ndjson"
+    lines = streamed.get_data(as_text=True).splitlines()
+    assert sorted((json.loads(line) for line in lines), key=str) == sorted(
+        expected.get_json(), key=str
+    )
+
+
+def _counters():
+    return {
+        (c.application_id, c.environment_id, c.control_id): (
+            c.total,
+            c.compliant,
+            c.flagged,
+            c.excluded,
+        )
+        for c in ComplianceCounter.query.all()
+    }
+
+
+def test_get_complaince_served_from_counters(client):
+    """
+    Given: A populated set of compliance events
+    When: When monitoring states are persisted and the compliance api is called for counted columns only
+    Then: The counters follow the transitions and the aggregation is read from them rather than the facts
+    """
+    # Arrange
+    resp = client.put(
+        "/monitored-resources/batch/",
+        json=[
+            {"technicalControlId": 1, "resourceId": 11, "monitoringState": "MONITORING"},
+            {"technicalControlId": 1, "resourceId": 13, "monitoringState": "FLAGGED"},
+        ],
+    )
+    assert resp.status_code == 200
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # Act
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        resp = client.get(
+            "/compliance/?$select=applicationName,controlId&$filter=applicationId eq 1"
+        )
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+
+    # Assert
+    assert _counters() == {(1, 1, 0): (3, 2, 1, 0)}
+    assert resp.status_code == 200
+    assert resp.get_json() == [
+        {
+            "applicationName": "App Other",
+            "controlId": None,
+            "isCompliant": 2,
+            "excluded": 0,
+            "total": 3,
+        }
+    ]
+    assert any("compliance_counter" in s for s in statements)
+    assert not any("compliance_fact" in s for s in statements)
+
+
+def test_get_complaince_counts_exclusions(client):
+    """
+    Given: A populated set of compliance events for a technical control mapped to a control
+    When: When a resource is excluded from the control
+    Then: The counters and the aggregation include the exclusion
+    """
+    # Arrange
+    ControlFactory(id=5, name="Ctrl", quality_model="SECURITY", severity="HIGH")
+    TechnicalControl.query.get(1).control_id = 5
+    db.session.commit()
+
+    # Act
+    resp = client.post(
+        "/exclusions/",
+        json={
+            "controlId": 5,
+            "summary": "sum",
+            "isLimitedExclusion": False,
+            "resources": [12],
+        },
+    )
+
+    # Assert
+    assert resp.status_code == 201
+    assert _counters() == {(1, 1, 5): (2, 1, 1, 1)}
+    resp = client.get("/compliance/?$select=controlSeverity")
+    assert resp.get_json() == [
+        {"controlSeverity": "HIGH", "isCompliant": 1, "excluded": 1, "total": 2}
+    ]
+
+
+def test_verify_counters_corrects_drift(client):
+    """
+    Given: Counters which have drifted from the source tables, e.g. through writes made outside of the api
+    When: The counters are verified
+    Then: Missing, stale and left over counters are corrected
+    """
+    # Arrange
+    expected = _counters()
+    ComplianceCounter.query.filter_by(application_id=1).update({"flagged": 7})
+    db.session.add(
+        ComplianceCounter(
+            application_id=9,
+            environment_id=9,
+            control_id=0,
+            application_name="Gone",
+            environment_name="Gone",
+            total=1,
+            compliant=0,
+            flagged=1,
+            excluded=0,
+        )
+    )
+    db.session.commit()
+
+    # Act
+    metrics = compliance_fact_service.verify_counters()
+
+    # Assert
+    assert metrics == {"counters": 1, "drifted": 2}
+    assert _counters() == expected == {(1, 1, 0): (2, 1, 1, 0)}
+
+
+def test_refresh_removes_counters_left_without_facts(client):
+    """
+    Given: A counter whose facts are all of one monitored resource
+    When: The monitored resource is deleted
+    Then: Only the counter left without facts is removed
+    """
+    # Arrange
+    ControlFactory(id=5, name="Ctrl", quality_model="SECURITY", severity="HIGH")
+    TechnicalControlFactory(id=2, reference="2", name="two", system_id=2, control_id=5)
+    MonitoredResourceFactory(
+        id=304,
+        resource_id=11,
+        technical_control_id=2,
+        monitoring_state=MonitoredResourceState.MONITORING,
+        last_modified=datetime.utcnow(),
+        last_seen=datetime.utcnow(),
+    )
+    assert _counters() == {(1, 1, 0): (2, 1, 1, 0), (1, 1, 5): (1, 1, 0, 0)}
+
+    # Act
+    MonitoredResource.query.get(304).monitoring_state = MonitoredResourceState.DELETED
+    db.session.commit()
+
+    # Assert
+    assert _counters() == {(1, 1, 0): (2, 1, 1, 0)}
+
+
+def test_refresh_moves_counters_by_the_changed_facts_only(client):
+    """
+    Given: A counter of more facts than are refreshed in one chunk
+    When: The state of one of its monitored resources changes
+    Then: Only that fact is written and the counter is moved on by it, without recounting the other facts
+    """
+    # Arrange
+    now = datetime.utcnow()
+    count = compliance_fact_service.CHUNK_SIZE * 2 + 1
+    db.session.add_all(
+        Resource(
+            id=1000 + i,
+            name=f"Bulk {i}",
+            reference=f"bulk_{i}",
+            resource_type_id=10,
+            application_environment_id=1,
+            last_modified=now,
+            last_seen=now,
+        )
+        for i in range(count)
+    )
+    db.session.add_all(
+        MonitoredResource(
+            id=1000 + i,
+            resource_id=1000 + i,
+            technical_control_id=1,
+            monitoring_state=MonitoredResourceState.MONITORING,
+            last_modified=now,
+            last_seen=now,
+        )
+        for i in range(count)
+    )
+    db.session.commit()
+    statements = []
+    event.listen(
+        db.engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    # Act
+    resp = client.put(
+        "/monitored-resources/batch/",
+        json=[
+            {"technicalControlId": 1, "resourceId": 1000, "monitoringState": "FLAGGED"}
+        ],
+    )
+
+    # Assert
+    assert resp.status_code == 200
+    assert _counters() == {(1, 1, 0): (count + 2, count, 2, 0)}
+    assert not [s for s in statements if "count(" in s.lower()]
+    fact_writes = [
+        s
+        for s in statements
+        if "compliance_fact" in s and not s.lstrip().upper().startswith("SELECT")
+    ]
+    assert len(fact_writes) == 1
+    assert ComplianceFact.query.get(1000).is_flagged == 1
+
+
+def test_rename_is_copied_to_many_facts_in_one_statement(client):
+    """
+    Given: An application with more facts than are refreshed in one chunk
+    When: The application is renamed
+    Then: The name is copied onto its facts and counters with one update each rather than rebuilding the facts
+    """
+    # Arrange
+    now = datetime.utcnow()
+    count = compliance_fact_service.CHUNK_SIZE * 2 + 1
+    db.session.add_all(
+        Resource(
+            id=1000 + i,
+            name=f"Bulk {i}",
+            reference=f"bulk_{i}",
+            resource_type_id=10,
+            application_environment_id=1,
+            last_modified=now,
+            last_seen=now,
+        )
+        for i in range(count)
+    )
+    db.session.add_all(
+        MonitoredResource(
+            id=1000 + i,
+            resource_id=1000 + i,
+            technical_control_id=1,
+            monitoring_state=MonitoredResourceState.MONITORING,
+            last_modified=now,
+            last_seen=now,
+        )
+        for i in range(count)
+    )
+    db.session.commit()
+    statements = []
+    event.listen(
+        db.engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    # Act
+    Application.query.get(1).name = "App Renamed"
+    db.session.commit()
+
+    # Assert
+    fact_statements = [s for s in statements if "compliance_fact" in s]
+    assert len(fact_statements) == 1
+    assert fact_statements[0].lstrip().upper().startswith("UPDATE")
+    assert {f.application_name for f in ComplianceFact.query.all()} == {"App Renamed"}
+    assert {c.application_name for c in ComplianceCounter.query.all()} == {
+        "App Renamed"
+    }
+    assert _counters() == {(1, 1, 0): (count + 2, count + 1, 1, 0)}
+
+
+def test_rereported_definitions_do_not_refresh_facts(client):
+    """
+    Given: Monitored resources and a resource which have been reported before
+    When: They are reported again unchanged, so only when they were last seen moves on
+    Then: No facts, counters or data versions are written
+    """
+    # Arrange
+    db.session.commit()
+    statements = []
+    event.listen(
+        db.engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    # Act
+    batch = client.put(
+        "/monitored-resources/batch/",
+        json=[
+            {"technicalControlId": 1, "resourceId": 11, "monitoringState": "FLAGGED"},
+            {"technicalControlId": 1, "resourceId": 12, "monitoringState": "MONITORING"},
+        ],
+    )
+    resource = client.put(
+        "/resources/?applicationEnvironmentId=1&reference=res_1",
+        json={
+            "name": "Res One",
+            "reference": "res_1",
+            "resourceTypeId": 10,
+            "applicationEnvironmentId": 1,
+        },
+    )
+
+    # Assert
+    assert [r["outcome"] for r in batch.get_json()] == ["UNMODIFIED", "UNMODIFIED"]
+    assert resource.status_code == 204
+    assert not [
+        s
+        for s in statements
+        if "compliance_fact" in s
+        or "compliance_counter" in s
+        or "application_data_version" in s
+    ]
+
+
+def test_overlapping_refreshes_of_a_counter_both_count(client):
+    """
+    Given: Two writers changing monitored resources which share a counter, each in a transaction of its own
+    When: The second refreshes while the first has refreshed but not yet committed
+    Then: The second waits for the first rather than failing, and the counter includes both changes
+    """
+    if db.engine.dialect.name != "postgresql":
+        pytest.skip("sqlite does not allow concurrent writers")
+
+    # Arrange
+    app = client.application
+    first = db.engine.connect()
+    first_transaction = first.begin()
+    first.execute(
+        update(MonitoredResource)
+        .where(MonitoredResource.id == 301)
+        .values(monitoring_state=MonitoredResourceState.MONITORING)
+    )
+    compliance_fact_service.refresh(MonitoredResource, [301], connection=first)
+    errors = []
+
+    def second_writer():
+        with app.app_context(), db.engine.begin() as second:
+            try:
+                second.execute(
+                    update(MonitoredResource)
+                    .where(MonitoredResource.id == 302)
+                    .values(monitoring_state=MonitoredResourceState.DELETED)
+                )
+                compliance_fact_service.refresh(
+                    MonitoredResource, [302], connection=second
+                )
+            except Exception as e:
+                errors.append(e)
+                raise
+
+    # Act
+    second = threading.Thread(target=second_writer)
+    second.start()
+    second.join(1)
+    waited = second.is_alive()
+    first_transaction.commit()
+    first.close()
+    second.join(10)
+
+    # Assert
+    assert waited
+    assert errors == []
+    db.session.expire_all()
+    assert _counters() == {(1, 1, 0): (1, 1, 0, 0)}
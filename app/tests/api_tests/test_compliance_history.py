@@ -0,0 +1,193 @@
+from datetime import datetime, timedelta
+from tests.factories import *
+from tests.common import client
+from airview_api.database import db
+from airview_api.models import (
+    ComplianceSnapshot,
+    MonitoredResource,
+    MonitoredResourceState,
+    SnapshotBucket,
+    SystemStage,
+)
+from airview_api.services import compliance_history_service
+
+
+def setup():
+    reset_factories()
+    EnvironmentFactory(id=1)
+    SystemFactory(id=2, stage=SystemStage.BUILD)
+    ApplicationFactory(
+        id=1, name="App One", application_type=ApplicationType.APPLICATION_SERVICE
+    )
+    ApplicationEnvironmentFactory(id=1, application_id=1, environment_id=1)
+    ServiceFactory(id=10, name="Service One", reference="ref_1", type="NETWORK")
+    ResourceTypeFactory(
+        id=10, name="res type one", reference="res-type-1", service_id=10
+    )
+    ControlFactory(id=5, name="Ctrl", quality_model="SECURITY", severity="HIGH")
+    TechnicalControlFactory(id=1, reference="1", name="one", system_id=2, control_id=5)
+    ResourceFactory(
+        id=11,
+        name="Res One",
+        reference="res_1",
+        resource_type_id=10,
+        application_environment_id=1,
+    )
+    ResourceFactory(
+        id=12,
+        name="Res Two",
+        reference="res_2",
+        resource_type_id=10,
+        application_environment_id=1,
+    )
+
+    time_now = datetime.utcnow()
+    MonitoredResourceFactory(
+        id=301,
+        resource_id=11,
+        technical_control_id=1,
+        monitoring_state=MonitoredResourceState.FLAGGED,
+        last_modified=time_now,
+        last_seen=time_now,
+    )
+    MonitoredResourceFactory(
+        id=302,
+        resource_id=12,
+        technical_control_id=1,
+        monitoring_state=MonitoredResourceState.MONITORING,
+        last_modified=time_now,
+        last_seen=time_now,
+    )
+
+
+def _snapshots():
+    return {
+        (s.bucket, s.bucket_start): (s.total, s.compliant, s.flagged)
+        for s in ComplianceSnapshot.query.all()
+    }
+
+
+def test_take_snapshot_replaces_current_buckets(client):
+    """
+    Given: A snapshot already taken within the current hour
+    When: The compliance changes and a snapshot is taken again within the same hour
+    Then: The hourly and daily buckets hold the latest counts only
+    """
+    # Arrange
+    now = datetime(2026, 10, 18, 14, 20)
+    compliance_history_service.take_snapshot(now)
+    MonitoredResource.query.get(301).monitoring_state = (
+        MonitoredResourceState.MONITORING
+    )
+    db.session.commit()
+
+    # Act
+    metrics = compliance_history_service.take_snapshot(now + timedelta(minutes=30))
+
+    # Assert
+    assert metrics == {"written": 2, "removed": 0}
+    assert _snapshots() == {
+        (SnapshotBucket.HOUR, datetime(2026, 10, 18, 14)): (2, 2, 0),
+        (SnapshotBucket.DAY, datetime(2026, 10, 18)): (2, 2, 0),
+    }
+
+
+def test_take_snapshot_downsamples_expired_hours(client):
+    """
+    Given: Hourly snapshots taken over more than the hourly retention
+    When: A snapshot is taken
+    Then: Expired hourly snapshots are removed and the daily snapshots are kept
+    """
+    # Arrange
+    now = datetime(2026, 10, 18, 14, 20)
+    old = now - compliance_history_service.HOURLY_RETENTION - timedelta(hours=1)
+    compliance_history_service.take_snapshot(old)
+
+    # Act
+    metrics = compliance_history_service.take_snapshot(now)
+
+    # Assert
+    assert metrics == {"written": 2, "removed": 1}
+    assert set(_snapshots()) == {
+        (SnapshotBucket.HOUR, datetime(2026, 10, 18, 14)),
+        (SnapshotBucket.DAY, datetime(2026, 10, 18)),
+        (SnapshotBucket.DAY, datetime(2026, 10, 11)),
+    }
+
+
+def test_get_history_returns_buckets_in_range(client):
+    """
+    Given: Daily snapshots taken on consecutive days
+    When: When a call is made to get the daily history for a range covering the later days
+    Then: The counts by application and quality model of the buckets in range are returned in order
+    """
+    # Arrange
+    for day in range(1, 4):
+        compliance_history_service.take_snapshot(datetime(2026, 10, day, 12))
+        if day == 2:
+            MonitoredResource.query.get(301).monitoring_state = (
+                MonitoredResourceState.MONITORING
+            )
+            db.session.commit()
+
+    # Act
+    resp = client.get(
+        "/compliance/history?start=2026-10-02T00:00:00&end=2026-10-04T00:00:00"
+        "&bucket=DAY&qualityModel=SECURITY"
+    )
+
+    # Assert
+    assert resp.status_code == 200
+    assert resp.get_json() == [
+        {
+            "bucketStart": "2026-10-02T00:00:00",
+            "applicationId": 1,
+            "qualityModel": "SECURITY",
+            "total": 2,
+            "compliant": 1,
+            "flagged": 1,
+            "excluded": 0,
+        },
+        {
+            "bucketStart": "2026-10-03T00:00:00",
+            "applicationId": 1,
+            "qualityModel": "SECURITY",
+            "total": 2,
+            "compliant": 2,
+            "flagged": 0,
+            "excluded": 0,
+        },
+    ]
+
+
+def test_get_history_bad_request_for_unknown_quality_model(client):
+    """
+    Given: A compliance history query
+    When: When the quality model is not a known quality model
+    Then: A 400 is returned
+    """
+    # Arrange
+    # Act
+    resp = client.get(
+        "/compliance/history?start=2026-10-01T00:00:00&end=2026-10-02T00:00:00"
+        "&qualityModel=NOPE"
+    )
+
+    # Assert
+    assert resp.status_code == 400
+
+
+def test_get_history_bad_request_for_empty_range(client):
+    """
+    Given: A compliance history query
+    When: When end is not after start
+    Then: A 400 is returned
+    """
+    # Arrange
+    # Act
+    resp = client.get(
+        "/compliance/history?start=2026-10-02T00:00:00&end=2026-10-01T00:00:00"
+    )
+
+    # Assert
+    assert resp.status_code == 400
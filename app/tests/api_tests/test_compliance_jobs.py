@@ -0,0 +1,261 @@
+import gzip
+import json
+import threading
+from datetime import datetime, timedelta
+from tests.factories import *
+from tests.common import client, instance
+from airview_api.database import db
+from airview_api.job_queue import DeferredJobQueue, LocalJobQueue
+from airview_api.models import (
+    ComplianceJob,
+    ComplianceJobStatus,
+    MonitoredResourceState,
+    SystemStage,
+)
+from airview_api.services import compliance_job_service
+
+
+def setup():
+    reset_factories()
+    EnvironmentFactory(id=1)
+    SystemFactory(id=2, stage=SystemStage.BUILD)
+    ApplicationFactory(
+        id=1, name="App One", application_type=ApplicationType.APPLICATION_SERVICE
+    )
+    ApplicationEnvironmentFactory(id=1, application_id=1, environment_id=1)
+    ServiceFactory(id=10, name="Service One", reference="ref_1", type="NETWORK")
+    ResourceTypeFactory(
+        id=10, name="res type one", reference="res-type-1", service_id=10
+    )
+    TechnicalControlFactory(id=1, reference="1", name="one", system_id=2)
+    ResourceFactory(
+        id=11,
+        name="Res One",
+        reference="res_1",
+        resource_type_id=10,
+        application_environment_id=1,
+    )
+    ResourceFactory(
+        id=12,
+        name="Res Two",
+        reference="res_2",
+        resource_type_id=10,
+        application_environment_id=1,
+    )
+
+    time_now = datetime.utcnow()
+    MonitoredResourceFactory(
+        id=301,
+        resource_id=11,
+        technical_control_id=1,
+        monitoring_state=MonitoredResourceState.FLAGGED,
+        last_modified=time_now,
+        last_seen=time_now,
+    )
+    MonitoredResourceFactory(
+        id=302,
+        resource_id=12,
+        technical_control_id=1,
+        monitoring_state=MonitoredResourceState.MONITORING,
+        last_modified=time_now,
+        last_seen=time_now,
+    )
+
+
+def _use_queue(client, queue):
+    client.application.extensions["airview_job_queue"] = queue
+
+
+def test_compliance_job_runs_aggregate(client):
+    """
+    Given: A job queue which runs jobs as they are submitted
+    When: When a compliance job is queued and its result fetched
+    Then: The job succeeds and its result matches the /compliance/ aggregate as newline delimited json
+    """
+    # Arrange
+    _use_queue(client, LocalJobQueue(0))
+    query = (
+        "$select=applicationName,resourceReference&$filter=resourceReference eq 'res_1'"
+    )
+    expected = client.get(
+        "/compliance/?" + query, headers={"Accept": "application/x-ndjson"}
+    ).get_data(as_text=True)
+
+    # Act
+    resp = client.post(
+        "/compliance/jobs",
+        json={
+            "select": "applicationName,resourceReference",
+            "filter": "resourceReference eq 'res_1'",
+        },
+    )
+    job = client.get(f"/compliance/jobs/{resp.get_json()['id']}")
+    result = client.get(f"/compliance/jobs/{resp.get_json()['id']}/result")
+
+    # Assert
+    assert resp.status_code == 202
+    assert job.get_json()["status"] == "SUCCEEDED"
+    assert job.get_json()["rowCount"] == 1
+    assert result.status_code == 200
+    assert result.mimetype == "application/x-ndjson"
+    assert [json.loads(l) for l in result.get_data(as_text=True).splitlines()] == [
+        json.loads(l) for l in expected.splitlines()
+    ]
+
+
+def test_compliance_job_result_sent_gzipped_when_accepted(client):
+    """
+    Given: A compliance job which has succeeded
+    When: When its result is fetched by a client accepting gzip
+    Then: The stored result is sent gzip encoded
+    """
+    # Arrange
+    _use_queue(client, LocalJobQueue(0))
+    job_id = client.post(
+        "/compliance/jobs", json={"select": "applicationName"}
+    ).get_json()["id"]
+
+    # Act
+    resp = client.get(
+        f"/compliance/jobs/{job_id}/result", headers={"Accept-Encoding": "gzip"}
+    )
+
+    # Assert
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(resp.get_data())) == {
+        "applicationName": "App One",
+        "isCompliant": 1,
+        "total": 2,
+        "excluded": 0,
+    }
+
+
+def test_compliance_job_bad_request_for_unknown_select(client):
+    """
+    Given: A compliance job request
+    When: When the select contains a field which is not allowed
+    Then: A 400 is returned and no job is queued
+    """
+    # Arrange
+    _use_queue(client, LocalJobQueue(0))
+
+    # Act
+    resp = client.post("/compliance/jobs", json={"select": "unknownField"})
+
+    # Assert
+    assert resp.status_code == 400
+    assert ComplianceJob.query.count() == 0
+
+
+def test_compliance_job_not_found(client):
+    """
+    Given: No compliance jobs
+    When: When a call is made for a job by id
+    Then: A 404 is returned
+    """
+    # Arrange
+    # Act
+    resp = client.get("/compliance/jobs/99")
+
+    # Assert
+    assert resp.status_code == 404
+
+
+def test_run_queued_runs_deferred_jobs_and_removes_expired(client):
+    """
+    Given: A job queue which leaves jobs queued and a job which finished beyond the retention
+    When: When a job is queued and queued jobs are run
+    Then: The result is only available once the job has run and the expired job is removed
+    """
+    # Arrange
+    _use_queue(client, DeferredJobQueue())
+    now = datetime.utcnow()
+    db.session.add(
+        ComplianceJob(
+            id=50,
+            status=ComplianceJobStatus.SUCCEEDED,
+            odata_select="applicationName",
+            created=now - timedelta(days=2),
+            finished=now - compliance_job_service.JOB_RETENTION - timedelta(minutes=1),
+        )
+    )
+    db.session.commit()
+    job_id = client.post(
+        "/compliance/jobs", json={"select": "applicationName"}
+    ).get_json()["id"]
+    before = client.get(f"/compliance/jobs/{job_id}/result")
+
+    # Act
+    metrics = compliance_job_service.run_queued(now=now)
+
+    # Assert
+    assert before.status_code == 409
+    assert metrics == {"abandoned": 0, "ran": 1, "removed": 1}
+    assert client.get(f"/compliance/jobs/{job_id}").get_json()["status"] == "SUCCEEDED"
+    assert client.get("/compliance/jobs/50").status_code == 404
+
+
+def test_run_queued_fails_jobs_whose_worker_died(client):
+    """
+    Given: A job left running past the timeout, as its worker died, and one left running past the retention without finishing
+    When: When queued jobs are run
+    Then: The timed out job is failed so its result stops being polled for, and the one past the retention is removed
+    """
+    # Arrange
+    now = datetime.utcnow()
+    started = now - compliance_job_service.JOB_TIMEOUT - timedelta(minutes=1)
+    db.session.add(
+        ComplianceJob(
+            id=60,
+            status=ComplianceJobStatus.RUNNING,
+            odata_select="applicationName",
+            created=started,
+            started=started,
+        )
+    )
+    db.session.add(
+        ComplianceJob(
+            id=61,
+            status=ComplianceJobStatus.RUNNING,
+            odata_select="applicationName",
+            created=now - compliance_job_service.JOB_RETENTION - timedelta(minutes=1),
+            started=now,
+        )
+    )
+    db.session.commit()
+
+    # Act
+    metrics = compliance_job_service.run_queued(now=now)
+
+    # Assert
+    assert metrics == {"abandoned": 1, "ran": 0, "removed": 1}
+    job = client.get("/compliance/jobs/60").get_json()
+    assert job["status"] == "FAILED"
+    assert job["finished"] is not None
+    assert client.get("/compliance/jobs/61").status_code == 404
+
+
+def test_local_job_queue_runs_jobs_on_worker_threads(instance):
+    """
+    Given: A job queue with worker threads
+    When: When a job is submitted
+    Then: It is run on a worker thread within an app context
+    """
+    # Arrange
+    queue = LocalJobQueue(1)
+    ran = []
+
+    def job(value):
+        from flask import current_app
+
+        ran.append((value, current_app.name, threading.current_thread().name))
+
+    # Act
+    queue.submit(job, 1)
+    queue.shutdown()
+
+    # Assert
+    assert len(ran) == 1
+    assert ran[0][0] == 1
+    assert ran[0][1] == instance.name
+    assert ran[0][2].startswith("airview-job")
@@ -1,6 +1,9 @@
+import base64
+import json
 from os import environ
 from pprint import pprint
 import pytest
+from airview_api import blueprint
 from tests.factories import *
 from tests.common import client
 
@@ -80,6 +83,85 @@ def test_enviromments_get_all_ok(client):
     assert data[3]["abbreviation"] == "E3"
 
 
+def test_enviromments_get_all_follows_pages(client):
+    """
+    Given: More environments exist than the requested page size
+    When: When the root resource is called and the next page link followed
+    Then: Each environment is returned once, in order, and the last page has no next link
+    """
+    # Arrange
+    EnvironmentFactory.create_batch(5)
+
+    # Act
+    ids = []
+    url = "/environments/?limit=2"
+    pages = 0
+    while url is not None:
+        resp = client.get(url)
+        assert resp.status_code == 200
+        ids.extend(item["id"] for item in resp.get_json())
+        next_page = resp.headers.get("Link")
+        url = (
+            "/environments/" + next_page[1 : next_page.index(">")]
+            if next_page
+            else None
+        )
+        pages += 1
+
+    # Assert
+    assert ids == [0, 1, 2, 3, 4]
+    assert pages == 3
+
+
+def _cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def test_enviromments_get_all_unpaged_without_limit(client, monkeypatch):
+    """
+    Given: More environments exist than the largest page size
+    When: When the root resource is called without a limit
+    Then: Every environment is returned with no next page link
+    """
+    # Arrange
+    monkeypatch.setattr(blueprint, "MAX_PAGE_LIMIT", 2)
+    EnvironmentFactory.create_batch(3)
+
+    # Act
+    resp = client.get("/environments/")
+
+    # Assert
+    assert resp.status_code == 200
+    assert len(resp.get_json()) == 3
+    assert "Link" not in resp.headers
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "limit=0",
+        "limit=abc",
+        "limit=100000",
+        "after=not-a-cursor",
+        f"after={_cursor([1, 2])}",
+        f"after={_cursor(['one'])}",
+        f"after={_cursor([[1]])}",
+        f"after={_cursor([True])}",
+    ],
+)
+def test_enviromments_get_all_bad_request_for_bad_page(client, query):
+    """
+    Given: A page size or cursor which is not valid
+    When: When the root resource is called
+    Then: Status 400 is returned
+    """
+    # Act
+    resp = client.get(f"/environments/?{query}")
+
+    # Assert
+    assert resp.status_code == 400
+
+
 def test_environment_post_ok_response(client):
     """
     Given: An empty environment collection in the db
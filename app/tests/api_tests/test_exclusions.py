@@ -84,3 +84,88 @@ def test_post_exclusion(client):
 
     assert len(exclusions[0].resources) == 1
     assert exclusions[0].resources[0].id == 31
+
+
+def _seed_resources(count):
+    EnvironmentFactory(id=1)
+    ApplicationFactory(
+        id=1, name="App One", application_type=ApplicationType.APPLICATION_SERVICE
+    )
+    ApplicationEnvironmentFactory(id=1, application_id=1, environment_id=1)
+    ServiceFactory(id=10, name="Service One", reference="ref_1", type="NETWORK")
+    ResourceTypeFactory(
+        id=10, name="res type one", reference="res-type-1", service_id=10
+    )
+    ControlFactory(
+        id=21,
+        name="Ctrl 1",
+        quality_model=QualityModel.COST_OPTIMISATION,
+        severity=ControlSeverity.HIGH,
+    )
+    for resource_id in range(1, count + 1):
+        ResourceFactory(
+            id=resource_id,
+            name=f"Res {resource_id}",
+            reference=f"res-{resource_id}",
+            resource_type_id=10,
+            application_environment_id=1,
+        )
+    db.session.commit()
+
+
+def _post_exclusion(client, resources):
+    return client.post(
+        "/exclusions/",
+        json={
+            "summary": "Test Exclusion",
+            "isLimitedExclusion": False,
+            "controlId": 21,
+            "resources": resources,
+        },
+    )
+
+
+def test_post_exclusion_links_many_resources(client):
+    """
+    Given: More resources than fit in a single statement
+    When: An exclusion is posted for all of them
+    Then: Every resource is linked to the exclusion
+    """
+    _seed_resources(1200)
+
+    resp = _post_exclusion(client, list(range(1, 1201)))
+
+    assert resp.status_code == 201
+    exclusions = db.session.query(Exclusion).all()
+    assert len(exclusions) == 1
+    assert sorted(r.id for r in exclusions[0].resources) == list(range(1, 1201))
+
+
+def test_post_exclusion_rejects_already_excluded_resource(client):
+    """
+    Given: A resource which is already excluded from a control
+    When: Another exclusion including that resource is posted for the control
+    Then: A 400 status is returned and no exclusion is persisted
+    """
+    _seed_resources(3)
+    assert _post_exclusion(client, [1, 2]).status_code == 201
+
+    resp = _post_exclusion(client, [3, 2])
+
+    assert resp.status_code == 400
+    assert resp.get_json()["message"] == "Exclusions already exist for resources provided"
+    assert db.session.query(Exclusion).count() == 1
+
+
+def test_post_exclusion_rejects_unknown_resource(client):
+    """
+    Given: A collection of resources in the database
+    When: An exclusion is posted including a resource which does not exist
+    Then: A 400 status is returned and no exclusion is persisted
+    """
+    _seed_resources(2)
+
+    resp = _post_exclusion(client, [1, 99])
+
+    assert resp.status_code == 400
+    assert db.session.query(Exclusion).count() == 0
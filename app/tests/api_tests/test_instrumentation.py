@@ -0,0 +1,52 @@
+import json
+import logging
+from flask import Flask
+from airview_api import app
+from airview_api.database import db
+from tests.factories import *
+
+
+def test_instrumentation_reports_request_statements(tmp_path, caplog):
+    """
+    Given: An app with sql instrumentation enabled
+    When: A request uses the database
+    Then: The statements are totalled in the Server-Timing header and logged with the slowest statements
+    """
+    flask_app = Flask(__name__)
+    flask_app.config["SQL_INSTRUMENTATION"] = True
+    instance = app.create_app(
+        app=flask_app, db_connection_string=f"sqlite:///{tmp_path / 'airview.db'}"
+    )
+    with instance.app_context():
+        db.create_all()
+    test_client = instance.test_client()
+
+    with caplog.at_level(logging.INFO, logger="airview.api.sql"):
+        resp = test_client.get("/environments/")
+
+    assert resp.status_code == 200
+    assert resp.headers["Server-Timing"].startswith("db;dur=")
+    assert 'desc="1 queries"' in resp.headers["Server-Timing"]
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line["path"] == "/environments/"
+    assert line["status"] == 200
+    assert line["query_count"] == 1
+    assert len(line["slowest"]) == 1
+    assert "FROM environment" in line["slowest"][0]["statement"]
+    assert line["errors"] == []
+
+
+def test_instrumentation_disabled_by_default(tmp_path):
+    """
+    Given: An app without sql instrumentation configured
+    When: A request uses the database
+    Then: No Server-Timing header is returned
+    """
+    instance = app.create_app(db_connection_string=f"sqlite:///{tmp_path / 'airview.db'}")
+    with instance.app_context():
+        db.create_all()
+
+    resp = instance.test_client().get("/environments/")
+
+    assert resp.status_code == 200
+    assert "Server-Timing" not in resp.headers
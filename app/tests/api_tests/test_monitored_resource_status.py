@@ -1,3 +1,5 @@
+import json
+import threading
 from datetime import datetime, timedelta, timezone
 from pprint import pprint
 from tests.factories import *
@@ -5,9 +7,12 @@ from tests.common import client
 from airview_api.models import (
     MonitoredResource,
     MonitoredResourceState,
+    MonitoredResourceTransition,
     SystemStage,
     TechnicalControlAction,
 )
+from airview_api.services import monitored_resource_service
+import pytest
 
 
 def setup():
@@ -229,3 +234,427 @@ def test_create_unknown_resource(client):
 
     items = MonitoredResource.query.all()
     assert len(items) == 0
+
+
+def test_batch_persists_and_reports_each_item(client):
+    """
+    Given: existing resources, technical control and one existing monitored resource
+    When: When the batch api is called with new, changed, unchanged and invalid items
+    Then: 200 status, an outcome per item, last_modified only moved on for state changes
+    """
+    # Arrange
+    SystemFactory(id=2, stage=SystemStage.BUILD)
+    ApplicationFactory(
+        id=1, name="App Other", application_type=ApplicationType.APPLICATION_SERVICE
+    )
+    EnvironmentFactory(id=3)
+    ApplicationEnvironmentFactory(id=1, application_id=1, environment_id=3)
+    ServiceFactory(id=10, name="Service One", reference="ref_1", type="NETWORK")
+    ResourceTypeFactory(
+        id=10, name="res type one", reference="res-type-1", service_id=10
+    )
+    TechnicalControlFactory(id=1, reference="1", name="one", system_id=2)
+    TechnicalControlFactory(id=2, reference="2", name="two", system_id=2)
+    ResourceFactory(
+        id=11,
+        name="Res One",
+        reference="res_1",
+        resource_type_id=10,
+        application_environment_id=1,
+    )
+    ResourceFactory(
+        id=12,
+        name="Res Two",
+        reference="res_2",
+        resource_type_id=10,
+        application_environment_id=1,
+    )
+
+    time_now = datetime.utcnow() - timedelta(hours=1)
+    MonitoredResourceFactory(
+        id=301,
+        resource_id=11,
+        technical_control_id=1,
+        monitoring_state=MonitoredResourceState.FLAGGED,
+        last_modified=time_now,
+        last_seen=time_now,
+        additional_data="Old",
+    )
+    MonitoredResourceFactory(
+        id=302,
+        resource_id=11,
+        technical_control_id=2,
+        monitoring_state=MonitoredResourceState.FLAGGED,
+        last_modified=time_now,
+        last_seen=time_now,
+        additional_data="Old",
+    )
+
+    input_data = [
+        {"technicalControlId": 1, "resourceId": 11, "monitoringState": "FLAGGED"},
+        {"technicalControlId": 2, "resourceId": 11, "monitoringState": "MONITORING"},
+        {"technicalControlId": 1, "resourceId": 12, "monitoringState": "FLAGGED"},
+        {"technicalControlId": 9999, "resourceId": 12, "monitoringState": "FLAGGED"},
+        {"technicalControlId": 2, "resourceId": 12, "monitoringState": "NONSENSE"},
+    ]
+    # Act
+    resp = client.put("/monitored-resources/batch/", json=input_data)
+
+    # Assert
+    assert resp.status_code == 200
+    assert [r["outcome"] for r in resp.get_json()] == [
+        "UNMODIFIED",
+        "MODIFIED",
+        "CREATED",
+        "NOT_FOUND",
+        "INVALID_STATE",
+    ]
+
+    items = {
+        (i.technical_control_id, i.resource_id): i
+        for i in MonitoredResource.query.all()
+    }
+    assert len(items) == 3
+
+    unmodified = items[(1, 11)]
+    assert unmodified.monitoring_state == MonitoredResourceState.FLAGGED
+    assert unmodified.last_modified == time_now
+    assert unmodified.last_seen > time_now
+    assert unmodified.additional_data == ""
+
+    modified = items[(2, 11)]
+    assert modified.monitoring_state == MonitoredResourceState.MONITORING
+    assert modified.last_modified > time_now
+
+    assert items[(1, 12)].monitoring_state == MonitoredResourceState.FLAGGED
+
+
+def test_batch_last_item_wins_for_repeated_key(client):
+    """
+    Given: existing resource and technical control
+    When: When the batch api is called with the same key more than once
+    Then: 200 status, the last item is persisted and reported for every repeat
+    """
+    # Arrange
+    SystemFactory(id=2, stage=SystemStage.BUILD)
+    ApplicationFactory(
+        id=1, name="App Other", application_type=ApplicationType.APPLICATION_SERVICE
+    )
+    EnvironmentFactory(id=3)
+    ApplicationEnvironmentFactory(id=1, application_id=1, environment_id=3)
+    ServiceFactory(id=10, name="Service One", reference="ref_1", type="NETWORK")
+    ResourceTypeFactory(
+        id=10, name="res type one", reference="res-type-1", service_id=10
+    )
+    TechnicalControlFactory(id=1, reference="1", name="one", system_id=2)
+    ResourceFactory(
+        id=11,
+        name="Res One",
+        reference="res_1",
+        resource_type_id=10,
+        application_environment_id=1,
+    )
+
+    input_data = [
+        {"technicalControlId": 1, "resourceId": 11, "monitoringState": "FLAGGED"},
+        {"technicalControlId": 1, "resourceId": 11, "monitoringState": "MONITORING"},
+    ]
+    # Act
+    resp = client.put("/monitored-resources/batch/", json=input_data)
+
+    # Assert
+    assert resp.status_code == 200
+    assert [r["outcome"] for r in resp.get_json()] == ["CREATED", "CREATED"]
+
+    items = MonitoredResource.query.all()
+    assert len(items) == 1
+    assert items[0].monitoring_state == MonitoredResourceState.MONITORING
+
+
+def _seed_reconcile():
+    SystemFactory(id=2, stage=SystemStage.BUILD)
+    ApplicationFactory(
+        id=1, name="App Other", application_type=ApplicationType.APPLICATION_SERVICE
+    )
+    EnvironmentFactory(id=3)
+    ApplicationEnvironmentFactory(id=1, application_id=1, environment_id=3)
+    ServiceFactory(id=10, name="Service One", reference="ref_1", type="NETWORK")
+    ResourceTypeFactory(
+        id=10, name="res type one", reference="res-type-1", service_id=10
+    )
+    TechnicalControlFactory(id=1, reference="1", name="one", system_id=2, ttl=3600)
+    TechnicalControlFactory(id=2, reference="2", name="two", system_id=2)
+    for resource_id in range(11, 16):
+        ResourceFactory(
+            id=resource_id,
+            name=f"Res {resource_id}",
+            reference=f"res_{resource_id}",
+            resource_type_id=10,
+            application_environment_id=1,
+        )
+
+
+def test_reconcile_marks_expired_monitored_resources_unresponsive(client):
+    """
+    Given: Monitored resources of technical controls with and without a ttl
+    When: Resources are reconciled in batches smaller than the number which expired
+    Then: Only reported states last seen longer ago than the ttl of their technical control become unresponsive
+    """
+    # Arrange
+    now = datetime(2023, 1, 1, 12)
+    expired = now - timedelta(hours=2)
+    _seed_reconcile()
+    for id, technical_control_id, resource_id, state, last_seen in [
+        (1, 1, 11, MonitoredResourceState.FLAGGED, expired),
+        (2, 1, 12, MonitoredResourceState.MONITORING, expired),
+        (3, 1, 13, MonitoredResourceState.FLAGGED, expired),
+        (4, 1, 14, MonitoredResourceState.FLAGGED, now - timedelta(minutes=5)),
+        (5, 1, 15, MonitoredResourceState.DELETED, expired),
+        (6, 2, 11, MonitoredResourceState.FLAGGED, expired),
+    ]:
+        MonitoredResourceFactory(
+            id=id,
+            technical_control_id=technical_control_id,
+            resource_id=resource_id,
+            monitoring_state=state,
+            last_modified=expired,
+            last_seen=last_seen,
+        )
+    db.session.commit()
+
+    # Act
+    metrics = monitored_resource_service.mark_unresponsive(now=now, batch_size=2)
+
+    # Assert
+    assert metrics["technical_controls"] == 1
+    assert metrics["batches"] == 2
+    assert metrics["transitioned"] == 3
+    states = {m.id: m for m in MonitoredResource.query.all()}
+    for id in (1, 2, 3):
+        assert states[id].monitoring_state == MonitoredResourceState.UNRESPONSIVE
+        assert states[id].last_modified == now
+    assert states[4].monitoring_state == MonitoredResourceState.FLAGGED
+    assert states[5].monitoring_state == MonitoredResourceState.DELETED
+    assert states[6].monitoring_state == MonitoredResourceState.FLAGGED
+    assert states[6].last_modified == expired
+    transitions = MonitoredResourceTransition.query.order_by(
+        MonitoredResourceTransition.resource_id
+    ).all()
+    assert [(t.resource_id, t.old_state, t.new_state) for t in transitions] == [
+        (11, MonitoredResourceState.FLAGGED, MonitoredResourceState.UNRESPONSIVE),
+        (12, MonitoredResourceState.MONITORING, MonitoredResourceState.UNRESPONSIVE),
+        (13, MonitoredResourceState.FLAGGED, MonitoredResourceState.UNRESPONSIVE),
+    ]
+
+
+def test_reconcile_command_reports_metrics(client):
+    """
+    Given: A monitored resource which has not been seen within the ttl of its technical control
+    When: The reconcile command is run
+    Then: The resource is marked unresponsive and the metrics are printed
+    """
+    # Arrange
+    _seed_reconcile()
+    MonitoredResourceFactory(
+        id=1,
+        technical_control_id=1,
+        resource_id=11,
+        monitoring_state=MonitoredResourceState.FLAGGED,
+        last_modified=datetime.utcnow() - timedelta(days=1),
+        last_seen=datetime.utcnow() - timedelta(days=1),
+    )
+    db.session.commit()
+
+    # Act
+    result = client.application.test_cli_runner().invoke(
+        args=["reconcile-monitored-resources"]
+    )
+
+    # Assert
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output)["transitioned"] == 1
+    db.session.expire_all()
+    assert MonitoredResource.query.one().monitoring_state == (
+        MonitoredResourceState.UNRESPONSIVE
+    )
+
+
+def _put_states(client, *states):
+    for resource_id, state in states:
+        resp = client.put(
+            "/monitored-resources/batch/",
+            json=[
+                {
+                    "technicalControlId": 1,
+                    "resourceId": resource_id,
+                    "monitoringState": state,
+                }
+            ],
+        )
+        assert resp.status_code == 200
+
+
+def test_changes_lists_transitions_since_cursor(client):
+    """
+    Given: Monitored resources whose states have been persisted several times
+    When: The changes are requested since a transition, a page at a time
+    Then: Only transitions after it are returned, oldest first, unchanged states are not recorded
+    """
+    # Arrange
+    _seed_reconcile()
+    _put_states(
+        client,
+        (11, "FLAGGED"),
+        (11, "FLAGGED"),
+        (12, "MONITORING"),
+        (11, "MONITORING"),
+    )
+
+    # Act
+    everything = client.get("/monitored-resources/changes")
+    since = client.get(
+        f"/monitored-resources/changes?since={everything.json[0]['id']}&limit=1"
+    )
+    link = since.headers["Link"]
+    next_page = client.get("/monitored-resources/changes" + link[1 : link.index(">")])
+
+    # Assert
+    assert everything.status_code == 200
+    assert [
+        (c["resourceId"], c["oldState"], c["newState"]) for c in everything.json
+    ] == [
+        (11, None, "FLAGGED"),
+        (12, None, "MONITORING"),
+        (11, "FLAGGED", "MONITORING"),
+    ]
+    assert [c["id"] for c in since.json] == [everything.json[1]["id"]]
+    assert [c["id"] for c in next_page.json] == [everything.json[2]["id"]]
+    assert "Link" not in next_page.headers
+
+
+def test_changes_streamed_as_server_sent_events(client):
+    """
+    Given: Monitored resources whose states have changed
+    When: The changes are requested as an event stream resuming from a previous event
+    Then: Each later transition is sent as an event identified by its id
+    """
+    # Arrange
+    client.application.config["CHANGE_STREAM_SECONDS"] = 0
+    _seed_reconcile()
+    _put_states(client, (11, "FLAGGED"), (12, "FLAGGED"), (11, "MONITORING"))
+    first = MonitoredResourceTransition.query.order_by(
+        MonitoredResourceTransition.id
+    ).first()
+
+    # Act
+    resp = client.get(
+        "/monitored-resources/changes",
+        headers={"Accept": "text/event-stream", "Last-Event-ID": str(first.id)},
+    )
+
+    # Assert
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+    events = [
+        dict(line.split(": ", 1) for line in event.splitlines())
+        for event in resp.get_data(as_text=True).split("\n\n")
+        if event
+    ]
+    assert [int(e["id"]) for e in events] == [first.id + 1, first.id + 2]
+    assert [
+        (json.loads(e["data"])["resourceId"], json.loads(e["data"])["newState"])
+        for e in events
+    ] == [(12, "FLAGGED"), (11, "MONITORING")]
+
+
+def test_changes_not_acceptable_as_events_where_streaming_is_off(client):
+    """
+    Given: An api whose responses are buffered rather than streamed, as behind the lambda adapter
+    When: The changes are requested as an event stream
+    Then: A 406 is returned
+    """
+    # Arrange
+    client.application.config["CHANGE_STREAMING"] = False
+
+    # Act
+    resp = client.get(
+        "/monitored-resources/changes", headers={"Accept": "text/event-stream"}
+    )
+
+    # Assert
+    assert resp.status_code == 406
+
+
+def test_prune_changes_removes_transitions_beyond_retention(client):
+    """
+    Given: Transitions recorded both before and within the retention of the change feed
+    When: The prune command is run
+    Then: Only the transitions recorded before the retention are removed
+    """
+    # Arrange
+    _seed_reconcile()
+    _put_states(client, (11, "FLAGGED"), (12, "FLAGGED"), (11, "MONITORING"))
+    old, *_ = MonitoredResourceTransition.query.order_by(
+        MonitoredResourceTransition.id
+    ).all()
+    old.transitioned_at = (
+        datetime.utcnow()
+        - monitored_resource_service.CHANGE_RETENTION
+        - timedelta(minutes=1)
+    )
+    db.session.commit()
+
+    # Act
+    result = client.application.test_cli_runner().invoke(
+        args=["prune-monitored-resource-changes", "--batch-size", "1"]
+    )
+
+    # Assert
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output) == {"batches": 1, "removed": 1}
+    assert [
+        t.resource_id
+        for t in MonitoredResourceTransition.query.order_by(
+            MonitoredResourceTransition.id
+        )
+    ] == [12, 11]
+
+
+def test_overlapping_writers_record_transitions_in_commit_order(client):
+    """
+    Given: A writer which has recorded a transition but not yet committed
+    When: A second writer records a transition of its own
+    Then: The second waits for the first to commit, so no follower can read its transition before the first's
+    """
+    if db.engine.dialect.name != "postgresql":
+        pytest.skip("sqlite does not allow concurrent writers")
+
+    # Arrange
+    app = client.application
+    _seed_reconcile()
+    db.session.commit()
+    now = datetime.utcnow()
+    monitored_resource_service._record_transitions(
+        [(1, 11, None, MonitoredResourceState.FLAGGED)], now
+    )
+    seen = []
+
+    def second_writer():
+        with app.app_context():
+            monitored_resource_service._record_transitions(
+                [(1, 12, None, MonitoredResourceState.FLAGGED)], now
+            )
+            db.session.commit()
+            seen.extend(monitored_resource_service.get_changes())
+
+    # Act
+    second = threading.Thread(target=second_writer)
+    second.start()
+    second.join(1)
+    waited = second.is_alive()
+    db.session.commit()
+    second.join(10)
+
+    # Assert
+    assert waited
+    assert [c.resource_id for c in seen] == [11, 12]
@@ -0,0 +1,69 @@
+import json
+import os
+from airview_api import app
+from airview_api.database import db
+from tests.common import client
+
+OPENAPI_SPEC_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "..", "docs", "openapi.json"
+)
+
+
+def _parameters(parameters):
+    # Path parameters are documented in the order flask holds them, which varies between processes
+    return sorted(
+        (p.get("$ref", ""), p.get("name", ""), p.get("in", ""), p.get("required", False))
+        for p in parameters
+    )
+
+
+def _outline(spec):
+    # Only the routes are compared. Schema details such as additionalProperties vary with the apispec and
+    # marshmallow versions installed, which would fail the comparison without the api having changed
+    return {
+        path: {
+            method: (
+                _parameters(item.get("parameters", []) + operation.get("parameters", [])),
+                sorted(operation.get("requestBody", {}).get("content", {})),
+                sorted(operation.get("responses", {})),
+            )
+            for method, operation in item.items()
+            if method != "parameters"
+        }
+        for path, item in spec["paths"].items()
+    }
+
+
+def test_prebuilt_openapi_spec_is_up_to_date(client):
+    """
+    Given: The pre-built openapi spec in docs
+    When: The spec is generated from the api
+    Then: The pre-built spec has the same paths, operations and parameters, so serving it in place of the generated spec is safe
+    """
+    resp = client.get("/openapi.json")
+
+    with open(OPENAPI_SPEC_PATH) as f:
+        assert _outline(json.load(f)) == _outline(resp.get_json())
+
+
+def test_prebuilt_openapi_spec_served_when_configured(tmp_path):
+    """
+    Given: An app created with a pre-built openapi spec
+    When: The spec and an api route are requested
+    Then: The pre-built spec is returned and the api routes are registered
+    """
+    spec_path = tmp_path / "openapi.json"
+    spec_path.write_text('{"openapi": "prebuilt"}')
+    app.DB_URI = "sqlite://"
+    instance = app.create_app(openapi_spec_path=str(spec_path))
+    with instance.app_context():
+        db.create_all()
+        test_client = instance.test_client()
+
+        spec = test_client.get("/openapi.json")
+        environments = test_client.get("/environments/")
+
+    assert spec.status_code == 200
+    assert spec.get_json() == {"openapi": "prebuilt"}
+    assert environments.status_code == 200
+    assert environments.get_json() == []
@@ -0,0 +1,186 @@
+import json
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from airview_api.database import db
+from airview_api.models import (
+    ControlSeverity,
+    MonitoredResourceState,
+    QualityModel,
+    SystemStage,
+    TechnicalControl,
+)
+from airview_api.services import aggregation_service, monitored_resource_service
+from tests.common import client
+from tests.factories import *
+
+# Tables which grow with the estate. A scan of these without an index condition is a regression
+HOT_TABLES = {"monitored_resource", "resource", "application_environment"}
+
+
+def setup():
+    reset_factories()
+
+
+@pytest.fixture
+def postgres(client):
+    if db.engine.dialect.name != "postgresql":
+        pytest.skip("Query plans are only asserted against postgres")
+    return client
+
+
+def _seed():
+    SystemFactory(id=1, name="System One", stage=SystemStage.BUILD)
+    ServiceFactory(id=10, name="Service One", reference="ref_1", type="NETWORK")
+    ResourceTypeFactory(id=10, name="res type", reference="res-type-1", service_id=10)
+    ControlFactory(
+        id=21,
+        name="Ctrl 1",
+        quality_model=QualityModel.SECURITY,
+        severity=ControlSeverity.HIGH,
+    )
+    db.session.flush()
+    ResourceTypeControlFactory(id=1, resource_type_id=10, control_id=21)
+    TechnicalControlFactory(
+        id=1, name="TC", reference="tc-1", system_id=1, control_id=21
+    )
+    for app_id in range(1, 11):
+        ApplicationFactory(id=app_id)
+        EnvironmentFactory(id=app_id)
+        ApplicationEnvironmentFactory(
+            id=app_id, application_id=app_id, environment_id=app_id
+        )
+        for n in range(20):
+            resource_id = app_id * 100 + n
+            ResourceFactory(
+                id=resource_id,
+                name=f"Res {resource_id}",
+                reference=f"res-{resource_id}",
+                resource_type_id=10,
+                application_environment_id=app_id,
+            )
+            MonitoredResourceFactory(
+                id=resource_id,
+                resource_id=resource_id,
+                technical_control_id=1,
+                monitoring_state=MonitoredResourceState.FLAGGED,
+                last_modified=datetime.utcnow(),
+                last_seen=datetime.utcnow(),
+            )
+    db.session.commit()
+    db.session.execute(db.text("ANALYZE"))
+
+
+@contextmanager
+def _captured_selects(prefixes=("SELECT",)):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(prefixes):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+
+
+def _leading_columns(connection):
+    rows = connection.exec_driver_sql(
+        "SELECT c.relname, pg_get_indexdef(i.indexrelid, 1, true) "
+        "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid"
+    )
+    return dict(rows.all())
+
+
+def _unindexed_scans(node, leading_columns):
+    # A condition on a trailing column of a composite index still walks the whole index
+    scans = []
+    if node.get("Relation Name") in HOT_TABLES:
+        if node["Node Type"] == "Seq Scan" or (
+            node["Node Type"] in ("Index Scan", "Index Only Scan")
+            and f"({leading_columns[node['Index Name']]} ="
+            not in node.get("Index Cond", "")
+        ):
+            scans.append(node["Relation Name"])
+    for child in node.get("Plans", []):
+        scans.extend(_unindexed_scans(child, leading_columns))
+    return scans
+
+
+def _assert_indexed(statements):
+    assert statements
+    connection = db.session.connection()
+    # With the cheaper alternatives disabled the planner only falls back to a full scan when no usable index exists
+    connection.exec_driver_sql("SET enable_seqscan = off")
+    connection.exec_driver_sql("SET enable_hashjoin = off")
+    connection.exec_driver_sql("SET enable_mergejoin = off")
+    leading_columns = _leading_columns(connection)
+    for statement, parameters in statements:
+        result = connection.exec_driver_sql(
+            "EXPLAIN (FORMAT JSON) " + statement, parameters
+        ).scalar()
+        plan = result if isinstance(result, list) else json.loads(result)
+        assert _unindexed_scans(plan[0]["Plan"], leading_columns) == [], statement
+
+
+@pytest.mark.parametrize(
+    "hot_query",
+    [
+        lambda: list(aggregation_service.get_compliance_aggregation(2)),
+        lambda: aggregation_service.get_control_overview_resources(2, 1),
+        lambda: aggregation_service.get_control_overviews(2, None),
+        lambda: aggregation_service.get_control_overview_totals(2),
+        lambda: aggregation_service.get_application_quality_models(2),
+    ],
+)
+def test_aggregation_queries_use_indexes(postgres, hot_query):
+    """
+    Given: An estate with several applications
+    When: An application scoped aggregation is executed
+    Then: No growing table is read without an index condition
+    """
+    _seed()
+    with _captured_selects() as statements:
+        hot_query()
+
+    _assert_indexed(statements)
+
+
+def test_persist_lookups_use_indexes(postgres):
+    """
+    Given: An estate with several applications
+    When: Monitored resource states are persisted
+    Then: No growing table is read without an index condition
+    """
+    _seed()
+    items = [
+        {
+            "technical_control_id": 1,
+            "resource_id": 201,
+            "monitoring_state": "MONITORING",
+        }
+    ]
+    with _captured_selects() as statements:
+        monitored_resource_service.persist_many(items)
+
+    _assert_indexed(statements)
+
+
+def test_reconcile_uses_indexes(postgres):
+    """
+    Given: An estate whose monitored resources have not been seen within the ttl of their technical control
+    When: Monitored resources are reconciled
+    Then: Expired rows are found without reading a growing table without an index condition
+    """
+    _seed()
+    db.session.get(TechnicalControl, 1).ttl = 60
+    db.session.commit()
+    with _captured_selects(("SELECT", "UPDATE")) as statements:
+        monitored_resource_service.mark_unresponsive(
+            now=datetime.utcnow() + timedelta(hours=1)
+        )
+
+    _assert_indexed([s for s in statements if s[0].lstrip().startswith("UPDATE")])
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 from airview_api.models import Resource, ApplicationType
+from airview_api.services import resource_service
 from tests.common import client
 from tests.factories import *
 import pytest
@@ -361,3 +362,219 @@ def test_resources_put_throws_bad_request_when_params_do_not_match(client, test_
         resp.get_json()["message"]
         == "Keys in data do not match the keys in the query parameters"
     )
+
+
+def test_resources_batch_put_upserts_and_reports_outcomes(client):
+    """
+    Given: Existing resources in an application environment
+    When: A batch of new, changed and unchanged resources is put
+    Then: The resources are upserted, last_modified only moves on for changes and each outcome is returned
+    """
+    # Arrange
+    old = datetime(2020, 1, 1)
+    ResourceFactory(
+        name="Unchanged",
+        reference="res-1",
+        resource_type_id=20,
+        application_environment_id=1,
+        last_modified=old,
+        last_seen=old,
+    )
+    ResourceFactory(
+        name="Before",
+        reference="res-2",
+        resource_type_id=20,
+        application_environment_id=1,
+        last_modified=old,
+        last_seen=old,
+    )
+    ResourceFactory(
+        name="Other App",
+        reference="res-3",
+        resource_type_id=20,
+        application_environment_id=2,
+        last_modified=old,
+        last_seen=old,
+    )
+    db.session.commit()
+
+    # Act
+    resp = client.put(
+        "/resources/batch/",
+        json={
+            "applicationEnvironmentId": 1,
+            "resources": [
+                {"name": "Unchanged", "reference": "res-1", "resourceTypeId": 20},
+                {"name": "After", "reference": "res-2", "resourceTypeId": 21},
+                {"name": "New", "reference": "res-3", "resourceTypeId": 20},
+            ],
+        },
+    )
+
+    # Assert
+    items = {
+        (r.application_environment_id, r.reference): r
+        for r in db.session.query(Resource).all()
+    }
+    created = items[(1, "res-3")]
+    assert resp.status_code == 200
+    assert resp.get_json() == [
+        {"id": 1, "reference": "res-1", "outcome": "UNMODIFIED"},
+        {"id": 2, "reference": "res-2", "outcome": "MODIFIED"},
+        {"id": created.id, "reference": "res-3", "outcome": "CREATED"},
+    ]
+    assert items[(1, "res-1")].last_modified == old
+    assert items[(1, "res-1")].last_seen > old
+    assert items[(1, "res-2")].name == "After"
+    assert items[(1, "res-2")].resource_type_id == 21
+    assert items[(1, "res-2")].last_modified > old
+    assert items[(2, "res-3")].last_seen == old
+    assert created.last_modified == created.last_seen
+
+
+def test_resources_batch_put_reports_stale_resources(client):
+    """
+    Given: Resources which were last seen before a sync started
+    When: A batch is put with the time the sync started
+    Then: The resources of the application environment missing from the sync follow as stale
+    """
+    # Arrange
+    old = datetime(2020, 1, 1)
+    for reference, application_environment_id in [
+        ("seen", 1),
+        ("missing", 1),
+        ("other-app", 2),
+    ]:
+        ResourceFactory(
+            name=reference,
+            reference=reference,
+            resource_type_id=20,
+            application_environment_id=application_environment_id,
+            last_modified=old,
+            last_seen=old,
+        )
+    db.session.commit()
+
+    # Act
+    resp = client.put(
+        "/resources/batch/",
+        json={
+            "applicationEnvironmentId": 1,
+            "staleBefore": (datetime.utcnow() - timedelta(minutes=5)).isoformat(),
+            "resources": [
+                {"name": "seen", "reference": "seen", "resourceTypeId": 20},
+            ],
+        },
+    )
+
+    # Assert
+    assert resp.status_code == 200
+    assert resp.get_json() == [
+        {"id": 1, "reference": "seen", "outcome": "UNMODIFIED"},
+        {"id": 2, "reference": "missing", "outcome": "STALE"},
+    ]
+
+
+def _stale_resources():
+    old = datetime(2020, 1, 1)
+    for i in range(3):
+        ResourceFactory(
+            name=f"missing-{i}",
+            reference=f"missing-{i}",
+            resource_type_id=20,
+            application_environment_id=1,
+            last_modified=old,
+            last_seen=old,
+        )
+    ResourceFactory(
+        name="other-app",
+        reference="other-app",
+        resource_type_id=20,
+        application_environment_id=2,
+        last_modified=old,
+        last_seen=old,
+    )
+    db.session.commit()
+
+
+def test_resources_batch_put_caps_stale_resources(client, monkeypatch):
+    """
+    Given: More stale resources than a batch reports
+    When: A batch is put with the time the sync started
+    Then: Only the first stale resources by id follow the outcomes
+    """
+    # Arrange
+    _stale_resources()
+    monkeypatch.setattr(resource_service, "MAX_STALE_RESULTS", 2)
+
+    # Act
+    resp = client.put(
+        "/resources/batch/",
+        json={
+            "applicationEnvironmentId": 1,
+            "staleBefore": (datetime.utcnow() - timedelta(minutes=5)).isoformat(),
+            "resources": [],
+        },
+    )
+
+    # Assert
+    assert resp.status_code == 200
+    assert resp.get_json() == [
+        {"id": 1, "reference": "missing-0", "outcome": "STALE"},
+        {"id": 2, "reference": "missing-1", "outcome": "STALE"},
+    ]
+
+
+def test_resources_get_stale_pages_every_stale_resource(client):
+    """
+    Given: Stale resources in two application environments
+    When: The stale resources of one are read a page at a time
+    Then: Every stale resource of that application environment is returned once, in id order
+    """
+    # Arrange
+    _stale_resources()
+    before = (datetime.utcnow() - timedelta(minutes=5)).isoformat()
+    url = "/resources/stale/"
+
+    # Act
+    first = client.get(
+        url,
+        query_string={
+            "applicationEnvironmentId": 1,
+            "lastSeenBefore": before,
+            "limit": 2,
+        },
+    )
+    link = first.headers["Link"]
+    second = client.get(url + link[1 : link.index(">")])
+
+    # Assert
+    assert first.status_code == 200
+    assert [r["reference"] for r in first.get_json()] == ["missing-0", "missing-1"]
+    assert [r["reference"] for r in second.get_json()] == ["missing-2"]
+    assert "Link" not in second.headers
+
+
+@pytest.mark.parametrize(
+    "body,status",
+    [
+        ({"applicationEnvironmentId": 99, "resources": []}, 404),
+        (
+            {
+                "applicationEnvironmentId": 1,
+                "resources": [{"name": "a", "reference": "a", "resourceTypeId": 99}],
+            },
+            400,
+        ),
+    ],
+)
+def test_resources_batch_put_rejects_unknown_references(client, body, status):
+    """
+    Given: A batch referring to an application environment or resource type which does not exist
+    When: The batch is put
+    Then: The request is rejected and nothing is persisted
+    """
+    resp = client.put("/resources/batch/", json=body)
+
+    assert resp.status_code == status
+    assert db.session.query(Resource).count() == 0
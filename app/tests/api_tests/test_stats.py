@@ -0,0 +1,101 @@
+import pytest
+from sqlalchemy import create_engine, exc
+from airview_api import app, database
+from airview_api.database import db, InstrumentedNullPool, InstrumentedQueuePool
+from tests.factories import *
+
+
+def test_pool_stats_count_checkouts(tmp_path):
+    """
+    Given: An app pooling its connections with an instrumented pool
+    When: A request uses the database and the pool statistics are requested
+    Then: The checkout and the current state of the pool are returned
+    """
+    instance = app.create_app(
+        db_connection_string=f"sqlite:///{tmp_path / 'airview.db'}",
+        engine_options={
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": 1,
+            "max_overflow": 0,
+        },
+    )
+    with instance.app_context():
+        db.create_all()
+    test_client = instance.test_client()
+
+    assert test_client.get("/environments/").status_code == 200
+    resp = test_client.get("/stats/pool/")
+
+    data = resp.get_json()
+    assert resp.status_code == 200
+    assert data["poolClass"] == "InstrumentedQueuePool"
+    assert data["size"] == 1
+    assert data["checkedOut"] == 0
+    assert data["checkouts"] >= 1
+    assert data["timeouts"] == 0
+    assert data["waitSecondsMax"] >= 0
+
+
+def test_pool_stats_count_timeouts(tmp_path):
+    """
+    Given: A pool whose only connection is checked out
+    When: Another connection is requested
+    Then: The request times out and the timeout is counted
+    """
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'airview.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.01,
+    )
+    held = engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    held.close()
+
+    assert engine.pool.stats["checkouts"] == 1
+    assert engine.pool.stats["timeouts"] == 1
+
+
+@pytest.mark.parametrize(
+    "options, expected",
+    [
+        (
+            {},
+            {
+                "poolclass": InstrumentedQueuePool,
+                "pool_size": database.DEFAULT_POOL_SIZE,
+                "max_overflow": database.DEFAULT_MAX_OVERFLOW,
+            },
+        ),
+        (
+            {"serverless": True},
+            {"poolclass": InstrumentedQueuePool, "pool_size": 1, "max_overflow": 0},
+        ),
+        ({"serverless": True, "pool_size": 0}, {"poolclass": InstrumentedNullPool}),
+        (
+            {"statement_timeout": 5000},
+            {"connect_args": {"options": "-c statement_timeout=5000"}},
+        ),
+    ],
+)
+def test_engine_options_for_postgres(options, expected):
+    """
+    Given: A postgres connection string and a deployment
+    When: Engine options are requested
+    Then: Connections are pre-pinged and pooled to suit the deployment
+    """
+    result = database.engine_options("postgresql://user@host/db", **options)
+
+    assert result["pool_pre_ping"] is True
+    assert expected.items() <= result.items()
+
+
+def test_engine_options_keep_sqlite_defaults():
+    """
+    Given: A sqlite connection string
+    When: Engine options are requested
+    Then: No options are set, leaving the driver defaults
+    """
+    assert database.engine_options("sqlite://", serverless=True) == {}
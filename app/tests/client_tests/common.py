@@ -1,5 +1,6 @@
 from tests.common import client
 from tests.factories import *
+import httpx
 import requests_mock
 from requests_flask_adapter import Session
 import pytest
@@ -38,5 +39,38 @@ def handler(session):
     return handler
 
 
+class FlaskAsyncTransport(httpx.AsyncBaseTransport):
+    # Async counterpart of requests_flask_adapter, requests are served in process by the flask app
+    def __init__(self, app):
+        self._transport = httpx.WSGITransport(app=app)
+
+    async def handle_async_request(self, request):
+        await request.aread()
+        # The wsgi environ needs a scheme with a known default port
+        request.url = request.url.copy_with(scheme="http")
+        response = self._transport.handle_request(request)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            content=response.read(),
+        )
+
+
+@pytest.fixture
+def async_transport(instance):
+    return FlaskAsyncTransport(instance)
+
+
+@pytest.fixture
+def backend_config():
+    return BackendConfig(
+        base_url=base_url,
+        token="dummy_token",
+        system_name="one",
+        system_stage=SystemStage.BUILD,
+        referencing_type="aws_account_id",
+    )
+
+
 def setup_factories():
     reset_factories()
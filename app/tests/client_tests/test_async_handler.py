@@ -0,0 +1,242 @@
+import asyncio
+from tests.client_tests.common import *
+from airview_api import models as api_models
+from tests.common import instance
+from tests.factories import *
+import httpx
+import pytest
+
+from client.airviewclient import models
+from client.airviewclient.async_client import _get_async_handler
+
+
+def setup():
+    setup_factories()
+
+
+def _events():
+    technical_control = models.TechnicalControl(
+        name="ctrl a",
+        reference="tc-ref-1",
+        control_action=models.TechnicalControlAction.LOG,
+    )
+    applications = [
+        models.Application(name="app one", reference="app-ref-1"),
+        models.Application(name="app two", reference="app-ref-2"),
+    ]
+    for application in applications:
+        for n in range(3):
+            yield models.ComplianceEvent(
+                application=application,
+                technical_control=technical_control,
+                resource_reference=f"res-ref-{n}",
+                status=models.MonitoredResourceState.FLAGGED,
+            )
+
+
+def _arrange():
+    EnvironmentFactory(id=1, name="Env One", abbreviation="ONE")
+    SystemFactory(id=111, stage=api_models.SystemStage.BUILD, name="one")
+    TechnicalControlFactory(
+        id=999,
+        reference="tc-ref-1",
+        name="one",
+        system_id=111,
+        control_action=TechnicalControlAction.LOG,
+        is_blocking=True,
+    )
+
+
+def test_async_handle_compliance_event(async_transport, backend_config):
+    """
+    Given: A compliance event with a non-existing application and resource
+    When: The event is handled by the async handler
+    Then: The monitored resource is persisted against a new application and resource
+    """
+    # Arrange
+    _arrange()
+    event = next(_events())
+
+    # Act
+    async def act():
+        client = httpx.AsyncClient(transport=async_transport)
+        handler = _get_async_handler(client=client, backend_config=backend_config)
+        await handler.handle_compliance_event(event)
+        await handler.aclose()
+
+    asyncio.run(act())
+
+    # Assert
+    monitored = MonitoredResource.query.all()
+    assert len(monitored) == 1
+    assert monitored[0].monitoring_state.name == "FLAGGED"
+    assert monitored[0].technical_control_id == 999
+    assert monitored[0].resource.reference == "res-ref-0"
+
+
+def test_async_handle_compliance_events_creates_definitions_once(
+    async_transport, backend_config
+):
+    """
+    Given: A stream of compliance events sharing new applications
+    When: The events are handled concurrently
+    Then: Each missing definition is created once and every state is persisted
+    """
+    # Arrange
+    _arrange()
+    requests = []
+
+    async def record(request):
+        requests.append((request.method, request.url.path))
+
+    # Act
+    async def act():
+        client = httpx.AsyncClient(
+            transport=async_transport, event_hooks={"request": [record]}
+        )
+        handler = _get_async_handler(
+            client=client, backend_config=backend_config, max_concurrency=4
+        )
+        await handler.handle_compliance_events(_events(), chunk_size=4)
+        await handler.aclose()
+
+    asyncio.run(act())
+
+    # Assert
+    monitored = MonitoredResource.query.all()
+    assert len(monitored) == 6
+    assert {m.technical_control_id for m in monitored} == {999}
+    assert requests.count(("POST", "/applications/")) == 2
+    assert requests.count(("POST", "/environments/")) == 1
+    assert requests.count(("POST", "/resources/")) == 6
+    assert requests.count(("PUT", "/monitored-resources/batch/")) == 2
+
+
+def test_async_handle_unexpected_code_for_get_environments(backend_config):
+    """
+    Given: A failure response when listing environments
+    When: A compliance event is handled by the async handler
+    Then: An exception is raised
+    """
+    # Arrange
+    transport = httpx.MockTransport(lambda request: httpx.Response(500))
+    event = next(_events())
+
+    # Act
+    async def act():
+        client = httpx.AsyncClient(transport=transport)
+        handler = _get_async_handler(client=client, backend_config=backend_config)
+        await handler.handle_compliance_event(event)
+
+    with pytest.raises(models.BackendFailureException) as excinfo:
+        asyncio.run(act())
+
+
+def test_async_handle_framework_control_objective_links_create_definitions_once(
+    async_transport, backend_config
+):
+    """
+    Given: A control objective of a new framework linked to two new controls
+    When: Both links are handled concurrently by the async handler
+    Then: The framework, section and control objective are created once and both links are created
+    """
+    # Arrange
+    requests = []
+
+    async def record(request):
+        requests.append((request.method, request.url.path))
+
+    framework_section = models.FrameworkSection(
+        name="TestFrameworkSection",
+        link="/testframework/testsection",
+        framework=models.Framework(name="TestFramework", link="/testframework"),
+    )
+    objectives = [
+        models.FrameworkControlObjective(
+            name="AC-12",
+            link="/testframework/testsection/ac-12",
+            framework_section=framework_section,
+        )
+        for _ in range(2)
+    ]
+    controls = [
+        models.Control(
+            name=f"control {n}",
+            quality_model=models.QualityModel.SECURITY,
+            severity=models.ControlSeverity.LOW,
+        )
+        for n in range(2)
+    ]
+
+    # Act
+    async def act():
+        client = httpx.AsyncClient(
+            transport=async_transport, event_hooks={"request": [record]}
+        )
+        handler = _get_async_handler(client=client, backend_config=backend_config)
+        links = await asyncio.gather(
+            *(
+                handler.handle_framework_control_objective_link(objective, control)
+                for objective, control in zip(objectives, controls)
+            )
+        )
+        await handler.aclose()
+        return links
+
+    links = asyncio.run(act())
+
+    # Assert
+    objective = api_models.FrameworkControlObjective.query.one()
+    assert {l.framework_control_objective_id for l in links} == {objective.id}
+    assert {l.control_id for l in links} == {c.id for c in api_models.Control.query}
+    assert api_models.FrameworkControlObjectiveLink.query.count() == 2
+    assert requests.count(("POST", "/frameworks/")) == 1
+    assert (
+        requests.count(
+            (
+                "POST",
+                f"/frameworks/{objective.framework_section.framework_id}/sections/",
+            )
+        )
+        == 1
+    )
+
+
+def test_async_handle_resource_type_control_link_for_existing_definitions(
+    async_transport, backend_config
+):
+    """
+    Given: An existing control and resource type which are not linked
+    When: The link is handled by the async handler
+    Then: The link is created between them
+    """
+    # Arrange
+    ServiceFactory(id=10, name="Service One", reference="ref_1", type="NETWORK")
+    ResourceTypeFactory(
+        id=20, name="res type one", reference="res-type-1", service_id=10
+    )
+    ControlFactory(
+        id=99,
+        name="testcontrol",
+        quality_model=api_models.QualityModel.SECURITY,
+        severity=api_models.ControlSeverity.LOW,
+    )
+
+    # Act
+    async def act():
+        client = httpx.AsyncClient(transport=async_transport)
+        handler = _get_async_handler(client=client, backend_config=backend_config)
+        link = await handler.handle_resource_type_control_link(
+            models.Control(name="testcontrol"),
+            models.ResourceType(reference="res-type-1", name="res type one"),
+        )
+        await handler.aclose()
+        return link
+
+    link = asyncio.run(act())
+
+    # Assert
+    assert link.control_id == 99
+    assert link.resource_type_id == 20
+    data = api_models.ResourceTypeControl.query.all()
+    assert [(d.control_id, d.resource_type_id) for d in data] == [(99, 20)]
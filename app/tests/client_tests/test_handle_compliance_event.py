@@ -195,6 +195,50 @@ def test_monitored_resource_creates_missing_control(handler, compliance_event):
     assert monitored[0].resource.application_environment_id == 1
 
 
+def test_repeated_events_reuse_cached_reference_data(
+    handler, session, compliance_event
+):
+    """
+    Given: Compliance events for an application, technical control and resource which have been seen before
+    When: When further events are handled
+    Then: Only the monitored resource status is sent to the backend
+    """
+    # Arrange
+    EnvironmentFactory(id=1, name="Env One", abbreviation="ONE")
+    ApplicationFactory(id=2)
+    ApplicationEnvironmentFactory(id=1, application_id=2, environment_id=1)
+    ApplicationEnvironmentReferenceFactory(
+        application_environment_id=1, type="aws_account_id", reference="app-ref-1"
+    )
+    SystemFactory(id=111, stage=api_models.SystemStage.BUILD, name="one")
+    TechnicalControlFactory(
+        id=999,
+        reference="tc-ref-1",
+        name="one",
+        system_id=111,
+        control_action=TechnicalControlAction.LOG,
+        is_blocking=True,
+    )
+    # Definitions created by the first event are looked up once more after being invalidated
+    handler.handle_compliance_event(compliance_event)
+    handler.handle_compliance_event(compliance_event)
+    requests = []
+    session.hooks["response"].append(
+        lambda resp, *args, **kwargs: requests.append(resp.request.method)
+    )
+
+    # Act
+    compliance_event.status = models.MonitoredResourceState.MONITORING
+    handler.handle_compliance_event(compliance_event)
+    handler.handle_compliance_event(compliance_event)
+
+    # Assert
+    assert requests == ["PUT", "PUT"]
+    monitored = MonitoredResource.query.all()
+    assert len(monitored) == 1
+    assert monitored[0].monitoring_state.name == "MONITORING"
+
+
 def test_account_cache_handle_unexpected_code_for_get_control(
     handler, compliance_event, adapter
 ):
@@ -543,3 +587,123 @@ def test_triggered_resource_handle_unexpected_code_for_monitored_resource(
     # Act
     with pytest.raises(models.BackendFailureException) as excinfo:
         handler.handle_compliance_event(compliance_event)
+
+
+def test_handle_compliance_events_resolves_definitions_once(handler, session):
+    """
+    Given: A stream of compliance events spanning new applications and resources
+    When: The events are handled as a batch
+    Then: Missing definitions are created once and monitoring states are sent in chunks
+    """
+    # Arrange
+    EnvironmentFactory(id=1, name="Env One", abbreviation="ONE")
+    SystemFactory(id=111, stage=api_models.SystemStage.BUILD, name="one")
+    TechnicalControlFactory(
+        id=999,
+        reference="tc-ref-1",
+        name="one",
+        system_id=111,
+        control_action=TechnicalControlAction.LOG,
+        is_blocking=True,
+    )
+    technical_control = models.TechnicalControl(
+        name="ctrl a",
+        reference="tc-ref-1",
+        control_action=models.TechnicalControlAction.LOG,
+    )
+    applications = [
+        models.Application(name="app one", reference="app-ref-1"),
+        models.Application(name="app two", reference="app-ref-2"),
+    ]
+
+    def events():
+        for application in applications:
+            for n in range(3):
+                yield models.ComplianceEvent(
+                    application=application,
+                    technical_control=technical_control,
+                    resource_reference=f"res-ref-{n}",
+                    status=models.MonitoredResourceState.FLAGGED,
+                    additional_data=f"data {n}",
+                )
+
+    requests = []
+    session.hooks["response"].append(
+        lambda resp, *args, **kwargs: requests.append(
+            (resp.request.method, resp.request.path_url)
+        )
+    )
+
+    # Act
+    handler.handle_compliance_events(events(), chunk_size=4)
+
+    # Assert
+    monitored = MonitoredResource.query.order_by(MonitoredResource.id).all()
+    assert len(monitored) == 6
+    assert {m.monitoring_state.name for m in monitored} == {"FLAGGED"}
+    assert {m.technical_control_id for m in monitored} == {999}
+    assert len({m.resource_id for m in monitored}) == 6
+    assert monitored[0].additional_data == "data 0"
+
+    assert requests.count(("POST", "/applications/")) == 2
+    assert requests.count(("POST", "/resources/")) == 6
+    assert requests.count(("PUT", "/monitored-resources/batch/")) == 2
+
+
+def test_handle_compliance_events_handle_unexpected_code_for_batch(
+    handler, adapter, compliance_event
+):
+    """
+    Given: A failure response from the batch monitored resources endpoint
+    When: When a batch of compliance events is handled
+    Then: An exception is raised
+    """
+    # Arrange
+    adapter.register_uri(
+        "GET",
+        f"{base_url}/environments/",
+        status_code=200,
+        json=[{"id": 1, "name": "Unknown", "abbreviation": "UNK"}],
+    )
+    adapter.register_uri(
+        "GET",
+        f"{base_url}/systems/?name=one",
+        status_code=200,
+        json={"id": 111},
+    )
+    adapter.register_uri(
+        "GET",
+        f"{base_url}/referenced-application-environments/?type=aws_account_id&reference=app-ref-1",
+        status_code=200,
+        json={"id": 111, "application": {"id": 111, "name": "app-name"}},
+    )
+    adapter.register_uri(
+        "GET",
+        f"{base_url}/technical-controls/?systemId=111&reference=tc-ref-1",
+        status_code=200,
+        json=[
+            {
+                "id": 222,
+                "name": "tc1",
+                "reference": "tc-ref-1",
+                "controlAction": "LOG",
+                "isBlocking": True,
+            }
+        ],
+    )
+    adapter.register_uri(
+        "GET",
+        f"{base_url}/resources/?applicationEnvironmentId=111&reference=res-ref-1",
+        status_code=200,
+        json={"id": 444},
+    )
+    adapter.register_uri(
+        "PUT",
+        f"{base_url}/monitored-resources/batch/",
+        status_code=200,
+        json=[{"technicalControlId": 222, "resourceId": 444, "outcome": "NOT_FOUND"}],
+    )
+
+    # Act
+    with pytest.raises(models.BackendFailureException) as excinfo:
+        handler.handle_compliance_events([compliance_event])
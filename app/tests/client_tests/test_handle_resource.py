@@ -245,3 +245,26 @@ def test_monitored_resource_updates_existing(handler, mapped_resource):
     assert resources[0].reference == mapped_resource.reference
     assert resources[0].application_environment_id == 1
     assert resources[0].resource_type_id == 11
+
+
+def test_handle_resource_type_finds_service_on_later_page(
+    handler, mapped_resource, monkeypatch
+):
+    """
+    Given: More services exist than fit in a single page, the matching one on the last page
+    When: When a call is made to handle the resource type
+    Then: The next page links are followed and the existing service is used
+    """
+    # Arrange
+    monkeypatch.setattr("airview_api.blueprint.MAX_PAGE_LIMIT", 1)
+    ServiceFactory(id=10, name="Service One", reference="svc-ref-0", type="NETWORK")
+    ServiceFactory(id=11, name="Service Two", reference="svc-ref-1", type="NETWORK")
+
+    # Act
+    handler.handle_resource_type(mapped_resource.resource_type)
+
+    # Assert
+    assert len(api_models.Service.query.all()) == 2
+    resource_types = api_models.ResourceType.query.all()
+    assert len(resource_types) == 1
+    assert resource_types[0].service_id == 11
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from typing import Optional
+from client.airviewclient.cache import ReferenceCache
+
+
+@dataclass
+class Definition:
+    name: str
+    parent_id: Optional[int] = None
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    """
+    Given: A cached value
+    When: The ttl elapses
+    Then: The value is no longer returned
+    """
+    clock = FakeClock()
+    cache = ReferenceCache(ttl=10, max_size=5, clock=clock)
+    cache.set("key", 1)
+
+    clock.now = 9
+    assert cache.get("key") == 1
+    clock.now = 10
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    """
+    Given: A full cache
+    When: A new value is cached
+    Then: The least recently read entry is evicted
+    """
+    cache = ReferenceCache(ttl=10, max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_invalidate_and_disabled_cache():
+    """
+    Given: A cached value and a cache with no capacity
+    When: The value is invalidated or set
+    Then: Nothing is returned from either cache
+    """
+    cache = ReferenceCache(ttl=10, max_size=2)
+    cache.set("a", 1)
+    cache.invalidate("a")
+    disabled = ReferenceCache(ttl=10, max_size=0)
+
+    assert disabled.set("a", 1) == 1
+    assert cache.get("a") is None
+    assert disabled.get("a") is None
+
+
+def test_cached_values_are_copies():
+    """
+    Given: A cached definition
+    When: Both the instance cached and an instance read from the cache are changed
+    Then: Later reads return the value as it was cached
+    """
+    cache = ReferenceCache(ttl=10, max_size=2)
+    definition = Definition(name="one")
+    cache.set("key", definition)
+
+    definition.parent_id = 5
+    cache.get("key").parent_id = 6
+
+    assert cache.get("key") == Definition(name="one")
+    assert cache.get("key") is not cache.get("key")
@@ -0,0 +1,109 @@
+"""
+Measure cold start of the lambda handler against a local sqlite database.
+Each run imports main.py in a fresh interpreter, reporting the import time and the time of the first requests,
+with and without the pre-built openapi spec.
+
+    python benchmark.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, "..", "..", "..", "app")
+OPENAPI_SPEC_PATH = os.path.join(HERE, "..", "..", "..", "docs", "openapi.json")
+
+
+def _event(path: str) -> dict:
+    return {
+        "path": path,
+        "headers": {
+            "Host": "localhost",
+            "X-Forwarded-Port": "443",
+            "X-Forwarded-Proto": "https",
+        },
+        "queryStringParameters": None,
+        "body": None,
+        "requestContext": {
+            "apiId": "benchmark",
+            "httpMethod": "GET",
+            "protocol": "HTTP/1.1",
+            "identity": {"sourceIp": "127.0.0.1"},
+        },
+    }
+
+
+def _child():
+    # Runs in a fresh interpreter so that imports are not already cached
+    started = time.perf_counter()
+    import main
+
+    imported = time.perf_counter()
+    timings = {"import": imported - started}
+    for path in ("/environments/", "/openapi.json"):
+        before = time.perf_counter()
+        response = main.handler(_event(path), None)
+        assert response["statusCode"] == 200, response
+        timings[path] = time.perf_counter() - before
+    print(json.dumps(timings))
+
+
+def _create_database(database_uri: str):
+    sys.path.insert(0, APP_DIR)
+    from airview_api.app import create_app
+    from airview_api.database import db
+
+    with create_app(db_connection_string=database_uri).app_context():
+        db.create_all()
+
+
+def _run(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--child"],
+        cwd=HERE,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child()
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_uri = f"sqlite:///{os.path.join(directory, 'airview.db')}"
+        _create_database(database_uri)
+        env = dict(
+            os.environ,
+            DATABASE_URI=database_uri,
+            PYTHONPATH=os.pathsep.join([APP_DIR, HERE]),
+            LOG_LEVEL="WARNING",
+        )
+        env.pop("OPENAPI_SPEC_PATH", None)
+        modes = {
+            "generated spec": env,
+            "fast start": dict(env, OPENAPI_SPEC_PATH=OPENAPI_SPEC_PATH),
+        }
+        for mode, mode_env in modes.items():
+            runs = [_run(mode_env) for _ in range(args.runs)]
+            print(f"{mode} (median of {args.runs} runs)")
+            for name in runs[0]:
+                median = statistics.median(r[name] for r in runs)
+                print(f"  {name:<16} {median * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
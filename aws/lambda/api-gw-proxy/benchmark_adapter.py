@@ -0,0 +1,78 @@
+"""
+Measure the events per second the lambda event adapter handles, without a database or the api behind it.
+
+    python benchmark_adapter.py --seconds 2
+"""
+import argparse
+import base64
+import time
+from flask import request, jsonify
+from flask_aws_http_apigw import FlaskLambdaHttp
+
+app = FlaskLambdaHttp(__name__)
+
+
+@app.route("/items/", methods=["GET", "POST"])
+def items():
+    return jsonify(
+        {"ids": request.args.getlist("id"), "size": len(request.get_data())}
+    )
+
+
+EVENTS = {
+    "v1 get": {
+        "path": "/items/",
+        "headers": {"Host": "localhost", "X-Forwarded-Port": "443"},
+        "multiValueQueryStringParameters": {"id": ["1", "2", "3"]},
+        "body": None,
+        "requestContext": {
+            "apiId": "benchmark",
+            "httpMethod": "GET",
+            "protocol": "HTTP/1.1",
+            "identity": {"sourceIp": "127.0.0.1"},
+        },
+    },
+    "v1 base64 post": {
+        "path": "/items/",
+        "headers": {"Host": "localhost", "Content-Type": "application/octet-stream"},
+        "body": base64.b64encode(bytes(range(256)) * 64).decode(),
+        "isBase64Encoded": True,
+        "requestContext": {
+            "apiId": "benchmark",
+            "httpMethod": "POST",
+            "protocol": "HTTP/1.1",
+            "identity": {"sourceIp": "127.0.0.1"},
+        },
+    },
+    "v2 get": {
+        "version": "2.0",
+        "rawPath": "/items/",
+        "rawQueryString": "id=1&id=2&id=3",
+        "headers": {"host": "localhost"},
+        "requestContext": {
+            "apiId": "benchmark",
+            "http": {"method": "GET", "sourceIp": "127.0.0.1"},
+        },
+    },
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2)
+    args = parser.parse_args()
+
+    for name, event in EVENTS.items():
+        assert app(event, None)["statusCode"] == 200
+        count = 0
+        started = time.perf_counter()
+        deadline = started + args.seconds
+        while time.perf_counter() < deadline:
+            app(event, None)
+            count += 1
+        elapsed = time.perf_counter() - started
+        print(f"{name:<16} {count / elapsed:10.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
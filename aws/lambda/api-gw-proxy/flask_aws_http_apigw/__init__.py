@@ -1,71 +1,123 @@
+import base64
 import sys
 import logging
 import json
+from io import BytesIO
+from urllib.parse import urlencode
 from flask import Flask
 import os
 
-try:
-    from urllib import urlencode
-except ImportError:
-    from urllib.parse import urlencode
 
-try:
-    from cStringIO import StringIO
-except ImportError:
-    try:
-        from StringIO import StringIO
-    except ImportError:
-        from io import StringIO
+logger = logging.getLogger("airview.aws.wrapper")
+logger.setLevel(logging.getLevelName(os.getenv("LOG_LEVEL", "INFO")))
 
-try:  # werkzeug <= 2.0.3
-    from werkzeug.wrappers import BaseRequest
-except:  # werkzeug > 2.1
-    from werkzeug.wrappers import Request as BaseRequest
+# Response content types which are returned as text, anything else, or any content encoded e.g. with gzip, is base64 encoded
+TEXT_CONTENT_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+)
 
 
-logger = logging.getLogger("airview.aws.wrapper")
-logger.setLevel(logging.getLevelName(os.getenv("LOG_LEVEL", "INFO")))
+def _is_version_2(event: dict) -> bool:
+    return event.get("version") == "2.0"
 
 
-def make_environ(event) -> dict:
+def _request_line(event: dict) -> tuple:
     """
-    Map Lambda Event to WSGI Request
+    Get the method, path, query string, source ip and protocol of the request
     :param event: Lambda Event
-    :return: Mapped Environment Dict
+    :return: Tuple of request details
     """
-    environ = {}
+    request_context = event["requestContext"]
+    if _is_version_2(event):
+        http = request_context["http"]
+        return (
+            http["method"],
+            event["rawPath"],
+            event.get("rawQueryString", ""),
+            http["sourceIp"],
+            http.get("protocol", "HTTP/1.1"),
+        )
+
+    # Values are decoded by api gateway, the multi value form holds every value of repeated parameters
+    query = event.get("multiValueQueryStringParameters") or event.get(
+        "queryStringParameters"
+    )
+    return (
+        request_context["httpMethod"],
+        event["path"],
+        urlencode(query, doseq=True) if query else "",
+        request_context["identity"]["sourceIp"],
+        request_context["protocol"],
+    )
 
-    for hdr_name, hdr_value in event["headers"].items():
+
+def _headers(event: dict) -> dict:
+    """
+    Get the request headers, repeated headers joined into a single value
+    :param event: Lambda Event
+    :return: Header Dict
+    """
+    multi_value_headers = event.get("multiValueHeaders")
+    if multi_value_headers:
+        headers = {k: ",".join(v) for k, v in multi_value_headers.items()}
+    else:
+        headers = dict(event.get("headers") or {})
+    cookies = event.get("cookies")
+    if cookies:
+        headers["cookie"] = "; ".join(cookies)
+    return headers
+
+
+def _body(event: dict) -> bytes:
+    body = event.get("body")
+    if not body:
+        return b""
+    if event.get("isBase64Encoded"):
+        return base64.b64decode(body)
+    return body.encode("utf-8")
+
+
+def make_environ(event: dict) -> dict:
+    """
+    Map Lambda Event to WSGI Request, for both version 1.0 and 2.0 api gateway payloads
+    :param event: Lambda Event
+    :return: Mapped Environment Dict
+    """
+    method, path, query_string, source_ip, protocol = _request_line(event)
+    body = _body(event)
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": query_string,
+        "REMOTE_ADDR": source_ip,
+        "SCRIPT_NAME": "",
+        "SERVER_PROTOCOL": protocol,
+        "CONTENT_LENGTH": str(len(body)) if body else "",
+        "wsgi.input": BytesIO(body),
+        "wsgi.version": (1, 0),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": False,
+        "wsgi.run_once": True,
+        "wsgi.multiprocess": False,
+    }
+
+    for hdr_name, hdr_value in _headers(event).items():
         hdr_name = hdr_name.replace("-", "_").upper()
-        if hdr_name in ["CONTENT_TYPE", "CONTENT_LENGTH"]:
+        if hdr_name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
             environ[hdr_name] = hdr_value
             continue
+        environ["HTTP_" + hdr_name] = hdr_value
+
+    environ["SERVER_NAME"] = environ.get("HTTP_HOST", "localhost")
+    environ["SERVER_PORT"] = environ.get("HTTP_X_FORWARDED_PORT", "443")
+    environ["wsgi.url_scheme"] = environ.get("HTTP_X_FORWARDED_PROTO", "https")
 
-        http_hdr_name = "HTTP_%s" % hdr_name
-        environ[http_hdr_name] = hdr_value
-
-    query_string = event.get("queryStringParameters", "")
-
-    environ["REQUEST_METHOD"] = event["requestContext"]["httpMethod"]
-    environ["PATH_INFO"] = event["path"]
-    environ["QUERY_STRING"] = urlencode(query_string) if query_string else ""
-    environ["REMOTE_ADDR"] = event["requestContext"]["identity"]["sourceIp"]
-    environ["HOST"] = "%(HTTP_HOST)s:%(HTTP_X_FORWARDED_PORT)s" % environ
-    environ["SCRIPT_NAME"] = ""
-    environ["SERVER_NAME"] = "%(HTTP_HOST)s:%(HTTP_X_FORWARDED_PORT)s" % environ
-    environ["SERVER_PORT"] = environ["HTTP_X_FORWARDED_PORT"]
-    environ["SERVER_PROTOCOL"] = event["requestContext"]["protocol"]
-    environ["CONTENT_LENGTH"] = str(len(event["body"]) if event["body"] else "")
-    environ["wsgi.url_scheme"] = environ["HTTP_X_FORWARDED_PROTO"]
-    environ["wsgi.input"] = StringIO(event["body"] or "")
-    environ["wsgi.version"] = (1, 0)
-    environ["wsgi.errors"] = sys.stderr
-    environ["wsgi.multithread"] = False
-    environ["wsgi.run_once"] = True
-    environ["wsgi.multiprocess"] = False
-
-    BaseRequest(environ)
-    logger.debug("WSGI Environment: %s", json.dumps(environ, default=str))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("WSGI Environment: %s", json.dumps(environ, default=str))
 
     return environ
 
@@ -89,7 +141,48 @@ class LambdaResponse(object):
             exc_info,
         )
         self.status = int(status[:3])
-        self.response_headers = dict(response_headers)
+        self.response_headers = response_headers
+
+    def to_lambda(self, body: bytes, version_2: bool) -> dict:
+        """
+        Build the api gateway response
+        :param body: Complete response body
+        :param version_2: Whether the request was a version 2.0 payload
+        :return: Lambda Response JSON Blob
+        """
+        headers = {}
+        multi_value_headers = {}
+        cookies = []
+        content_type = ""
+        content_encoding = ""
+        for name, value in self.response_headers:
+            if version_2 and name.lower() == "set-cookie":
+                cookies.append(value)
+                continue
+            if name.lower() == "content-type":
+                content_type = value
+            elif name.lower() == "content-encoding":
+                content_encoding = value
+            headers[name] = value
+            multi_value_headers.setdefault(name, []).append(value)
+
+        is_text = not body or (
+            content_type.startswith(TEXT_CONTENT_TYPES)
+            and content_encoding in ("", "identity")
+        )
+        result = {
+            "statusCode": self.status,
+            "headers": headers,
+            "body": body.decode("utf-8") if is_text else base64.b64encode(body).decode(),
+            "isBase64Encoded": not is_text,
+        }
+        if version_2:
+            if cookies:
+                result["cookies"] = cookies
+        elif len(multi_value_headers) != len(self.response_headers):
+            # Repeated headers, such as Set-Cookie, only survive in the multi value form
+            result["multiValueHeaders"] = multi_value_headers
+        return result
 
 
 class FlaskLambdaHttp(Flask):
@@ -100,27 +193,20 @@ class FlaskLambdaHttp(Flask):
         :param context: Lambda Context
         :return: Lambda Response JSON Blob
         """
-        logger.debug("Lambda Event: %s", json.dumps(event))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Lambda Event: %s", json.dumps(event))
 
         if not event.get("requestContext", {}).get("apiId", None):
             logger.info("Not an API request: Passing request to Flask Superclass")
             return super(FlaskLambdaHttp, self).__call__(event, context)
 
         response = LambdaResponse()
-
-        body = None
+        result = self.wsgi_app(make_environ(event), response.start_response)
         try:
-            body = next(self.wsgi_app(make_environ(event), response.start_response))
-        except StopIteration as e:
-            ## werkzeug throws a StopIteration error when the response body is empty, which is what we are doing in the
-            ## PUT methods on some api services! Need to catch and ignore it here...
-            if e.value is None and response.status == 204:
-                logger.warning("Request StopIteration Exception on empty response body")
-            else:
-                raise
-
-        return {
-            "statusCode": response.status,
-            "headers": response.response_headers,
-            "body": body,
-        }
+            # Responses may be written in several chunks, or none at all for an empty body
+            body = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+        return response.to_lambda(body, _is_version_2(event))
@@ -1,9 +1,16 @@
 from airview_api.app import create_app
+from airview_api import database, job_queue
+from airview_api.services import (
+    compliance_fact_service,
+    compliance_history_service,
+    compliance_job_service,
+    monitored_resource_service,
+)
 from flask_aws_http_apigw import FlaskLambdaHttp
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
 from sqlite3 import Connection as SQLite3Connection
-import boto3
+from functools import lru_cache
 import json
 import os
 import logging
@@ -34,6 +41,9 @@ def fetch_aws_secrets_db_credentials(secret_arn: str) -> dict:
     :param secret_arn: AWS Secret ARN
     :return: Secret JSON
     """
+    # Imported here as it is slow to import and only needed when the connection string is not provided
+    import boto3
+
     sm = boto3.client("secretsmanager")
 
     try:
@@ -51,11 +61,17 @@ def fetch_aws_secrets_db_credentials(secret_arn: str) -> dict:
     return secret_blob
 
 
+@lru_cache(maxsize=None)
 def get_db_conn_string() -> str:
     """
-    Get Formatted Connection String
+    Get Formatted Connection String, fetched once per container
+    DATABASE_URI is used as is when set, which avoids the call to Secrets Manager
     :return: Postgres Connection URL
     """
+    database_uri = os.getenv("DATABASE_URI")
+    if database_uri:
+        return database_uri
+
     try:
         secret_arn: str = os.environ["DB_CREDS_SECRET_NAME"]
     except KeyError:
@@ -87,10 +103,84 @@ def get_db_conn_string() -> str:
 
 
 lambda_api_http: FlaskLambdaHttp = FlaskLambdaHttp(__name__)
+# Threads do not outlive the request which started them, queued compliance jobs are run by compliance_jobs_handler
+lambda_api_http.config["JOB_QUEUE"] = job_queue.DeferredJobQueue()
+# Responses are buffered by the adapter, so server sent events would arrive in one burst as the stream ends
+lambda_api_http.config["CHANGE_STREAMING"] = False
 handler: FlaskLambdaHttp = create_app(
-    app=lambda_api_http, db_connection_string=get_db_conn_string()
+    app=lambda_api_http,
+    db_connection_string=get_db_conn_string(),
+    # Each container serves a request at a time and RDS Proxy pools connections, so a single connection is kept
+    engine_options=database.engine_options(get_db_conn_string(), serverless=True),
+    # Set to a copy of docs/openapi.json to serve it rather than generating the spec on startup
+    openapi_spec_path=os.getenv("OPENAPI_SPEC_PATH"),
 )
 
 
+def reconcile_handler(event: dict, context: dict) -> dict:
+    """
+    Handle a scheduled event by marking monitored resources which have stopped reporting as unresponsive
+    :param event: Lambda Event
+    :param context: Lambda Context
+    :return: Progress metrics of the run
+    """
+    with handler.app_context():
+        metrics = monitored_resource_service.mark_unresponsive()
+    logger.info("Reconciled monitored resources: %s", json.dumps(metrics))
+    return metrics
+
+
+def prune_changes_handler(event: dict, context: dict) -> dict:
+    """
+    Handle a scheduled event by removing monitored resource transitions older than the retention of the change feed
+    :param event: Lambda Event
+    :param context: Lambda Context
+    :return: Number of transitions removed
+    """
+    with handler.app_context():
+        metrics = monitored_resource_service.prune_changes()
+    logger.info("Pruned monitored resource changes: %s", json.dumps(metrics))
+    return metrics
+
+
+def verify_counters_handler(event: dict, context: dict) -> dict:
+    """
+    Handle a scheduled event by recounting the compliance counters and correcting any which have drifted
+    :param event: Lambda Event
+    :param context: Lambda Context
+    :return: Number of counters checked and corrected
+    """
+    with handler.app_context():
+        metrics = compliance_fact_service.verify_counters()
+    logger.info("Verified compliance counters: %s", json.dumps(metrics))
+    return metrics
+
+
+def snapshot_handler(event: dict, context: dict) -> dict:
+    """
+    Handle a scheduled event by snapshotting the compliance counters into the compliance history
+    :param event: Lambda Event
+    :param context: Lambda Context
+    :return: Number of snapshot rows written and removed
+    """
+    with handler.app_context():
+        metrics = compliance_history_service.take_snapshot()
+    logger.info("Snapshotted compliance: %s", json.dumps(metrics))
+    return metrics
+
+
+def compliance_jobs_handler(event: dict, context: dict) -> dict:
+    """
+    Handle a scheduled event by running queued compliance jobs and removing expired ones
+    :param event: Lambda Event
+    :param context: Lambda Context
+    :return: Number of jobs run and removed
+    """
+    with handler.app_context():
+        metrics = compliance_job_service.run_queued()
+    logger.info("Ran compliance jobs: %s", json.dumps(metrics))
+    return metrics
+
+
 if __name__ == "__main__":
     handler.run(debug=False)
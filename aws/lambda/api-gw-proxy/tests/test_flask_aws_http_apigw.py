@@ -0,0 +1,234 @@
+import base64
+import gzip
+import json
+from flask import Response, jsonify, request
+from flask_aws_http_apigw import FlaskLambdaHttp
+
+app = FlaskLambdaHttp(__name__)
+
+
+@app.route("/echo/", methods=["GET", "POST"])
+def echo():
+    return jsonify(
+        {
+            "ids": request.args.getlist("id"),
+            "accept": request.headers.get("Accept"),
+            "cookies": request.cookies,
+            "body": base64.b64encode(request.get_data()).decode(),
+        }
+    )
+
+
+@app.route("/gzip/")
+def gzipped():
+    return Response(
+        gzip.compress(b'{"a": 1}\n'),
+        mimetype="application/x-ndjson",
+        headers={"Content-Encoding": "gzip"},
+    )
+
+
+@app.route("/binary/")
+def binary():
+    return Response(bytes(range(256)), mimetype="application/octet-stream")
+
+
+@app.route("/cookies/")
+def cookies():
+    response = Response("ok", mimetype="text/plain")
+    response.set_cookie("first", "1")
+    response.set_cookie("second", "2")
+    return response
+
+
+@app.route("/stream/")
+def stream():
+    def generate():
+        for i in range(3):
+            yield json.dumps({"row": i}) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+def _v1_event(path, **kwargs):
+    event = {
+        "path": path,
+        "headers": {"Host": "localhost"},
+        "body": None,
+        "requestContext": {
+            "apiId": "test",
+            "httpMethod": "GET",
+            "protocol": "HTTP/1.1",
+            "identity": {"sourceIp": "127.0.0.1"},
+        },
+    }
+    event.update(kwargs)
+    return event
+
+
+def _v2_event(path, **kwargs):
+    event = {
+        "version": "2.0",
+        "rawPath": path,
+        "rawQueryString": "",
+        "headers": {"host": "localhost"},
+        "requestContext": {
+            "apiId": "test",
+            "http": {
+                "method": "GET",
+                "protocol": "HTTP/1.1",
+                "sourceIp": "127.0.0.1",
+            },
+        },
+    }
+    event.update(kwargs)
+    return event
+
+
+def test_v1_multi_value_query_string_and_headers():
+    """
+    Given: A version 1.0 event with repeated query string parameters and headers
+    When: The event is handled
+    Then: Every value of the parameter reaches the app and repeated headers are joined
+    """
+    # Arrange
+    event = _v1_event(
+        "/echo/",
+        queryStringParameters={"id": "2"},
+        multiValueQueryStringParameters={"id": ["1", "2"]},
+        multiValueHeaders={
+            "Host": ["localhost"],
+            "Accept": ["application/json", "text/plain"],
+        },
+    )
+
+    # Act
+    result = app(event, {})
+
+    # Assert
+    assert result["statusCode"] == 200
+    assert result["isBase64Encoded"] is False
+    body = json.loads(result["body"])
+    assert body["ids"] == ["1", "2"]
+    assert body["accept"] == "application/json,text/plain"
+
+
+def test_base64_request_body():
+    """
+    Given: An event whose body is base64 encoded binary
+    When: The event is handled
+    Then: The app receives the decoded bytes
+    """
+    # Arrange
+    payload = bytes(range(256))
+    event = _v1_event(
+        "/echo/",
+        headers={"Host": "localhost", "Content-Type": "application/octet-stream"},
+        body=base64.b64encode(payload).decode(),
+        isBase64Encoded=True,
+    )
+    event["requestContext"]["httpMethod"] = "POST"
+
+    # Act
+    result = app(event, {})
+
+    # Assert
+    assert result["statusCode"] == 200
+    assert base64.b64decode(json.loads(result["body"])["body"]) == payload
+
+
+def test_gzip_response_is_base64_encoded():
+    """
+    Given: A response with a text content type which is gzip encoded
+    When: The event is handled
+    Then: The body is returned base64 encoded rather than decoded as text
+    """
+    # Arrange
+    event = _v1_event(
+        "/gzip/", headers={"Host": "localhost", "Accept-Encoding": "gzip"}
+    )
+
+    # Act
+    result = app(event, {})
+
+    # Assert
+    assert result["isBase64Encoded"] is True
+    assert result["headers"]["Content-Encoding"] == "gzip"
+    assert gzip.decompress(base64.b64decode(result["body"])) == b'{"a": 1}\n'
+
+
+def test_binary_response_is_base64_encoded():
+    """
+    Given: A response with a binary content type
+    When: The event is handled
+    Then: The body is returned base64 encoded
+    """
+    # Arrange
+    event = _v2_event("/binary/")
+
+    # Act
+    result = app(event, {})
+
+    # Assert
+    assert result["isBase64Encoded"] is True
+    assert base64.b64decode(result["body"]) == bytes(range(256))
+
+
+def test_v2_raw_path_query_string_and_cookies():
+    """
+    Given: A version 2.0 event with a raw query string and cookies
+    When: The event is handled
+    Then: The query string and cookies reach the app
+    """
+    # Arrange
+    event = _v2_event(
+        "/echo/", rawQueryString="id=1&id=2", cookies=["first=1", "second=2"]
+    )
+
+    # Act
+    result = app(event, {})
+
+    # Assert
+    assert result["statusCode"] == 200
+    body = json.loads(result["body"])
+    assert body["ids"] == ["1", "2"]
+    assert body["cookies"] == {"first": "1", "second": "2"}
+
+
+def test_repeated_set_cookie_headers():
+    """
+    Given: A response setting two cookies
+    When: Version 1.0 and 2.0 events are handled
+    Then: Both cookies are returned, in multiValueHeaders for 1.0 and cookies for 2.0
+    """
+    # Arrange
+    # Act
+    v1 = app(_v1_event("/cookies/"), {})
+    v2 = app(_v2_event("/cookies/"), {})
+
+    # Assert
+    assert [c.split(";")[0] for c in v1["multiValueHeaders"]["Set-Cookie"]] == [
+        "first=1",
+        "second=2",
+    ]
+    assert [c.split(";")[0] for c in v2["cookies"]] == ["first=1", "second=2"]
+    assert "Set-Cookie" not in v2["headers"]
+
+
+def test_streamed_response_chunks_are_joined():
+    """
+    Given: A response written in several chunks, as newline delimited json is streamed
+    When: The event is handled
+    Then: The chunks are returned as a single text body
+    """
+    # Arrange
+    # Act
+    result = app(_v1_event("/stream/"), {})
+
+    # Assert
+    assert result["isBase64Encoded"] is False
+    assert [json.loads(l) for l in result["body"].splitlines()] == [
+        {"row": 0},
+        {"row": 1},
+        {"row": 2},
+    ]